@@ -0,0 +1,67 @@
+"""
+Measures MessageDispatcher command lookup cost.
+
+Registers 1,000 commands (a mix of top level commands and subcommands) and
+times _find_longest_prefix_command for short and long messages, comparing the
+command trie against the previous implementation that re-joined every prefix
+of the message.
+
+Usage: python benchmarks/bench_dispatcher.py
+"""
+import timeit
+
+from slackminion.dispatcher import MessageDispatcher
+
+NUM_COMMANDS = 1000
+ITERATIONS = 2000
+
+
+def join_prefix_lookup(commands, args):
+    num_parts = len(args)
+    while num_parts > 0:
+        cmd = " ".join(args[0:num_parts])
+        if cmd in commands:
+            return cmd, args[num_parts:]
+        num_parts -= 1
+    return None, None
+
+
+def build_dispatcher():
+    dispatcher = MessageDispatcher()
+    for i in range(NUM_COMMANDS // 4):
+        for cmd in (
+            f"!cmd{i}",
+            f"!cmd{i} list",
+            f"!cmd{i} show",
+            f"!cmd{i} show all",
+        ):
+            dispatcher.commands[cmd] = None
+            dispatcher.command_index.add(cmd)
+    return dispatcher
+
+
+def main():
+    dispatcher = build_dispatcher()
+    messages = {
+        "10 tokens (match)": ["!cmd42", "show", "all"] + ["word"] * 7,
+        "10 tokens (no match)": ["!nothing"] + ["word"] * 9,
+        "500 tokens (match)": ["!cmd42", "show", "all"] + ["word"] * 497,
+        "500 tokens (no match)": ["!nothing"] + ["word"] * 499,
+    }
+    print(f"{len(dispatcher.commands)} registered commands, {ITERATIONS} lookups each")
+    print(f"{'message':<24} {'trie':>12} {'join prefix':>12}")
+    for name, args in messages.items():
+        trie = timeit.timeit(
+            lambda: dispatcher._find_longest_prefix_command(args), number=ITERATIONS
+        )
+        joined = timeit.timeit(
+            lambda: join_prefix_lookup(dispatcher.commands, args), number=ITERATIONS
+        )
+        print(
+            f"{name:<24} {trie / ITERATIONS * 1e6:>9.2f} us "
+            f"{joined / ITERATIONS * 1e6:>9.2f} us"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Measures how long it takes to restore 100,000 persistent timers at startup.
+
+Saves 100,000 pending timers, a tenth of them already overdue, the way
+DurableTimers does and then restores them, reporting the size of the blob
+and:
+
+- the time to decode it, which happens in a worker thread
+- the time DurableTimers.start() takes, decoding the blob and then
+  scheduling the timers on the event loop in chunks so other startup work
+  can run in between
+- the longest the event loop was blocked while that happened, measured by
+  a task that keeps yielding to it, and the longest garbage collection
+  pause in that time
+- the longest the event loop was blocked while the overdue timers fired
+
+Each block is compared against a target of BLOCK_TARGET.
+
+Usage: python benchmarks/bench_durable_timers.py
+"""
+import asyncio
+import gc
+import random
+import time
+
+from slackminion.utils.async_task import DurableTimers, TimerService
+
+NUM_TIMERS = 100000
+OVERDUE_RATIO = 0.1
+BLOCK_TARGET = 0.05
+
+
+class Reminder(object):
+    def __init__(self):
+        self.reminded = 0
+
+    def remind(self, channel, text):
+        self.reminded += 1
+
+
+def build_blob():
+    rng = random.Random(42)
+    now = time.time()
+    timers = []
+    for i in range(NUM_TIMERS):
+        if rng.random() < OVERDUE_RATIO:
+            due = now - rng.random() * 3600
+        else:
+            due = now + rng.random() * 86400 * 30
+        timers.append(
+            ["Reminder", "remind", due, ["C012AB3CD", f"reminder number {i}"], {}]
+        )
+    blobs = []
+    DurableTimers(None, save=blobs.append)._write(timers)
+    return blobs[0]
+
+
+class BlockMonitor(object):
+    """Measures the longest the event loop goes without running a task"""
+
+    def __init__(self):
+        self.blocked = 0.0
+        self.gc_pause = 0.0
+        self._gc_started = None
+        self._running = False
+        self._task = None
+
+    async def __aenter__(self):
+        self._running = True
+        self._task = asyncio.ensure_future(self._measure())
+        gc.callbacks.append(self._measure_gc)
+        await asyncio.sleep(0)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        gc.callbacks.remove(self._measure_gc)
+        self._running = False
+        await self._task
+
+    async def _measure(self):
+        last = time.perf_counter()
+        while self._running:
+            await asyncio.sleep(0)
+            now = time.perf_counter()
+            self.blocked = max(self.blocked, now - last)
+            last = now
+
+    def _measure_gc(self, phase, info):
+        if phase == "start":
+            self._gc_started = time.perf_counter()
+        elif self._gc_started is not None:
+            self.gc_pause = max(self.gc_pause, time.perf_counter() - self._gc_started)
+
+
+async def restore(blob):
+    plugin = Reminder()
+    timers = TimerService()
+    durable_timers = DurableTimers(
+        timers, load=lambda: blob, resolve=lambda name, method: plugin.remind
+    )
+    start = time.perf_counter()
+    records = durable_timers._read()
+    decoded = time.perf_counter() - start
+    overdue = sum(1 for record in records if record[2] < time.time())
+    del records
+
+    async with BlockMonitor() as restoring:
+        start = time.perf_counter()
+        await durable_timers.start()
+        started = time.perf_counter() - start
+    assert len(durable_timers) == NUM_TIMERS
+
+    async with BlockMonitor() as firing:
+        timers.start()
+        while plugin.reminded < overdue:
+            await asyncio.sleep(0.001)
+    timers.stop()
+    durable_timers.stop()
+    return decoded, started, restoring, firing, overdue
+
+
+def report(label, seconds, target=None):
+    line = f"{label:<32} {seconds * 1000:>8.1f} ms"
+    if target is not None:
+        line += f" (target {target * 1000:.0f} ms, "
+        line += "met)" if seconds <= target else "missed)"
+    print(line)
+
+
+def main():
+    blob = build_blob()
+    decoded, started, restoring, firing, overdue = asyncio.run(restore(blob))
+    print(f"{NUM_TIMERS} timers, {len(blob) / 1024:.0f} KiB saved")
+    report("decode (worker thread)", decoded)
+    report("start (decode and schedule)", started)
+    report("longest event loop block", restoring.blocked, BLOCK_TARGET)
+    report("longest gc pause", restoring.gc_pause)
+    report(f"longest block firing {overdue} late", firing.blocked, BLOCK_TARGET)
+
+
+if __name__ == "__main__":
+    main()
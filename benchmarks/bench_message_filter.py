@@ -0,0 +1,99 @@
+"""
+Measures the CPU time saved by rejecting non-command messages early.
+
+Builds 100,000 message payloads where 5% are commands and the rest are
+ordinary chatter, including some multi-KB pastes, and measures the
+process time to handle them:
+
+- the previous path, which builds a SlackEvent and NFKD normalizes and
+  splits every message before checking for a leading "!"
+- the new path, which only does that for messages that pass
+  could_be_command
+
+User and channel resolution are left out of both. Those are slack api
+calls or cache lookups, and the early rejection skips them as well, so the
+real saving is larger than reported here.
+
+Usage: python benchmarks/bench_message_filter.py
+"""
+import random
+import time
+import unicodedata
+
+from slackminion.dispatcher import could_be_command
+from slackminion.slack import SlackEvent
+
+NUM_MESSAGES = 100000
+COMMAND_RATIO = 0.05
+PASTE_RATIO = 0.02
+
+WORDS = "lgtm can someone look at the deploy for prod it looks stuck again".split()
+
+
+def build_payloads():
+    rng = random.Random(42)
+    payloads = []
+    for _ in range(NUM_MESSAGES):
+        roll = rng.random()
+        if roll < COMMAND_RATIO:
+            text = "!" + " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 5)))
+        elif roll < COMMAND_RATIO + PASTE_RATIO:
+            # a pasted stack trace or log excerpt
+            text = "\n".join(
+                " ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(60)
+            )
+        else:
+            text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 25)))
+        payloads.append(
+            {
+                "data": {
+                    "type": "message",
+                    "channel": "C012AB3CD",
+                    "user": "U012AB3CD",
+                    "text": text,
+                    "ts": "1355517523.000005",
+                }
+            }
+        )
+    return payloads
+
+
+def parse(payload):
+    event = SlackEvent(event_type="message", **payload)
+    args = unicodedata.normalize("NFKD", event.text).split()
+    return len(args) > 0 and args[0].startswith("!")
+
+
+def previous_path(payloads):
+    return sum(parse(payload) for payload in payloads)
+
+
+def filtered_path(payloads):
+    return sum(
+        parse(payload)
+        for payload in payloads
+        if could_be_command(payload["data"]["text"])
+    )
+
+
+def measure(func, payloads):
+    start = time.process_time()
+    commands = func(payloads)
+    return time.process_time() - start, commands
+
+
+def main():
+    payloads = build_payloads()
+    previous, previous_commands = measure(previous_path, payloads)
+    filtered, filtered_commands = measure(filtered_path, payloads)
+    assert previous_commands == filtered_commands
+    print(f"{NUM_MESSAGES} messages, {previous_commands} commands")
+    print(f"{'previous path':<16} {previous * 1000:>9.1f} ms cpu")
+    print(f"{'pre-filtered':<16} {filtered * 1000:>9.1f} ms cpu")
+    print(
+        f"saved {(previous - filtered) * 1000:.1f} ms cpu per {NUM_MESSAGES} messages"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Measures the cost of stripping slack formatting from command arguments.
+
+Builds a corpus of messages like the ones slack delivers (plain text, user and
+channel mentions, special commands like <!here>, user groups and links with
+and without labels) and times strip_formatting_args against the previous
+implementation, which compiled two regexes and made two passes over the
+joined arguments on every call.  The two implementations are checked to give
+the same result for every message first.
+
+Usage: python benchmarks/bench_strip_formatting.py
+"""
+import random
+import re
+import timeit
+
+from slackminion.utils.util import strip_formatting_args
+
+NUM_MESSAGES = 1000
+ITERATIONS = 20
+
+
+def legacy_strip_formatting(input_string):
+    special_pattern = re.compile(
+        r"""
+        <              # opening angle bracket
+        ([\@\#\!])     # link type for channel, username or command
+        (\w+)          # id
+        (?:\|([^>]+))? # |label (optional)
+        >              # closing angle bracket
+        """,
+        re.VERBOSE,
+    )
+
+    link_pattern = re.compile(
+        r"""
+        <              # opening angle bracket
+        ([^>\|]+)      # link
+        (?:\|([^>]+))? # label
+        >              # closing angle bracket
+        """,
+        re.VERBOSE,
+    )
+
+    def _special_match_substitute(match):
+        if match.group(3):
+            return "{}{}".format(match.group(1), match.group(3))
+        else:
+            return "{}{}".format(match.group(1), match.group(2))
+
+    def _link_match_substitute(match):
+        if match.group(2):
+            return match.group(2)
+        else:
+            return match.group(1)
+
+    input_string = re.sub(special_pattern, _special_match_substitute, input_string)
+    input_string = re.sub(link_pattern, _link_match_substitute, input_string)
+    return input_string
+
+
+def legacy_strip_formatting_args(args):
+    return legacy_strip_formatting(" ".join(args)).split(" ")
+
+
+WORDS = "please check the deploy for prod and staging when you get a chance".split()
+MARKUP = [
+    "<@U012AB3CD>",
+    "<@U012AB3CD|alice>",
+    "<#C024BE7LR|general>",
+    "<#C024BE7LR>",
+    "<!here>",
+    "<!channel>",
+    "<!subteam^SAZ94GDB8|@oncall>",
+    "<https://example.com/runbooks/deploy>",
+    "<https://example.com/dashboards/42|the dashboard>",
+    "<mailto:alice@example.com|alice@example.com>",
+]
+
+
+def build_corpus():
+    rng = random.Random(42)
+    corpus = []
+    for i in range(NUM_MESSAGES):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(1, 30))]
+        # most command arguments are plain text, the rest contain markup
+        if i % 3 == 0:
+            for _ in range(rng.randint(1, 4)):
+                words.insert(rng.randrange(len(words) + 1), rng.choice(MARKUP))
+        corpus.append(" ".join(words).split())
+    return corpus
+
+
+def main():
+    corpus = build_corpus()
+    for args in corpus:
+        assert strip_formatting_args(args) == legacy_strip_formatting_args(args), args
+    print(f"{len(corpus)} messages, {ITERATIONS} passes each")
+    for name, func in (
+        ("precompiled single pass", strip_formatting_args),
+        ("legacy two pass", legacy_strip_formatting_args),
+    ):
+        elapsed = timeit.timeit(
+            lambda: [func(args) for args in corpus], number=ITERATIONS
+        )
+        per_message = elapsed / ITERATIONS / len(corpus) * 1e6
+        print(f"{name:<24} {per_message:>8.2f} us/message")
+
+
+if __name__ == "__main__":
+    main()
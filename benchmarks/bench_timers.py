@@ -0,0 +1,100 @@
+"""
+Measures the cost of keeping 100,000 timers outstanding in TimerService.
+
+Schedules 100,000 timers due over a one second window starting a second
+from now, cancels a fifth of them by handle, then waits for the rest to fire, reporting the time taken
+by each step and how late the timers fired.  For comparison the same timers
+are scheduled with one loop.call_later each, which is what CallLater did,
+leaving 100,000 handles in the event loop's own heap.  (The previous
+start_timer also compared every new timer against the list of pending ones,
+which made scheduling 100,000 of them quadratic; that isn't reproduced.)
+
+Usage: python benchmarks/bench_timers.py
+"""
+import asyncio
+import random
+import time
+
+from slackminion.utils.async_task import TimerService
+
+NUM_TIMERS = 100000
+CANCEL_RATIO = 0.2
+DELAY = 1.0
+SPREAD = 1.0
+
+
+def build_delays():
+    rng = random.Random(42)
+    return [DELAY + rng.random() * SPREAD for _ in range(NUM_TIMERS)]
+
+
+async def run_timer_service(delays):
+    service = TimerService()
+    service.start()
+    lateness = []
+
+    def fire(due):
+        lateness.append(time.monotonic() - due)
+
+    start = time.perf_counter()
+    now = time.monotonic()
+    handles = [service.call_later(delay, fire, now + delay) for delay in delays]
+    scheduled = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for handle in handles[: int(NUM_TIMERS * CANCEL_RATIO)]:
+        handle.cancel()
+    cancelled = time.perf_counter() - start
+
+    await _wait_for(lambda: len(service) == 0)
+    return scheduled, cancelled, lateness
+
+
+async def run_call_later(delays):
+    loop = asyncio.get_event_loop()
+    lateness = []
+
+    def fire(due):
+        lateness.append(time.monotonic() - due)
+
+    start = time.perf_counter()
+    now = time.monotonic()
+    handles = [loop.call_later(delay, fire, now + delay) for delay in delays]
+    scheduled = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for handle in handles[: int(NUM_TIMERS * CANCEL_RATIO)]:
+        handle.cancel()
+    cancelled = time.perf_counter() - start
+
+    expected = NUM_TIMERS - int(NUM_TIMERS * CANCEL_RATIO)
+    await _wait_for(lambda: len(lateness) == expected)
+    return scheduled, cancelled, lateness
+
+
+async def _wait_for(condition):
+    while not condition():
+        await asyncio.sleep(0.01)
+
+
+def report(name, scheduled, cancelled, lateness):
+    lateness.sort()
+    p50 = lateness[len(lateness) // 2] * 1000
+    p99 = lateness[int(len(lateness) * 0.99)] * 1000
+    print(
+        f"{name:<16} schedule {scheduled * 1000:>7.1f} ms  cancel {cancelled * 1000:>6.1f} ms"
+        f"  late p50 {p50:>6.1f} ms  p99 {p99:>6.1f} ms"
+    )
+
+
+def main():
+    delays = build_delays()
+    print(
+        f"{NUM_TIMERS} timers due in {DELAY}-{DELAY + SPREAD}s, {CANCEL_RATIO:.0%} cancelled"
+    )
+    report("TimerService", *asyncio.run(run_timer_service(delays)))
+    report("loop.call_later", *asyncio.run(run_call_later(delays)))
+
+
+if __name__ == "__main__":
+    main()
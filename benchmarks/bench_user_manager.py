@@ -0,0 +1,55 @@
+"""
+Measures UserManager.get_by_username with 50,000 cached users, comparing the
+username index against a scan of every cached user.
+
+Usage: python benchmarks/bench_user_manager.py
+"""
+import timeit
+from unittest import mock
+
+from slackminion.plugins.core.user import UserManager
+from slackminion.slack import SlackUser
+
+NUM_USERS = 50000
+ITERATIONS = 200
+
+
+def scan_lookup(users, username):
+    res = [x for x in list(users.values()) if x.username == username]
+    if len(res) > 0:
+        return res[0]
+    return None
+
+
+def main():
+    bot = mock.Mock()
+    bot.config = {}
+    manager = UserManager(bot)
+    manager.on_load()
+    for i in range(NUM_USERS):
+        manager._add_user_to_cache(
+            SlackUser(user_info={"id": f"U{i:08d}", "name": f"user{i}"})
+        )
+
+    names = {
+        "first user": "user0",
+        "last user": f"user{NUM_USERS - 1}",
+        "unknown user": "nobody",
+    }
+    print(f"{NUM_USERS} cached users, {ITERATIONS} lookups each")
+    print(f"{'lookup':<14} {'index':>12} {'scan':>12}")
+    for name, username in names.items():
+        indexed = timeit.timeit(
+            lambda: manager.get_by_username(username), number=ITERATIONS
+        )
+        scanned = timeit.timeit(
+            lambda: scan_lookup(manager.users, username), number=ITERATIONS
+        )
+        print(
+            f"{name:<14} {indexed / ITERATIONS * 1e6:>9.2f} us "
+            f"{scanned / ITERATIONS * 1e6:>9.2f} us"
+        )
+
+
+if __name__ == "__main__":
+    main()
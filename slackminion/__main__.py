@@ -9,6 +9,13 @@ import yaml
 from slackminion.bot import Bot
 
 
+async def run_bot(bot):
+    try:
+        await bot.run()
+    finally:
+        await bot.stop()
+
+
 def main():
     def sigterm_handler(signum, frame):
         bot.runnable = False
@@ -35,8 +42,7 @@ def main():
     bot.start()
     if not args.test:
         signal.signal(signal.SIGTERM, sigterm_handler)
-        asyncio.run(bot.run())
-    bot.stop()
+        asyncio.run(run_bot(bot))
 
     if args.test:
         test_passed = True
@@ -59,6 +65,14 @@ def main():
                 output.append(p)
         output.append("")
         output.append("Bot startup time: %.03f ms" % bot.metrics["startup_time"])
+        if bot.metrics["snapshot_load_time"]:
+            output.append(
+                "Bot startup time excluding snapshot load: %.03f ms (snapshot loaded in %.03f ms)"
+                % (
+                    bot.metrics["startup_time"] - bot.metrics["snapshot_load_time"],
+                    bot.metrics["snapshot_load_time"],
+                )
+            )
         output.append(
             "Plugins: %d total, %d loaded, %d failed"
             % (
@@ -1,16 +1,27 @@
 import asyncio
 import datetime
+import json
 import logging
+import time
+import zlib
+from functools import partial
 
 from slack_sdk.web.async_client import AsyncWebClient
 
-from slackminion.dispatcher import MessageDispatcher
+from slackminion.dispatcher import MessageDispatcher, could_be_command
 from slackminion.exceptions import NotSetupError
 from slackminion.plugin import PluginManager
 from slackminion.plugins.core import version as my_version
 from slackminion.slack import SlackConversation, SlackEvent, SlackUser
 from slackminion.slack.rtm_client import MyRTMClient
-from slackminion.utils.async_task import AsyncTaskManager
+from slackminion.utils.async_task import AsyncTaskManager, DispatchScheduler
+from slackminion.utils.cache import ChannelCache, LRUCache
+from slackminion.utils.outbound import OutboundQueue
+from slackminion.utils.util import (
+    MAX_MESSAGE_LENGTH,
+    call_with_rate_limit,
+    split_message,
+)
 from slackminion.webserver import Webserver
 
 ignore_subtypes = [
@@ -21,9 +32,14 @@ ignore_subtypes = [
 ]
 
 
+SNAPSHOT_NAME = "cache_snapshot.json.z"
+SNAPSHOT_VERSION = 1
+
+
 class Bot(object):
     rtm_client = None
     api_client = None
+    task_manager = None
     webserver = None
     _info = {}
     _channels = {}
@@ -36,16 +52,55 @@ class Bot(object):
 
     def __init__(self, config, test_mode=False, dev_mode=False):
         self.config = config
-        self.dispatcher = MessageDispatcher()
+        self.dispatcher = MessageDispatcher(config)
         self.log = logging.getLogger(type(self).__name__)
         self.plugin_manager = PluginManager(self, test_mode)
         self.plugins = self.plugin_manager  # backward compatibility
         self.test_mode = test_mode
         self.dev_mode = dev_mode
         self.event_loop = asyncio.get_event_loop()
+        self._user_loads = {}
+        # Evicted channels are reloaded by get_channel when next needed
+        channel_cache_config = config.get("channel_cache") or {}
+        self._channels = ChannelCache(
+            max_size=channel_cache_config.get("max_size"),
+            ttl=channel_cache_config.get("ttl"),
+        )
+        # channel events keep the cache current, this is only a backstop
+        self.channel_sync_interval = channel_cache_config.get(
+            "full_sync_interval", 21600
+        )
+
+        # users and channels are saved every interval seconds and at shutdown,
+        # and loaded at startup so the caches don't start out empty
+        snapshot_config = config.get("snapshot") or {}
+        self.snapshot_interval = snapshot_config.get("interval")
+
+        scheduler_config = config.get("message_scheduler") or {}
+        self.scheduler = None
+        if scheduler_config.get("workers", 0) > 0:
+            self.scheduler = DispatchScheduler(
+                workers=scheduler_config["workers"],
+                max_queue=scheduler_config.get("max_queue", 1000),
+            )
+
+        # Commands streaming output with @cmd(stream="update") edit their
+        # message at most this often
+        self.stream_update_interval = config.get("stream_update_interval", 1.0)
+
+        # Outgoing messages are paced to stay within slack's rate limits
+        outbound_config = config.get("outbound_queue") or {}
+        self.outbound = None
+        if outbound_config.get("enabled"):
+            self.outbound = OutboundQueue(
+                self._post_message,
+                channel_interval=outbound_config.get("channel_interval", 1.0),
+                workspace_rate=outbound_config.get("workspace_rate", 10),
+                coalesce_window=outbound_config.get("coalesce_window", 0),
+            )
 
         if self.test_mode:
-            self.metrics = {"startup_time": 0}
+            self.metrics = {"startup_time": 0, "snapshot_load_time": 0}
 
         self.version = my_version
         try:
@@ -70,11 +125,11 @@ class Bot(object):
     @property
     def channels(self):
         if self.is_setup:
-            if self._channels:
+            if self._channels is not None:
                 return self._channels
             else:
                 self.log.warning(
-                    "Bot.channels was called but self._bot_channels was empty!"
+                    "Bot.channels was called but self._channels wasn't set up!"
                 )
                 return {}
         self.log.warning("Bot.channels was called before bot was setup.")
@@ -90,29 +145,55 @@ class Bot(object):
         )
 
     async def update_channels(self):
+        """
+        Reconciles the channel cache with the channels the bot is a member of.
+
+        Channel membership is otherwise kept current by RTM events, so this
+        only needs to run occasionally to catch anything missed while
+        disconnected.
+        """
         self.log.debug("Starting update_channels")
         try:
-            resp = await self.get_my_conversations()
+            # pages are fetched back to back, waiting only when slack asks us to
+            resp = await call_with_rate_limit(self.get_my_conversations)
             results = resp.get("channels")
 
             while resp.get("response_metadata").get("next_cursor"):
                 cursor = resp.get("response_metadata").get("next_cursor")
-                resp = await self.get_my_conversations(cursor=cursor)
-                results.extend(resp.get("channels"))
-                await asyncio.sleep(1)
-
-            for channel in results:
-                self._channels.update(
-                    {
-                        channel.get("id"): SlackConversation(
-                            conversation=channel, api_client=self.api_client
-                        )
-                    }
+                resp = await call_with_rate_limit(
+                    self.get_my_conversations, cursor=cursor
                 )
+                results.extend(resp.get("channels"))
+
+            member_of = set()
+            for channel_info in results:
+                self._cache_channel(channel_info)
+                member_of.add(channel_info.get("id"))
+
+            # drop channels we've left while events weren't being received; IMs
+            # aren't listed by users.conversations so are left alone
+            for channel_id, channel in self._channels.items():
+                if channel_id not in member_of and not (
+                    channel.is_im or channel.is_mpim
+                ):
+                    self.log.debug(f"No longer a member of {channel_id}")
+                    del self._channels[channel_id]
         except Exception:  # noqa
             self.log.exception("update_channels failed due to exception")
         self.log.debug(f"Loaded {len(self.channels)} channels.")
 
+    def _cache_channel(self, channel_info):
+        # refresh cached channels in place so existing references stay current
+        channel = self._channels.peek(channel_info.get("id"))
+        if channel is None:
+            channel = SlackConversation(
+                conversation=channel_info, api_client=self.api_client
+            )
+        else:
+            channel.update(channel_info)
+        self._channels[channel.id] = channel
+        return channel
+
     def start(self):
         """Initializes the bot, plugins, and everything."""
         self.log.info(f"Starting SlackMinion version {self.version}")
@@ -131,6 +212,8 @@ class Bot(object):
             token=self.config.get("slack_token"), run_async=True
         )
         self.api_client = AsyncWebClient(token=self.config.get("slack_token"))
+        if self.snapshot_interval:
+            self.load_snapshot()
 
         self.always_send_dm = ["_unauthorized_"]
         if "always_send_dm" in self.config:
@@ -161,24 +244,39 @@ class Bot(object):
         # Start the web server
         self.log.debug("Starting Web Server")
         self.webserver.start()
-        first_connect = True
 
         self._info = await self.api_client.auth_test()
-
-        while self.runnable:
-            if first_connect:
-                self.log.debug("Starting RTM Client")
-                self.task_manager.start_rtm_client(self.rtm_client)
-                self.plugin_manager.connect()
-                self.task_manager.start_periodic_task(600, self.update_channels)
-                first_connect = False
-            await self.task_manager.start()
-            await asyncio.sleep(1)
+        if self.scheduler is not None:
+            self.scheduler.start()
+        if self.outbound is not None:
+            self.outbound.start()
+
+        self.log.debug("Starting RTM Client")
+        self.task_manager.start_rtm_client(self.rtm_client)
+        self.plugin_manager.connect()
+        self.task_manager.start_periodic_task(
+            self.channel_sync_interval, self.update_channels
+        )
+        if self.snapshot_interval:
+            self.task_manager.start_periodic_task(
+                self.snapshot_interval, self.save_snapshot
+            )
+        # returns once the bot is shutting down, the task manager restarts
+        # the RTM client if it disconnects
+        await self.task_manager.start()
 
     async def stop(self):
         """Does cleanup of bot and plugins."""
         if not self.test_mode:
             self.plugin_manager.save_state()
+            if self.snapshot_interval:
+                await self.save_snapshot()
+        if self.scheduler is not None:
+            self.log.debug("Stopping message scheduler")
+            await self.scheduler.stop()
+        if self.outbound is not None:
+            self.log.debug("Flushing outbound messages")
+            await self.outbound.stop()
         self.log.debug("Stopping Task Manager")
         await self.task_manager.shutdown()
         self.log.debug("Stopping RTM client.")
@@ -189,6 +287,88 @@ class Bot(object):
         if self.webserver is not None:
             self.webserver.stop()
         self.plugin_manager.unload_all()
+        self.dispatcher.shutdown()
+
+    def _build_snapshot(self):
+        snapshot = {
+            "version": SNAPSHOT_VERSION,
+            "saved_at": time.time(),
+            "channels": [
+                channel.conversation
+                for channel in self._channels.values()
+                if channel.conversation
+            ],
+            "users": [],
+        }
+        if hasattr(self, "user_manager"):
+            snapshot["users"] = [
+                user.user_info for user in self.user_manager.users.values()
+            ]
+        return zlib.compress(json.dumps(snapshot, separators=(",", ":")).encode())
+
+    async def save_snapshot(self):
+        """Saves the cached users and channels with the state handler"""
+        try:
+            data = self._build_snapshot()
+            await self.event_loop.run_in_executor(
+                None, self.plugin_manager.save_blob, SNAPSHOT_NAME, data
+            )
+            self.log.debug(f"Saved {len(data)} byte cache snapshot")
+        except Exception:  # noqa
+            self.log.exception("Failed to save cache snapshot")
+
+    def load_snapshot(self):
+        """
+        Fills the user and channel caches from the last saved snapshot.
+
+        Entries may be out of date: channels are reconciled by update_channels
+        once connected, and users are reloaded in the background the first
+        time they're used.
+        """
+        load_start = time.monotonic()
+        data = self.plugin_manager.load_blob(SNAPSHOT_NAME)
+        if data is None:
+            self.log.info("No cache snapshot found")
+            return
+        try:
+            snapshot = json.loads(zlib.decompress(data))
+            if snapshot.get("version") != SNAPSHOT_VERSION:
+                self.log.warning("Ignoring cache snapshot from another version")
+                return
+            for channel_info in snapshot["channels"]:
+                self._channels[channel_info["id"]] = SlackConversation(
+                    conversation=channel_info, api_client=self.api_client
+                )
+            if hasattr(self, "user_manager"):
+                self.user_manager.load_snapshot(snapshot["users"])
+        except Exception:  # noqa
+            self.log.exception("Failed to load cache snapshot")
+            return
+        load_time = (time.monotonic() - load_start) * 1000.0
+        self.log.info(
+            f"Loaded {len(snapshot['channels'])} channels and "
+            f"{len(snapshot['users'])} users from snapshot in {load_time:.03f} ms"
+        )
+        if self.test_mode:
+            self.metrics["snapshot_load_time"] = load_time
+
+    def get_metrics(self):
+        """Collects runtime metrics from the bot's components"""
+        metrics = {
+            "command_executor": self.dispatcher.executor.metrics,
+            "command_timeouts": dict(self.dispatcher.timeouts),
+        }
+        if self.scheduler is not None:
+            metrics["message_scheduler"] = self.scheduler.metrics
+        if self.outbound is not None:
+            metrics["outbound_queue"] = self.outbound.metrics
+        if self.task_manager is not None:
+            metrics["task_manager"] = self.task_manager.metrics
+        if isinstance(self._channels, LRUCache):
+            metrics["channel_cache"] = self._channels.metrics
+        if hasattr(self, "user_manager"):
+            metrics["user_manager"] = self.user_manager.metrics
+        return metrics
 
     async def send_message(
         self,
@@ -199,6 +379,8 @@ class Bot(object):
         attachments=None,
         parse=None,
         link_names=1,
+        priority="interactive",
+        coalesce=True,
     ):
         """
         Sends a message to the specified channel
@@ -209,6 +391,8 @@ class Bot(object):
         * thread - reply to the thread. See https://api.slack.com/docs/message-threading#threads_party
         * reply_broadcast - Set to true to indicate your reply is germane to all members of a channel
         * parse - Set to "full" for the slack api to linkify names and channels
+        * priority - "interactive" or "bulk".  With the outbound queue enabled, interactive messages are sent first.
+        * coalesce - allow the outbound queue to merge this message with others sent right after it
         """
         if not text:
             self.log.debug("send_message was called without text to send")
@@ -217,9 +401,8 @@ class Bot(object):
         if isinstance(channel, SlackConversation):
             channel = channel.channel_id
         self.log.debug(f"Trying to send to {channel}: {text[:40]} (truncated)")
-        await self.api_client.chat_postMessage(
+        kwargs = dict(
             as_user=True,
-            channel=channel,
             text=text,
             thread_ts=thread,
             reply_broadcast=reply_broadcast,
@@ -227,8 +410,18 @@ class Bot(object):
             parse=parse,
             link_names=link_names,
         )
+        if self.outbound is not None and self.outbound.is_started:
+            return await self.outbound.send_message(
+                channel, priority=priority, coalesce=coalesce, **kwargs
+            )
+        return await self._post_message(channel=channel, **kwargs)
+
+    async def _post_message(self, **kwargs):
+        return await self.api_client.chat_postMessage(**kwargs)
 
-    async def send_im(self, user, text, parse=None):
+    async def send_im(
+        self, user, text, parse=None, priority="interactive", coalesce=True
+    ):
         """
         Sends a message to a user as an IM
 
@@ -239,7 +432,9 @@ class Bot(object):
             channelid = user.user_id
         else:
             channelid = user
-        await self.send_message(channelid, text, parse)
+        await self.send_message(
+            channelid, text, parse=parse, priority=priority, coalesce=coalesce
+        )
 
     async def at_user(self, user, channel_id, text, **kwargs):
         """
@@ -272,32 +467,71 @@ class Bot(object):
             self.log.debug(data.get("text"))
             return
 
+        # most messages aren't commands, skip them before doing any real work
+        if not could_be_command(data.get("text")):
+            return
+
         event = SlackEvent(event_type=event_type, **payload)
         self.log.debug("Received event type: %s", event.event_type)
 
+        # the user and channel are looked up by the dispatcher once the message
+        # matches a command, most "!" messages don't need them
+        user_loader = channel_loader = None
         if event.user_id and event.user_id != self.my_userid:
             if hasattr(self, "user_manager"):
-                event.user = self.user_manager.get(event.user_id)
-                if event.user is None:
-                    slack_user = SlackUser(
-                        user_id=event.user_id, api_client=self.api_client
-                    )
-                    await slack_user.load()
-                    event.user = self.user_manager.set(slack_user)
+                user_loader = partial(self._get_user, event.user_id)
         if event.channel_id:
-            event.channel = await self.get_channel(event.channel_id)
+            channel_loader = partial(self.get_channel, event.channel_id)
+        event.defer(user=user_loader, channel=channel_loader)
 
         return event
 
+    async def _get_user(self, user_id):
+        """
+        Returns the SlackUser for user_id from the user manager, loading it from
+        slack if it isn't cached.  Concurrent lookups of the same user share a
+        single users_info request.
+        """
+        user = self.user_manager.get(user_id)
+        if user is not None:
+            return user
+        pending = self._user_loads.get(user_id)
+        if pending is None:
+            pending = asyncio.ensure_future(self._load_user(user_id))
+            self._user_loads[user_id] = pending
+            pending.add_done_callback(lambda _: self._user_loads.pop(user_id, None))
+        # shield the shared request so one waiter being cancelled doesn't fail the rest
+        return await asyncio.shield(pending)
+
+    async def _load_user(self, user_id):
+        slack_user = SlackUser(user_id=user_id, api_client=self.api_client)
+        await slack_user.load()
+        return self.user_manager.set(slack_user)
+
     def _unpack_payload(self, **payload):
         data = payload["data"]
         event_type = data["type"]
         return event_type, data
 
     def _add_event_handlers(self):
-        MyRTMClient.on(event="channel_joined", callback=self._event_channel_joined)
+        channel_handlers = {
+            "channel_joined": self._event_channel_joined,
+            "group_joined": self._event_channel_joined,
+            "member_joined_channel": self._event_member_joined_channel,
+            "channel_left": self._event_channel_left,
+            "group_left": self._event_channel_left,
+            "channel_archive": self._event_channel_left,
+            "group_archive": self._event_channel_left,
+            "channel_rename": self._event_channel_rename,
+            "group_rename": self._event_channel_rename,
+        }
+        for event_type, callback in channel_handlers.items():
+            MyRTMClient.on(event=event_type, callback=callback)
         MyRTMClient.on(event="message", callback=self._event_message)
         MyRTMClient.on(event="error", callback=self._event_error)
+        # each event type gets one handler however many plugins subscribe to
+        # it, broadcast_event passes it on to all of them
+        plugin_event_types = {}
         for plugin in self.plugin_manager.plugins:
             if plugin.notify_event_types:
                 t = type(plugin.notify_event_types)
@@ -311,13 +545,17 @@ class Bot(object):
                     self.log.info(
                         f"Registering handler for {event_type} for plugin {plugin.__class__.__name__}"
                     )
-                    try:
-                        MyRTMClient.on(event=event_type, callback=self._event_plugin)
-                    except Exception as e:
-                        self.log.exception(
-                            f"Unexpected exception when attempting to register event handler for "
-                            f'type {event_type} for plugin {plugin.__class__.__name__}" [{e}] '
-                        )
+                    plugin_event_types.setdefault(event_type, plugin)
+        # _event_error already broadcasts errors to plugins
+        plugin_event_types.pop("error", None)
+        for event_type, plugin in plugin_event_types.items():
+            try:
+                MyRTMClient.on(event=event_type, callback=self._event_plugin)
+            except Exception as e:
+                self.log.exception(
+                    f"Unexpected exception when attempting to register event handler for "
+                    f'type {event_type} for plugin {plugin.__class__.__name__}" [{e}] '
+                )
 
     # generic handler for handling event types registered by plugins via notify_event_types class attribute
     async def _event_plugin(self, **payload):
@@ -328,16 +566,69 @@ class Bot(object):
     async def _event_channel_joined(self, **payload):
         try:
             event_type, data = self._unpack_payload(**payload)
-            self.log.debug(f"Received channel_joined event: {data}")
-            channel_info = data.get("channel")
-            channel = SlackConversation(
-                conversation=channel_info, api_client=self.api_client
-            )
-            self._channels.update({channel.id: channel})
+            self.log.debug(f"Received {event_type} event: {data}")
+            self._cache_channel(data.get("channel"))
+        except Exception:  # noqa
+            self.log.exception("Uncaught exception")
+
+    # member_joined_channel is sent for every member; only the bot's own joins
+    # change which channels we're in
+    async def _event_member_joined_channel(self, **payload):
+        try:
+            event_type, data = self._unpack_payload(**payload)
+            if data.get("user") != self.my_userid:
+                return
+            self.log.debug(f"Received {event_type} event: {data}")
+            await self.get_channel(data.get("channel"))
+        except Exception:  # noqa
+            self.log.exception("Uncaught exception")
+
+    # when the bot leaves a channel or it's archived, stop tracking it
+    async def _event_channel_left(self, **payload):
+        try:
+            event_type, data = self._unpack_payload(**payload)
+            self.log.debug(f"Received {event_type} event: {data}")
+            channel_id = data.get("channel")
+            if isinstance(channel_id, dict):
+                channel_id = channel_id.get("id")
+            if channel_id in self._channels:
+                del self._channels[channel_id]
+        except Exception:  # noqa
+            self.log.exception("Uncaught exception")
+
+    # keep the channel name index current when a channel is renamed
+    async def _event_channel_rename(self, **payload):
+        try:
+            event_type, data = self._unpack_payload(**payload)
+            self.log.debug(f"Received {event_type} event: {data}")
+            channel_info = data.get("channel", {})
+            channel = self._channels.peek(channel_info.get("id"))
+            if channel is None or channel.conversation is None:
+                return
+            old_name = channel.name
+            new_name = channel_info.get("name")
+            if not new_name or new_name == old_name:
+                return
+            channel.conversation["name"] = new_name
+            channel.conversation["name_normalized"] = new_name
+            previous_names = channel.conversation.get("previous_names") or []
+            if old_name and old_name not in previous_names:
+                channel.conversation["previous_names"] = [old_name] + previous_names
+            self._channels[channel.id] = channel
         except Exception:  # noqa
             self.log.exception("Uncaught exception")
 
     async def _event_message(self, **payload):
+        # With a scheduler messages are handled concurrently, but in order
+        # within each channel or thread
+        if self.scheduler is not None and self.scheduler.is_started:
+            data = payload.get("data", {})
+            key = (data.get("channel"), data.get("thread_ts"))
+            await self.scheduler.submit(key, self._handle_message, payload)
+        else:
+            await self._handle_message(payload)
+
+    async def _handle_message(self, payload):
         msg = await self._parse_event(payload)
         if not msg:
             return
@@ -347,7 +638,9 @@ class Bot(object):
             self._load_user_rights(msg.user)
         try:
             self.log.debug(f"Sending to dispatcher: {msg}")
-            cmd, output, cmd_options = await self.dispatcher.push(msg, self.dev_mode)
+            cmd, output, cmd_options = await self.dispatcher.push(
+                msg, self.dev_mode, on_stream=partial(self._send_stream, msg)
+            )
             self.log.debug(f"Output from dispatcher: {output}")
 
             if output:
@@ -359,23 +652,107 @@ class Bot(object):
         self.log.debug(
             f"Preparing to send  output for  {cmd} with options {cmd_options}"
         )
-        if msg.thread_ts:
-            thread_ts = msg.thread_ts
-        elif cmd_options.get("reply_in_thread"):
-            thread_ts = msg.ts
-        else:
-            thread_ts = None
+        thread_ts = self._reply_thread(msg, cmd_options)
         parse = cmd_options.get("parse", None)
-        if cmd in self.always_send_dm or cmd_options.get("always_send_dm"):
-            await self.send_im(msg.user, output, parse=parse)
-        else:
-            await self.send_message(
-                msg.channel,
-                output,
-                thread=thread_ts,
-                reply_broadcast=cmd_options.get("reply_broadcast"),
-                parse=parse,
-            )
+        command = self.dispatcher.commands.get(cmd)
+        coalesce = command.coalesce if command is not None else True
+        send_dm = cmd in self.always_send_dm or cmd_options.get("always_send_dm")
+        for chunk in split_message(str(output)):
+            if send_dm:
+                await self.send_im(msg.user, chunk, parse=parse, coalesce=coalesce)
+            else:
+                await self.send_message(
+                    msg.channel,
+                    chunk,
+                    thread=thread_ts,
+                    reply_broadcast=cmd_options.get("reply_broadcast"),
+                    parse=parse,
+                    coalesce=coalesce,
+                )
+
+    async def _send_stream(self, msg, cmd, cmd_options, chunks):
+        """Sends output streamed by a command, called by the dispatcher"""
+        send_dm = cmd in self.always_send_dm or cmd_options.get("always_send_dm")
+        await self._stream_output(
+            msg.user.user_id if send_dm else msg.channel,
+            chunks,
+            thread=None if send_dm else self._reply_thread(msg, cmd_options),
+            reply_broadcast=None if send_dm else cmd_options.get("reply_broadcast"),
+            parse=cmd_options.get("parse", None),
+            mode=cmd_options.get("stream", "replies"),
+        )
+
+    @staticmethod
+    def _reply_thread(msg, cmd_options):
+        if msg.thread_ts:
+            return msg.thread_ts
+        if cmd_options.get("reply_in_thread"):
+            return msg.ts
+        return None
+
+    async def _stream_output(
+        self,
+        channel,
+        output,
+        thread=None,
+        reply_broadcast=None,
+        parse=None,
+        mode="replies",
+    ):
+        """
+        Sends the chunks of text produced by an async iterator as they're
+        produced.
+
+        In "replies" mode each chunk is sent as a message; if the output isn't
+        already going to a thread, chunks after the first are replies to the
+        first.  In "update" mode chunks are appended to one message, which is
+        edited at most every stream_update_interval seconds, and a new message
+        is started when it's full.
+        """
+        message = None  # response for the message being updated
+        text = ""
+        edited_at = 0
+        pending_edit = False
+        async for chunk in output:
+            for part in split_message(str(chunk)) if chunk else []:
+                if mode == "update" and message is not None:
+                    if len(text) + 1 + len(part) <= MAX_MESSAGE_LENGTH:
+                        text = f"{text}\n{part}"
+                        pending_edit = True
+                        if time.monotonic() - edited_at >= self.stream_update_interval:
+                            await self.update_message(message, text)
+                            edited_at, pending_edit = time.monotonic(), False
+                        continue
+                    if pending_edit:
+                        await self.update_message(message, text)
+                response = await self.send_message(
+                    channel,
+                    part,
+                    thread=thread,
+                    reply_broadcast=reply_broadcast,
+                    parse=parse,
+                    coalesce=False,
+                )
+                if mode == "update":
+                    message, text = response, part
+                    edited_at, pending_edit = time.monotonic(), False
+                elif thread is None and response:
+                    thread = response.get("ts")
+        if pending_edit:
+            await self.update_message(message, text)
+
+    async def update_message(self, message, text):
+        """
+        Replaces the text of a message the bot sent
+
+        * message - the response from send_message for the message
+        * text - the new text
+        """
+        if not message:
+            return
+        await self.api_client.chat_update(
+            channel=message.get("channel"), ts=message.get("ts"), text=text
+        )
 
     async def _event_error(self, **payload):
         event_type, data = self._unpack_payload(**payload)
@@ -383,7 +760,8 @@ class Bot(object):
         self.log.error(f"Received an error response from Slack: {payload}")
 
     def get_channel_by_name(self, channel_name):
-        channels = [x for x in self.channels.values() if channel_name in x.all_names]
+        channels = self.channels
+        channels = channels.get_by_name(channel_name) if channels else []
         if len(channels) == 0:
             raise RuntimeError(f"Unable to find channel {channel_name}")
         if len(channels) > 1:
@@ -391,9 +769,8 @@ class Bot(object):
         return channels[0]
 
     async def get_channel(self, channel_id):
-        if channel_id in self.channels.keys():
-            channel = self.channels.get(channel_id)
-        else:
+        channel = self.channels.get(channel_id)
+        if channel is None:
             channel = SlackConversation(None, self.api_client)
             await channel.load(channel_id)
             self._channels.update({channel_id: channel})
@@ -1,31 +1,70 @@
 import inspect
 import logging
+import re
 import unicodedata
+from collections import Counter
+from contextvars import ContextVar
 
 from flask import current_app, request
 from six import string_types
 
-from slackminion.exceptions import DuplicateCommandError
-from slackminion.utils.util import format_docstring, strip_formatting
+from slackminion.exceptions import CommandTimeoutError, DuplicateCommandError
+from slackminion.utils.executor import CommandExecutor, run_with_timeout
+from slackminion.utils.util import format_docstring, strip_formatting_args
+
+# The PluginCommand being run by the current task, if any
+current_command = ContextVar("current_command", default=None)
+
+_FIRST_CHARACTER = re.compile(r"\s*(\S)")
+
+
+def is_stream(output):
+    """Whether command output is a stream of messages rather than a message"""
+    return inspect.isgenerator(output) or inspect.isasyncgen(output)
+
+
+def could_be_command(text):
+    """
+    Cheaply checks whether message text might be a command, without
+    normalizing or splitting the whole message.  Commands start with "!" once
+    NFKD normalized, so only the first non-space character is looked at.
+    """
+    if not isinstance(text, str):
+        return False
+    match = _FIRST_CHARACTER.match(text)
+    if match is None:
+        return False
+    first = match.group(1)
+    if first.isascii():
+        return first == "!"
+    # compatibility characters such as a fullwidth exclamation mark
+    normalized = unicodedata.normalize("NFKD", first).lstrip()
+    return not normalized or normalized.startswith("!")
 
 
 class BaseCommand(object):
     def __init__(self, method):
         self.method = method
         self.help = method.__doc__
+        self._short_help = None
+        self._formatted_help = None
 
     @property
     def short_help(self):
-        if self.help:
-            if "." in self.help:
-                return self.help[0 : self.help.find(".") + 1]
-        return "No description provided."
+        if self._short_help is None:
+            self._short_help = "No description provided."
+            if self.help:
+                if "." in self.help:
+                    self._short_help = self.help[0 : self.help.find(".") + 1]
+        return self._short_help
 
     @property
     def formatted_help(self):
-        if self.help:
-            return format_docstring(self.help)
-        return "No description provided."
+        if self._formatted_help is None:
+            self._formatted_help = "No description provided."
+            if self.help:
+                self._formatted_help = format_docstring(self.help)
+        return self._formatted_help
 
     def execute(self, *args, **kwargs):
         return self.method(*args, **kwargs)
@@ -39,8 +78,17 @@ class PluginCommand(BaseCommand):
         self.is_subcmd = method.is_subcmd
         self.while_ignored = method.while_ignored
         self.cmd_options = method.cmd_options
+        self.timeout = getattr(method, "timeout", None)
         self.is_async = inspect.iscoroutinefunction(method)
 
+    @property
+    def coalesce(self):
+        """Whether messages sent for this command may be merged with others"""
+        plugin = getattr(self.method, "__self__", None)
+        return self.cmd_options.get("coalesce", True) and getattr(
+            plugin, "coalesce_messages", True
+        )
+
 
 class WebhookCommand(BaseCommand):
     def __init__(self, method, form_params):
@@ -59,16 +107,83 @@ class WebhookCommand(BaseCommand):
         return self.method(**args)
 
 
-class MessageDispatcher(object):
+class CommandTrie(object):
+    """
+    Indexes commands by their space separated tokens so the longest command
+    matching the start of a message can be found in a single pass over the
+    message tokens.
+    """
+
+    class _Node(object):
+        __slots__ = ("children", "cmd")
+
+        def __init__(self):
+            self.children = {}
+            self.cmd = None
+
     def __init__(self):
+        self.root = self._Node()
+
+    def add(self, cmd):
+        node = self.root
+        for token in cmd.split(" "):
+            node = node.children.setdefault(token, self._Node())
+        node.cmd = cmd
+
+    def remove(self, cmd):
+        path = [self.root]
+        for token in cmd.split(" "):
+            node = path[-1].children.get(token)
+            if node is None:
+                return
+            path.append(node)
+        path[-1].cmd = None
+        # prune nodes no other command runs through
+        tokens = cmd.split(" ")
+        for node, parent, token in zip(path[:0:-1], path[-2::-1], tokens[::-1]):
+            if node.children or node.cmd is not None:
+                break
+            del parent.children[token]
+
+    def find_longest_prefix(self, args):
+        """
+        Returns the longest registered command matching the start of args and
+        the number of tokens it consumed, or (None, 0) if nothing matched.
+        """
+        node = self.root
+        match, length = None, 0
+        for num_parts, token in enumerate(args, 1):
+            node = node.children.get(token)
+            if node is None:
+                break
+            if node.cmd is not None:
+                match, length = node.cmd, num_parts
+        return match, length
+
+
+class MessageDispatcher(object):
+    def __init__(self, config=None):
         self.log = logging.getLogger(type(self).__name__)
+        config = config or {}
         self.commands = {}
+        self.command_index = CommandTrie()
+        self.executor = CommandExecutor(config.get("command_executor"))
+        self.command_timeout = config.get("command_timeout")
+        self.timeouts = Counter()
+        # rendered help, kept until the registered commands change
+        self.help_cache = {}
         self.ignored_channels = []
         self.ignored_events = ["message_replied", "message_changed"]
 
-    async def push(self, event, dev_mode=False):
+    async def push(self, event, dev_mode=False, on_stream=None):
         """
         Takes a SlackEvent, parses it for a command, and runs against registered plugin
+
+        Commands can stream their output by returning a generator or async
+        generator.  If on_stream is given, it is awaited as
+        on_stream(cmd, cmd_options, chunks) with an async iterator of the chunks,
+        under the command's timeout and error handling, and the output returned
+        is None.
         """
         self.log.debug(event)
         if self._ignore_event(event):
@@ -82,6 +197,7 @@ class MessageDispatcher(object):
         self.log.debug("Searching for command using chunks: %s", args)
         cmd, msg_args = self._find_longest_prefix_command(args)
         if cmd is not None:
+            await event.resolve()
             if event.user is None:
                 self.log.debug("Discarded message with no originating user: %s", event)
                 return None, None, None
@@ -103,28 +219,32 @@ class MessageDispatcher(object):
 
                 # Strip formatting if requested by plugin
                 if f.cmd_options.get("strip_formatting"):
-                    input_string = " ".join(msg_args)
-                    self.log.debug("Calling strip_format with %s", input_string)
-                    input_string = strip_formatting(input_string)
-                    self.log.debug("Format Stripped message is %s", input_string)
-                    msg_args = input_string.split(" ")
+                    msg_args = strip_formatting_args(msg_args)
+                    self.log.debug("Format Stripped args are %s", msg_args)
+                timeout = self._get_timeout(f)
+                command_token = current_command.set(f)
                 try:
-                    if f.is_async:
-                        if not dev_mode:
-                            output = await f.execute(event, msg_args)
-                        else:
-                            output = f"DEV_MODE: Would have run async function {f} with args {msg_args}"
-                        return cmd, output, f.cmd_options
+                    if not dev_mode:
+                        output = await run_with_timeout(
+                            self._run_command(cmd, f, event, msg_args, on_stream),
+                            timeout,
+                        )
+                    elif f.is_async:
+                        output = f"DEV_MODE: Would have run async function {f} with args {msg_args}"
                     else:
-                        if not dev_mode:
-                            output = f.execute(event, msg_args)
-                        else:
-                            output = f"DEV_MODE: Would have run function {cmd} with args {msg_args}"
-                        return cmd, output, f.cmd_options
+                        output = f"DEV_MODE: Would have run function {cmd} with args {msg_args}"
+                    return cmd, output, f.cmd_options
+                except CommandTimeoutError:
+                    self.timeouts[cmd] += 1
+                    self.log.warning(f"Command {cmd} timed out after {timeout}s")
+                    output = f"Sorry, {cmd} timed out after {timeout} seconds."
+                    return cmd, output, f.cmd_options
                 except Exception as e:  # noqa we don't want plugins to crash the bot so
                     self.log.exception("Plugin raised exception")
                     output = f"Command failed due to an exception: {str(e)}"
                     return cmd, output, f.cmd_options
+                finally:
+                    current_command.reset(command_token)
             return (
                 "_unauthorized_",
                 "Sorry, you are not authorized to run %s" % cmd,
@@ -132,6 +252,20 @@ class MessageDispatcher(object):
             )
         return None, None, None
 
+    async def _run_command(self, cmd, command, event, msg_args, on_stream=None):
+        if command.is_async:
+            output = await command.execute(event, msg_args)
+        else:
+            output = await self.executor.run(command, event, msg_args)
+        if on_stream is None or not is_stream(output):
+            return output
+        chunks = self.executor.iterate(command, output)
+        try:
+            await on_stream(cmd, command.cmd_options, chunks)
+        finally:
+            await chunks.aclose()
+        return None
+
     def _ignore_event(self, message):
         """
         message_replied event is not truly a message event and does not have a message.text
@@ -179,6 +313,8 @@ class MessageDispatcher(object):
                         "Registered command %s", type(plugin).__name__ + "." + cmd_name
                     )
                     self.commands[cmd] = PluginCommand(method)
+                    self.command_index.add(cmd)
+                    self.help_cache.clear()
             elif callable(method) and hasattr(method, "is_webhook"):
                 self.log.info(
                     "Registered webhook %s", type(plugin).__name__ + "." + name
@@ -192,6 +328,15 @@ class MessageDispatcher(object):
                         methods=[method.method],
                     )
 
+    def unregister_plugin(self, plugin):
+        """Removes a plugin's commands from the dispatcher"""
+        self.log.info("Unregistering plugin %s", type(plugin).__name__)
+        for cmd, command in list(self.commands.items()):
+            if getattr(command.method, "__self__", None) is plugin:
+                del self.commands[cmd]
+                self.command_index.remove(cmd)
+        self.help_cache.clear()
+
     def ignore(self, channel):
         if channel.is_channel:
             if channel.name not in self.ignored_channels:
@@ -207,14 +352,19 @@ class MessageDispatcher(object):
         return False
 
     def _find_longest_prefix_command(self, args):
-        num_parts = len(args)
-        while num_parts > 0:
-            cmd = " ".join(args[0:num_parts])
-            if cmd in self.commands:
-                return cmd, args[num_parts:]
-            num_parts -= 1
+        cmd, num_parts = self.command_index.find_longest_prefix(args)
+        if cmd is not None:
+            return cmd, args[num_parts:]
         return None, None
 
+    def shutdown(self):
+        self.executor.shutdown()
+
+    def _get_timeout(self, cmd):
+        """Returns the command's timeout in seconds, or None if it has none"""
+        timeout = self.command_timeout if cmd.timeout is None else cmd.timeout
+        return timeout or None
+
     def _get_command(self, cmd, user):
         can_run_cmd = True
         if hasattr(self, "auth_manager"):
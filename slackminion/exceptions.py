@@ -17,3 +17,11 @@ class DuplicatePluginError(Exception):  # pragma: nocover
 class NotSetupError(Exception):  # pragma: nocover
     def __str__(self):
         return "Bot not setup.  Please run start() before run()."
+
+
+class CommandTimeoutError(Exception):
+    def __init__(self, timeout):
+        self.timeout = timeout
+
+    def __str__(self):
+        return "Command timed out after %s seconds" % self.timeout
@@ -11,6 +11,9 @@ def cmd(
     reply_broadcast=False,
     parse=None,
     strip_formatting=False,
+    timeout=None,
+    coalesce=True,
+    stream="replies",
     *args,
     **kwargs
 ):
@@ -25,6 +28,10 @@ def cmd(
     * reply_broadcast - if replying in a thread, whether to also send the message to the channel
     * parse - Set to "full" for the slack api to linkify names and channels
     * strip_formatting - Remove formtting added by slack to the messages
+    * timeout - seconds to wait for the command before giving up, overrides command_timeout from config.yaml (0 disables)
+    * coalesce - allow messages sent by the command to be merged into one when the outbound queue has a coalesce_window
+    * stream - how output from commands that return a generator or async generator is sent: "replies" sends each chunk
+      as a thread reply, "update" edits one message as chunks arrive
     """
 
     def wrapper(func):
@@ -35,11 +42,14 @@ def cmd(
         func.acl = acl
         func.aliases = aliases
         func.while_ignored = while_ignored
+        func.timeout = timeout
         func.cmd_options = {
             "reply_in_thread": reply_in_thread,
             "reply_broadcast": reply_broadcast,
             "parse": parse,
             "strip_formatting": strip_formatting,
+            "coalesce": coalesce,
+            "stream": stream,
         }
         return func
 
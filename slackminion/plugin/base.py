@@ -3,7 +3,9 @@ from __future__ import annotations
 import logging
 import typing
 
-from slackminion.slack import SlackConversation, SlackUser
+from slackminion.dispatcher import current_command
+from slackminion.slack import SlackUser
+from slackminion.utils.async_task import FIXED_RATE, TimerHandle
 
 if typing.TYPE_CHECKING:
     from slackminion.bot import Bot
@@ -11,6 +13,21 @@ if typing.TYPE_CHECKING:
 
 class BasePlugin(object):
     notify_event_types = []
+    # Where this plugin's synchronous commands run: "inline", "thread" or
+    # "process".  None uses the command_executor mode from config.yaml.
+    command_executor = None
+    # Worker pool size, None uses command_executor.max_workers from config.yaml
+    command_executor_workers = None
+    # Set to False to never merge this plugin's messages with others when the
+    # outbound queue has a coalesce_window
+    coalesce_messages = True
+    # Seconds an async handle_event may take before it is cancelled.  None
+    # uses event_handler_timeout from config.yaml, 0 disables the timeout.
+    event_timeout = None
+    # Set to queue up to this many events for handle_event and deliver them
+    # in the background, so a slow plugin doesn't hold up event delivery to
+    # the others.  Events arriving when the queue is full are dropped.
+    event_queue_size = 0
 
     def __init__(self, bot: Bot, **kwargs):
         self.log = logging.getLogger(type(self).__name__)
@@ -28,6 +45,18 @@ class BasePlugin(object):
         if "config" in kwargs:
             self.config = kwargs["config"]
 
+    def __getstate__(self):
+        # Plugins using a process pool are pickled into the worker process,
+        # which has no access to the bot
+        state = self.__dict__.copy()
+        state["_bot"] = None
+        state.pop("log", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.log = logging.getLogger(type(self).__name__)
+
     def on_load(self):
         """
         Executes when a plugin is loaded.
@@ -55,7 +84,14 @@ class BasePlugin(object):
         return True
 
     async def send_message(
-        self, channel, text, thread=None, reply_broadcast=False, parse=None
+        self,
+        channel,
+        text,
+        thread=None,
+        reply_broadcast=False,
+        parse=None,
+        priority="interactive",
+        coalesce=None,
     ):
         """
         Used to send a message to the specified channel.
@@ -65,63 +101,146 @@ class BasePlugin(object):
         * thread - thread to reply in
         * reply_broadcast - whether or not to also send the message to the channel
         * parse - Set to "full" for the slack api to linkify names and channels
+        * priority - "interactive" for replies to users, "bulk" for notifications that can wait
+        * coalesce - whether the message may be merged with others sent right after it, defaults to the
+          plugin's coalesce_messages and the running command's coalesce option
         """
+        if coalesce is None:
+            command = current_command.get()
+            coalesce = self.coalesce_messages and (command is None or command.coalesce)
         self.log.debug(
             "Sending message to channel {} of type {}".format(channel, type(channel))
         )
-        if isinstance(channel, SlackConversation):
-            await self._bot.send_message(channel, text, thread, reply_broadcast, parse)
-        elif isinstance(channel, str):
-            if channel[0] == "@":
-                await self._bot.send_im(channel[1:], text)
-            elif channel[0] == "#":
-                await self._bot.send_message(
-                    channel[1:], text, thread, reply_broadcast, parse
-                )
-            else:
-                await self._bot.send_message(
-                    channel, text, thread, reply_broadcast, parse
-                )
-        else:
-            await self._bot.send_message(channel, text, thread, reply_broadcast, parse)
+        if isinstance(channel, str) and channel[0] == "@":
+            await self._bot.send_im(
+                channel[1:], text, priority=priority, coalesce=coalesce
+            )
+            return
+        if isinstance(channel, str) and channel[0] == "#":
+            channel = channel[1:]
+        await self._bot.send_message(
+            channel,
+            text,
+            thread,
+            reply_broadcast,
+            parse=parse,
+            priority=priority,
+            coalesce=coalesce,
+        )
 
-    def start_periodic_task(self, duration, func, *args, **kwargs):
+    def start_periodic_task(
+        self,
+        duration,
+        func,
+        *args,
+        mode=FIXED_RATE,
+        jitter=0,
+        spread=False,
+        **kwargs,
+    ):
         """
-        Schedules a function to be called after some period of time.
+        Schedules a function to be called every period of time.
 
-        * duration - time in seconds to wait before firing
-        * func - function to be called
+        * duration - time in seconds between calls
+        * func - function or coroutine function to be called
         * args - arguments to pass to the function
+        * mode - FIXED_RATE (default) starts calls duration seconds apart, skipping
+          one if the previous call hasn't finished.  FIXED_DELAY waits duration
+          seconds after each call finishes.
+        * jitter - wait up to this many seconds longer, chosen at random, each time
+        * spread - set to start the first call at some point within duration,
+          rather than straight away, so tasks don't all run together
+
+        Returns the AsyncTimer, whose metrics include how long calls take.
         """
         self.log.debug(
             f"Scheduling periodic task {func.__name__} every {duration}s (args: {args}, kwargs: {kwargs})"
         )
         if self._bot.runnable:
-            self._bot.task_manager.start_periodic_task(duration, func, *args, **kwargs)
+            task = self._bot.task_manager.start_periodic_task(
+                duration,
+                func,
+                *args,
+                mode=mode,
+                jitter=jitter,
+                spread=spread,
+                **kwargs,
+            )
             self.log.info(
                 f"Successfully scheduled call to {func.__name__} every {duration}"
             )
+            return task
+        else:
+            self.log.warning(
+                f"Not scheduling call to {func.__name__} because we're shutting down."
+            )
+
+    def start_cron_task(
+        self, expression, func, *args, tz=None, name=None, catch_up=True, **kwargs
+    ):
+        """
+        Schedules a function to be called on a cron schedule.
+
+        * expression - a cron expression, such as "0 9 * * mon-fri" for 09:00 every weekday
+        * func - function or coroutine function to be called
+        * args - arguments to pass to the function
+        * tz - timezone for the schedule: a tzinfo, a UTC offset in seconds (such as
+          a user's tz_offset) or, on python 3.9+, a name like "America/Los_Angeles".
+          Defaults to the bot's local time.
+        * name - identifies the schedule, defaults to the plugin and function names
+        * catch_up - if a call was missed while the bot was stopped, make it as
+          soon as the bot starts again
+
+        Returns the CronJob.
+        """
+        name = name or f"{type(self).__name__}.{func.__name__}"
+        self.log.debug(f"Scheduling cron task {name} for {expression}")
+        if self._bot.runnable:
+            return self._bot.task_manager.start_cron_task(
+                expression, func, *args, tz=tz, name=name, catch_up=catch_up, **kwargs
+            )
         else:
             self.log.warning(
                 f"Not scheduling call to {func.__name__} because we're shutting down."
             )
 
-    def start_timer(self, duration, func, *args, **kwargs):
+    def stop_cron_task(self, func):
+        """
+        Stops a cron task
+
+        * func - the function passed in start_cron_task, or the name it was given
+        """
+        name = (
+            func if isinstance(func, str) else f"{type(self).__name__}.{func.__name__}"
+        )
+        self.log.debug(f"Stopping cron task {name}")
+        self._bot.task_manager.stop_cron_task(name)
+
+    def start_timer(self, duration, func, *args, persist=False, **kwargs):
         """
         Schedules a function to be called after some period of time.
 
         * duration - time in seconds to wait before firing
-        * func - function to be called
+        * func - function or coroutine function to be called
         * args - arguments to pass to the function
+        * persist - save the timer with the state handler so that it still fires
+          after a restart.  func must be a method of this plugin and the arguments
+          JSON serializable.  If the timer was due while the bot was stopped it
+          fires at startup, and current_timer.get().late is True.
+
+        Returns a TimerHandle that can be passed to stop_timer.
         """
         self.log.debug(
             f"Scheduling call to {func.__name__} in {duration}s (args: {args}, kwargs: {kwargs})"
         )
         if self._bot.runnable:
-            self._bot.task_manager.start_timer(duration, func, *args, **kwargs)
+            if persist:
+                kwargs["persist"] = True
+            handle = self._bot.task_manager.start_timer(duration, func, *args, **kwargs)
             self.log.info(
                 f"Successfully scheduled call to {func.__name__} in {duration}"
             )
+            return handle
         else:
             self.log.warning(
                 f"Not scheduling call to {func.__name__} because we're shutting down."
@@ -131,8 +250,13 @@ class BasePlugin(object):
         """
         Stops a timer if it hasn't fired yet
 
-        * func - the function passed in start_timer
+        * func - the function passed in start_timer, which stops all of its
+          timers, or the TimerHandle start_timer returned
         """
+        if isinstance(func, TimerHandle):
+            self.log.debug("Stopping timer {}".format(func.name))
+            func.cancel()
+            return
         self.log.debug("Stopping timer {}".format(func.__name__))
         self._bot.task_manager.stop_timer(func.__name__)
 
@@ -1,15 +1,33 @@
 from __future__ import annotations
 
+import asyncio
 import inspect
 import json
 import logging
 import typing
 from datetime import datetime
 
+from slackminion.exceptions import CommandTimeoutError
+from slackminion.utils.executor import run_with_timeout
+
 if typing.TYPE_CHECKING:
     from slackminion.bot import Bot
 
 
+class _EventHandler(object):
+    """A plugin's handle_event method, with its timeout and optional queue"""
+
+    def __init__(self, plugin, timeout):
+        self.plugin = plugin
+        self.name = type(plugin).__name__
+        self.is_async = inspect.iscoroutinefunction(plugin.handle_event)
+        self.timeout = timeout or None
+        self.queue_size = plugin.event_queue_size
+        self.queue = None
+        self.task = None
+        self.dropped = 0
+
+
 class PluginManager(object):
     def __init__(self, bot: Bot, test_mode=False):
         self.bot = bot
@@ -17,6 +35,7 @@ class PluginManager(object):
         self.dispatcher = bot.dispatcher
         self.log = logging.getLogger(type(self).__name__)
         self.plugins = []
+        self.event_timeout = self.config.get("event_handler_timeout")
         self.state_handler = None
         self.test_mode = test_mode
 
@@ -28,6 +47,31 @@ class PluginManager(object):
                 "plugins_failed": [],
             }
 
+    @property
+    def plugins(self):
+        return self._plugins
+
+    @plugins.setter
+    def plugins(self, plugins):
+        self._plugins = plugins
+        self._event_handlers = None
+
+    @property
+    def event_handlers(self):
+        """Maps each event type to the handlers of plugins subscribed to it"""
+        if self._event_handlers is None:
+            self._event_handlers = {}
+            for plugin in self.plugins:
+                if not plugin.notify_event_types:
+                    continue
+                timeout = plugin.event_timeout
+                handler = _EventHandler(
+                    plugin, self.event_timeout if timeout is None else timeout
+                )
+                for event_type in plugin.notify_event_types:
+                    self._event_handlers.setdefault(event_type, []).append(handler)
+        return self._event_handlers
+
     def load(self):
         import os
         import sys
@@ -78,24 +122,66 @@ class PluginManager(object):
                 self.log.exception("Failed to register plugin %s", name)
                 if self.test_mode:
                     self.metrics["plugins_failed"].append(name)
+        self._event_handlers = None
 
     # Broadcasts a slack event to handlers that have registered for the
     # event type via notify_event_types class attribute
     # Plugin MUST implement a handle_event method to handle these events.
     async def broadcast_event(self, event_type, data):
-        for plugin in self.plugins:
-            if event_type in plugin.notify_event_types:
-                self.log.debug(
-                    f"Sending event of type {event_type} to plugin {plugin.__class__.__name__}.  Data: {data}"
+        handlers = self.event_handlers.get(event_type)
+        if not handlers:
+            return
+        pending = []
+        for handler in handlers:
+            self.log.debug(
+                f"Sending event of type {event_type} to plugin {handler.name}.  Data: {data}"
+            )
+            if handler.queue_size:
+                self._enqueue_event(handler, event_type, data)
+            elif handler.is_async:
+                pending.append(self._call_handler(handler, event_type, data))
+            else:
+                await self._call_handler(handler, event_type, data)
+        # async handlers run concurrently, so a slow one doesn't delay the rest
+        if pending:
+            await asyncio.gather(*pending)
+
+    async def _call_handler(self, handler, event_type, data):
+        try:
+            if handler.is_async:
+                await run_with_timeout(
+                    handler.plugin.handle_event(event_type, data), handler.timeout
                 )
-                try:
-                    if inspect.iscoroutinefunction(plugin.handle_event):
-                        await plugin.handle_event(event_type, data)
-                    else:
-                        plugin.handle_event(event_type, data)
-                # The plugin is expected to handle its own exceptions.
-                except Exception:  # noqa
-                    self.log.exception("Unhandled exception!")
+            else:
+                handler.plugin.handle_event(event_type, data)
+        except CommandTimeoutError:
+            self.log.warning(
+                f"{handler.name} timed out handling {event_type} after {handler.timeout}s"
+            )
+        # The plugin is expected to handle its own exceptions.
+        except Exception:  # noqa
+            self.log.exception("Unhandled exception!")
+
+    def _enqueue_event(self, handler, event_type, data):
+        """
+        Queues an event for a plugin with an event_queue_size, dropping it if
+        the plugin is that many events behind
+        """
+        if handler.queue is None:
+            handler.queue = asyncio.Queue(handler.queue_size)
+            handler.task = asyncio.create_task(self._process_events(handler))
+        try:
+            handler.queue.put_nowait((event_type, data))
+        except asyncio.QueueFull:
+            handler.dropped += 1
+            self.log.warning(
+                f"{handler.name} is {handler.queue_size} events behind, dropping {event_type}"
+            )
+
+    async def _process_events(self, handler):
+        while True:
+            event_type, data = await handler.queue.get()
+            await self._call_handler(handler, event_type, data)
 
     def connect(self):
         for plugin in self.plugins:
@@ -160,6 +246,29 @@ class PluginManager(object):
                     self.log.debug("%s.%s = %s", plugin_name, k, v)
                     setattr(p, k, v)
 
+    def save_blob(self, name, data):
+        if self.state_handler is None:
+            self.log.warning("Unable to save %s, no handler registered", name)
+            return
+        try:
+            self.state_handler.save_blob(name, data)
+        except Exception:  # noqa
+            self.log.exception("Handler failed to save %s", name)
+
+    def load_blob(self, name):
+        if self.state_handler is None:
+            self.log.warning("Unable to load %s, no handler registered", name)
+            return None
+        try:
+            return self.state_handler.load_blob(name)
+        except Exception:  # noqa
+            self.log.exception("Handler failed to load %s", name)
+            return None
+
     def unload_all(self):
+        for handlers in (self._event_handlers or {}).values():
+            for handler in handlers:
+                if handler.task is not None:
+                    handler.task.cancel()
         for plugin in self.plugins:
             plugin.on_unload()
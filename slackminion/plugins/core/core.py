@@ -1,7 +1,7 @@
 from datetime import datetime
 from operator import itemgetter
 
-from flask import render_template
+from flask import jsonify, render_template
 
 from slackminion.plugin import cmd, webhook
 from slackminion.plugin.base import BasePlugin
@@ -17,23 +17,26 @@ class Core(BasePlugin):
     @cmd()
     def help(self, msg, args):
         """Displays help for each command"""
-        output = []
         if len(args) == 0:
-            commands = sorted(
-                list(self._bot.dispatcher.commands.items()), key=itemgetter(0)
-            )
-            commands = [x for x in commands if x[1].is_subcmd is False]
             # Filter commands if auth is enabled, hide_admin_commands is enabled, and user is not admin
-            if self._should_filter_help_commands(msg.user):
-                commands = [x for x in commands if x[1].admin_only is False]
-            for name, v in commands:
-                output.append(self._get_short_help_for_command(name))
-        else:
-            name = "!" + args[0]
-            if name not in self._bot.dispatcher.commands:
-                return "No such command: %s" % name
-            output = [self._get_help_for_command(name)]
-        return "\n".join(output)
+            hide_admin = self._should_filter_help_commands(msg.user)
+            help_cache = self._bot.dispatcher.help_cache
+            if hide_admin not in help_cache:
+                help_cache[hide_admin] = self._get_help_listing(hide_admin)
+            return help_cache[hide_admin]
+        name = "!" + args[0]
+        if name not in self._bot.dispatcher.commands:
+            return "No such command: %s" % name
+        return self._get_help_for_command(name)
+
+    def _get_help_listing(self, hide_admin):
+        commands = sorted(
+            list(self._bot.dispatcher.commands.items()), key=itemgetter(0)
+        )
+        commands = [x for x in commands if x[1].is_subcmd is False]
+        if hide_admin:
+            commands = [x for x in commands if x[1].admin_only is False]
+        return "\n".join(self._get_short_help_for_command(name) for name, v in commands)
 
     def _should_filter_help_commands(self, user):
         return (
@@ -141,6 +144,10 @@ class Core(BasePlugin):
         }
         return render_template("status.html", **context)
 
+    @webhook("/metrics", method="GET")
+    def bot_metrics(self):
+        return jsonify(self._bot.get_metrics())
+
     async def _get_channel_from_msg_or_args(self, msg, args):
         channel = None
         if len(args) == 0:
@@ -1,4 +1,7 @@
 from slackminion.plugin.base import BasePlugin
+from slackminion.slack import SlackUser
+from slackminion.utils.cache import LRUCache
+from slackminion.utils.util import call_with_rate_limit
 
 try:
     from . import commit
@@ -11,28 +14,100 @@ class UserManager(BasePlugin):
     Loads and stores user information
     """
 
+    notify_event_types = ["user_change"]
+
     def on_load(self):
         self._dont_save = True  # Don't save this plugin's state on shutdown
-        self.users = {}
         self.admins = {}
         if "bot_admins" in self._bot.config:
             self.admins = self._bot.config["bot_admins"]
+        cache_config = self._bot.config.get("user_cache") or {}
+        # Users older than ttl seconds are reloaded from slack on their next
+        # lookup, as are users evicted once more than max_size are cached
+        self.users = LRUCache(
+            max_size=cache_config.get("max_size"),
+            ttl=cache_config.get("ttl"),
+            on_evict=self._user_evicted,
+        )
+        self._users_by_name = {}
+        self.prefetch = cache_config.get("prefetch", False)
+        self.prefetch_page_size = cache_config.get("prefetch_page_size", 1000)
+        self._prefetched = set()
+        self.prefetch_hits = 0
+        self._stale = set()  # ids of users loaded from a snapshot
         setattr(self._bot, "user_manager", self)
 
         return super(UserManager, self).on_load()
 
+    def on_connect(self):
+        if self.prefetch:
+            self.run_async(self.prefetch_users)
+        return super(UserManager, self).on_connect()
+
+    async def prefetch_users(self):
+        """Pages through users.list and caches every user in the workspace"""
+        self.log.info("Prefetching users")
+        cursor = None
+        try:
+            while True:
+                resp = await call_with_rate_limit(
+                    self._bot.api_client.users_list,
+                    limit=self.prefetch_page_size,
+                    cursor=cursor,
+                )
+                for user_info in resp.get("members", []):
+                    # users loaded on demand while we were paging are already fresh
+                    user_id = user_info.get("id")
+                    if user_id in self.users and user_id not in self._stale:
+                        continue
+                    self.set(
+                        SlackUser(user_info=user_info, api_client=self._bot.api_client)
+                    )
+                    self._prefetched.add(user_info.get("id"))
+                cursor = (resp.get("response_metadata") or {}).get("next_cursor")
+                if not cursor:
+                    break
+        except Exception:  # noqa
+            self.log.exception("Prefetching users failed")
+        self.log.info(f"Prefetched {len(self._prefetched)} users")
+
+    def load_snapshot(self, users):
+        """
+        Caches users saved in a snapshot.  They're returned by get() straight
+        away, but reloaded from slack in the background when first used.
+        """
+        for user_info in users:
+            user = self.set(
+                SlackUser(user_info=user_info, api_client=self._bot.api_client)
+            )
+            self._stale.add(user.id)
+
     def get(self, userid):
-        """Retrieve user by id"""
-        if userid in self.users:
-            return self.users[userid]
-        return None
+        """Retrieve user by id, returns None if the user isn't cached or has expired"""
+        user = self.users.get(userid)
+        if user is not None and userid in self._prefetched:
+            # first lookup of a prefetched user, which would have been a miss
+            self._prefetched.discard(userid)
+            self.prefetch_hits += 1
+        if user is not None and userid in self._stale:
+            self._stale.discard(userid)
+            self.run_async(self._revalidate_user, userid)
+        return user
+
+    async def _revalidate_user(self, userid):
+        try:
+            user = SlackUser(user_id=userid, api_client=self._bot.api_client)
+            await user.load()
+            self.set(user)
+        except Exception:  # noqa
+            self.log.exception("Failed to reload user %s", userid)
 
     def get_by_username(self, username):
-        """Retrieve user by username"""
-        res = [x for x in list(self.users.values()) if x.username == username]
-        if len(res) > 0:
-            return res[0]
-        return None
+        """Retrieve user by username, returns None if the user isn't cached or has expired"""
+        user = self._users_by_name.get(username)
+        if user is None:
+            return None
+        return self.get(user.id)
 
     def set(self, user):
         """
@@ -49,9 +124,40 @@ class UserManager(BasePlugin):
         return user
 
     def _add_user_to_cache(self, user):
-        if user.id not in list(self.users.keys()):
-            self.users[user.id] = user
+        cached = self.users.peek(user.id)
+        if cached is not None:
+            self._remove_username(cached)
+            self.log.debug("Refreshed user: %s/%s", user.id, user.username)
+        else:
             self.log.debug("Added user: %s/%s", user.id, user.username)
+        self.users[user.id] = user
+        self._users_by_name[user.username] = user
+        self._stale.discard(user.id)
+
+    def _user_evicted(self, userid, user):
+        self.log.debug("Evicted user: %s/%s", userid, user.username)
+        self._remove_username(user)
+        self._prefetched.discard(userid)
+        self._stale.discard(userid)
+
+    def _remove_username(self, user):
+        # only drop the mapping if it still points at this user; after a rename
+        # another user may have taken over the name
+        if self._users_by_name.get(user.username) is user:
+            del self._users_by_name[user.username]
+
+    def handle_event(self, event_type, data):
+        # keep cached users (and the username index) current when a user changes
+        # their profile or is renamed
+        user_info = data.get("user")
+        if isinstance(user_info, dict) and user_info.get("id") in self.users:
+            self.set(SlackUser(user_info=user_info, api_client=self._bot.api_client))
+
+    @property
+    def metrics(self):
+        metrics = self.users.metrics
+        metrics["prefetch_misses_avoided"] = self.prefetch_hits
+        return metrics
 
     def load_user_info(self, user):
         """Loads additional user information and stores in user object"""
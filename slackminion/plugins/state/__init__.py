@@ -6,6 +6,8 @@ __path__ = extend_path(__path__, __name__)
 
 
 class BaseStateHandler(BasePlugin):
+    _warned_no_blobs = False
+
     def on_load(self):
         # Don't save this plugin's state during save_state()
         self._dont_save = True
@@ -16,3 +18,23 @@ class BaseStateHandler(BasePlugin):
 
     def save_state(self, state):
         pass
+
+    def save_blob(self, name, data):
+        """Stores data (bytes) under name, separately from plugin state"""
+        self._warn_no_blobs()
+
+    def load_blob(self, name):
+        """Returns the bytes stored under name, or None if there are none"""
+        self._warn_no_blobs()
+        return None
+
+    def _warn_no_blobs(self):
+        # handlers that don't override save_blob and load_blob can't keep the
+        # cache snapshot, cron schedules or persistent timers
+        if not self._warned_no_blobs:
+            self._warned_no_blobs = True
+            self.log.warning(
+                "%s doesn't store blobs, so cache snapshots, cron schedules and "
+                "persistent timers won't survive a restart",
+                type(self).__name__,
+            )
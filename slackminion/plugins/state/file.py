@@ -17,3 +17,17 @@ class FileStateHandler(BaseStateHandler):
     def save_state(self, state):
         with open(os.path.join(self.config["data_dir"], "state.json"), "wb") as f:
             f.write(state)
+
+    def save_blob(self, name, data):
+        path = os.path.join(self.config["data_dir"], name)
+        # replace the file in one step so a crash mid-write can't corrupt it
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+
+    def load_blob(self, name):
+        try:
+            with open(os.path.join(self.config["data_dir"], name), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
@@ -17,6 +17,12 @@ class SlackConversation(object):
         self.logger = logging.getLogger(type(self).__name__)
         self.logger.setLevel(logging.DEBUG)
 
+    def __getstate__(self):
+        # API clients can't be sent to worker processes
+        state = self.__dict__.copy()
+        state["api_client"] = None
+        return state
+
     # make arbitrary keys in the dict returned by slack accessible as properties
     def __getattr__(self, item):
         return self.conversation.get(item)
@@ -50,6 +56,11 @@ class SlackConversation(object):
         self._topic = new_topic
         self.api_client.conversations_setTopic(channel=self.id, topic=new_topic)
 
+    def update(self, conversation):
+        """Replaces the channel info with a newer copy from slack"""
+        self.conversation = conversation
+        self._topic = conversation.get("topic", {}).get("value")
+
     # reloads channel info from slack api
     async def load(self, channel_id):
         resp = await self.api_client.conversations_info(channel=channel_id)
@@ -1,5 +1,10 @@
+import asyncio
+
+
 class SlackEvent(object):
     _channel = None
+    _user_loader = None
+    _channel_loader = None
     user = None
     """Encapsulates an event received from the RTM socket"""
 
@@ -12,6 +17,37 @@ class SlackEvent(object):
         self.user_id = self.data.get("user")
         self.channel_id = self.data.get("channel")
 
+    def __getstate__(self):
+        # RTM and web clients can't be sent to worker processes
+        state = self.__dict__.copy()
+        state["rtm_client"] = None
+        state["web_client"] = None
+        state.pop("_user_loader", None)
+        state.pop("_channel_loader", None)
+        return state
+
+    def defer(self, user=None, channel=None):
+        """
+        Sets functions returning awaitables that load the user and channel.
+        They are only called when resolve() is awaited, so messages that never
+        turn out to need them don't cost any slack api calls.
+        """
+        self._user_loader = user
+        self._channel_loader = channel
+
+    async def resolve(self):
+        """Loads the deferred user and channel, if they haven't been already"""
+        user_loader, self._user_loader = self._user_loader, None
+        channel_loader, self._channel_loader = self._channel_loader, None
+        user, channel = await asyncio.gather(
+            user_loader() if user_loader else _none(),
+            channel_loader() if channel_loader else _none(),
+        )
+        if user_loader:
+            self.user = user
+        if channel_loader:
+            self.channel = channel
+
     @property
     def channel(self):
         if self._channel:
@@ -44,3 +80,7 @@ class SlackEvent(object):
 
     def __repr__(self):
         return f"SlackEvent type {self.event_type} User: {self.user_id}"
+
+
+async def _none():
+    return None
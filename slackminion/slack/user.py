@@ -26,6 +26,12 @@ class SlackUser(object):
         else:
             raise RuntimeError("Missing user_id or user_info")
 
+    def __getstate__(self):
+        # API clients can't be sent to worker processes
+        state = self.__dict__.copy()
+        state["api_client"] = None
+        return state
+
     async def load(self):
         if self.user_info:
             return
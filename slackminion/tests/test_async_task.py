@@ -0,0 +1,710 @@
+import datetime
+import gc
+import heapq
+import json
+import threading
+import time
+import zlib
+
+from slackminion.tests.fixtures import *
+from slackminion.utils.async_task import (
+    FIXED_DELAY,
+    AsyncTaskManager,
+    AsyncTimer,
+    CronSchedule,
+    CronScheduler,
+    DispatchScheduler,
+    DurableTimers,
+    TimerService,
+    current_timer,
+)
+
+
+class TestDispatchScheduler(unittest.TestCase):
+    @async_test
+    async def test_same_key_runs_in_order(self):
+        scheduler = DispatchScheduler(workers=4, max_queue=10)
+        scheduler.start()
+        results = []
+
+        async def work(i, delay):
+            await asyncio.sleep(delay)
+            results.append(i)
+
+        await scheduler.submit("C1", work, 1, 0.03)
+        await scheduler.submit("C1", work, 2, 0.01)
+        await scheduler.submit("C1", work, 3, 0)
+        await asyncio.sleep(0.1)
+        await scheduler.stop()
+        self.assertEqual(results, [1, 2, 3])
+        self.assertEqual(scheduler.completed, 3)
+
+    @async_test
+    async def test_different_keys_run_concurrently(self):
+        scheduler = DispatchScheduler(workers=2, max_queue=10)
+        scheduler.start()
+        results = []
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+            results.append("slow")
+
+        async def fast():
+            results.append("fast")
+
+        await scheduler.submit("C1", slow)
+        await scheduler.submit("C2", fast)
+        await asyncio.sleep(0.01)
+        self.assertEqual(results, ["fast"])
+        release.set()
+        await asyncio.sleep(0.01)
+        await scheduler.stop()
+        self.assertEqual(results, ["fast", "slow"])
+
+    @async_test
+    async def test_submit_waits_when_queue_is_full(self):
+        scheduler = DispatchScheduler(workers=1, max_queue=1)
+        scheduler.start()
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+
+        await scheduler.submit("C1", work)
+        submit = asyncio.ensure_future(scheduler.submit("C2", work))
+        await asyncio.sleep(0.01)
+        self.assertFalse(submit.done())
+        self.assertEqual(scheduler.metrics["queued"], 1)
+        release.set()
+        await asyncio.wait_for(submit, 1)
+        await scheduler.stop()
+
+    @async_test
+    async def test_exception_does_not_stop_worker(self):
+        scheduler = DispatchScheduler(workers=1, max_queue=10)
+        scheduler.log = mock.Mock()
+        scheduler.start()
+        results = []
+
+        async def fail():
+            raise ValueError("nope")
+
+        async def work():
+            results.append(True)
+
+        await scheduler.submit("C1", fail)
+        await scheduler.submit("C1", work)
+        await asyncio.sleep(0.01)
+        await scheduler.stop()
+        self.assertEqual(results, [True])
+        scheduler.log.exception.assert_called()
+
+
+class TestAsyncTimer(unittest.TestCase):
+    def setUp(self):
+        self.started = []
+
+    async def work(self, duration):
+        self.started.append(time.monotonic())
+        await asyncio.sleep(duration)
+
+    @async_test
+    async def test_fixed_rate_does_not_drift(self):
+        timer = AsyncTimer(0.05, self.work, 0.03)
+        await timer.start()
+        await asyncio.sleep(0.23)
+        await timer.stop()
+        self.assertEqual(len(self.started), 5)
+        self.assertEqual(timer.metrics["skipped"], 0)
+        assert timer.metrics["avg_duration"] >= 0.03
+
+    @async_test
+    async def test_fixed_delay(self):
+        timer = AsyncTimer(0.05, self.work, 0.03, mode=FIXED_DELAY)
+        await timer.start()
+        await asyncio.sleep(0.23)
+        await timer.stop()
+        self.assertEqual(len(self.started), 3)
+        assert self.started[1] - self.started[0] >= 0.08
+
+    @async_test
+    async def test_skips_while_running(self):
+        timer = AsyncTimer(0.02, self.work, 0.05)
+        await timer.start()
+        await asyncio.sleep(0.09)
+        await timer.stop()
+        self.assertEqual(len(self.started), 2)
+        assert timer.metrics["skipped"] >= 2
+
+    @async_test
+    async def test_delay_and_jitter(self):
+        timer = AsyncTimer(1, self.work, 0, delay=0.03, jitter=0.01)
+        await timer.start()
+        await asyncio.sleep(0.02)
+        self.assertEqual(self.started, [])
+        await asyncio.sleep(0.03)
+        await timer.stop()
+        self.assertEqual(len(self.started), 1)
+
+    @async_test
+    async def test_exception_does_not_stop_timer(self):
+        async def fail():
+            self.started.append(time.monotonic())
+            raise ValueError("nope")
+
+        timer = AsyncTimer(0.02, fail)
+        timer.log = mock.Mock()
+        await timer.start()
+        await asyncio.sleep(0.05)
+        await timer.stop()
+        self.assertEqual(len(self.started), 3)
+        self.assertEqual(timer.metrics["failed"], 3)
+        timer.log.exception.assert_called_with("Periodic task fail raised an exception")
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            AsyncTimer(1, self.work, mode="whenever")
+
+
+class TestTimerService(unittest.TestCase):
+    def setUp(self):
+        self.object = TimerService()
+        self.fired = []
+
+    def record(self, value):
+        self.fired.append(value)
+
+    @async_test
+    async def test_timers_fire_in_order(self):
+        self.object.start()
+        self.object.call_later(0.03, self.record, 3)
+        self.object.call_later(0.01, self.record, 1)
+        self.object.call_later(0.02, self.record, 2)
+        self.assertEqual(len(self.object), 3)
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.fired, [1, 2, 3])
+        self.assertEqual(self.object.metrics, {"pending": 0, "fired": 3, "failed": 0})
+
+    @async_test
+    async def test_timers_armed_on_start(self):
+        self.object.call_later(0, self.record, 1)
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.fired, [])
+        self.object.start()
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.fired, [1])
+
+    @async_test
+    async def test_cancel(self):
+        self.object.start()
+        handle = self.object.call_later(0.01, self.record, 1)
+        self.object.call_later(0.01, self.record, 2)
+        self.object.call_later(0.01, self.fired.append, 3)
+        handle.cancel()
+        self.assertEqual(self.object.cancel("record"), 1)
+        self.assertEqual(self.object.cancel("record"), 0)
+        self.assertEqual(len(self.object), 1)
+        await asyncio.sleep(0.03)
+        self.assertEqual(self.fired, [3])
+
+    @async_test
+    async def test_cancelled_timers_are_compacted(self):
+        handles = [self.object.call_later(60, self.record, i) for i in range(200)]
+        for handle in handles[:150]:
+            handle.cancel()
+        self.assertEqual(len(self.object), 50)
+        assert len(self.object._heap) < 200
+
+    @async_test
+    async def test_async_callback(self):
+        async def record(value):
+            await asyncio.sleep(0)
+            self.fired.append(value)
+
+        self.object.start()
+        self.object.call_later(0, record, 1)
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.fired, [1])
+
+    @async_test
+    async def test_exception_is_logged(self):
+        self.object.log = mock.Mock()
+        self.object.start()
+        self.object.call_later(0, self.record)
+        self.object.call_later(0, self.record, 1)
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.fired, [1])
+        self.object.log.exception.assert_called_with("Timer record raised an exception")
+
+
+class TestCronSchedule(unittest.TestCase):
+    def next_runs(self, expression, after, count=3):
+        schedule = CronSchedule(expression)
+        runs = []
+        for _ in range(count):
+            after = schedule.next_after(after)
+            runs.append(after)
+        return runs
+
+    def test_weekdays(self):
+        # friday 2026-10-16
+        runs = self.next_runs("0 9 * * mon-fri", datetime.datetime(2026, 10, 16, 9))
+        self.assertEqual(
+            runs,
+            [
+                datetime.datetime(2026, 10, 19, 9),
+                datetime.datetime(2026, 10, 20, 9),
+                datetime.datetime(2026, 10, 21, 9),
+            ],
+        )
+
+    def test_steps_and_lists(self):
+        runs = self.next_runs(
+            "*/20 8,17 * * *", datetime.datetime(2026, 10, 16, 8, 45), 4
+        )
+        self.assertEqual(
+            [(run.hour, run.minute) for run in runs],
+            [(17, 0), (17, 20), (17, 40), (8, 0)],
+        )
+
+    def test_day_of_month_or_weekday(self):
+        runs = self.next_runs("0 0 13 * fri", datetime.datetime(2026, 3, 1))
+        self.assertEqual([run.day for run in runs], [6, 13, 20])
+
+    def test_leap_day_and_macros(self):
+        self.assertEqual(
+            self.next_runs("0 0 29 feb *", datetime.datetime(2026, 3, 1), 1),
+            [datetime.datetime(2028, 2, 29)],
+        )
+        # 2100 isn't a leap year
+        self.assertEqual(
+            self.next_runs("0 0 29 feb *", datetime.datetime(2097, 3, 1), 1),
+            [datetime.datetime(2104, 2, 29)],
+        )
+        self.assertEqual(
+            self.next_runs("@monthly", datetime.datetime(2026, 12, 15), 1),
+            [datetime.datetime(2027, 1, 1)],
+        )
+        self.assertEqual(
+            self.next_runs("0 12 * * 7", datetime.datetime(2026, 10, 16), 1),
+            [datetime.datetime(2026, 10, 18, 12)],
+        )
+
+    def test_invalid(self):
+        for expression in ["* * * *", "60 * * * *", "* * * * funday", "5-1 * * * *"]:
+            with self.assertRaises(ValueError):
+                CronSchedule(expression)
+        for expression in ["0 0 30 2 *", "0 0 31 apr,jun *"]:
+            with self.assertRaises(ValueError):
+                CronSchedule(expression)
+        # matches on any 31st, or on a sunday
+        CronSchedule("0 0 31 2 sun")
+
+
+class TestCronScheduler(unittest.TestCase):
+    def setUp(self):
+        self.timers = TimerService()
+        self.saved = []
+        self.state = {}
+        self.object = CronScheduler(
+            self.timers, load=lambda: self.state, save=self.saved.append
+        )
+        self.runs = []
+
+    def report(self, value):
+        self.runs.append(value)
+
+    def test_timezone(self):
+        job = self.object.add("0 9 * * *", self.report, tz=-7 * 3600)
+        # 2026-10-19 15:00 UTC is 08:00 at UTC-7
+        start = datetime.datetime(2026, 10, 19, 15, tzinfo=datetime.timezone.utc)
+        self.assertEqual(job.next_after(start.timestamp()), start.timestamp() + 3600)
+
+    @async_test
+    async def test_new_job_is_not_run(self):
+        self.object.add("0 * * * *", self.report, 1, name="hourly")
+        self.object.start()
+        self.assertEqual(self.runs, [])
+        assert self.saved[-1]["hourly"] <= time.time()
+        assert 0 < self.object.jobs["hourly"].next_run - time.time() <= 3600
+        self.object.stop()
+
+    @async_test
+    async def test_missed_run_is_caught_up(self):
+        last_run = time.time() - 7200
+        self.state = {"hourly": last_run, "no_catch_up": last_run, "removed": 0}
+        self.object.add("0 * * * *", self.report, 1, name="hourly")
+        self.object.add("0 * * * *", self.report, 2, name="no_catch_up", catch_up=False)
+        self.object.start()
+        self.assertEqual(self.runs, [1])
+        self.assertEqual(self.object.jobs["no_catch_up"].runs, 0)
+        self.assertEqual(self.saved[-1]["no_catch_up"], last_run)
+        self.assertEqual(set(self.saved[-1]), {"hourly", "no_catch_up"})
+        self.object.stop()
+
+    def test_never_matching_expression(self):
+        with self.assertRaises(ValueError):
+            self.object.add("0 0 31 2 *", self.report, 1)
+        self.assertEqual(self.object.jobs, {})
+
+    @async_test
+    async def test_fire(self):
+        self.timers.start()
+        self.object.start()
+        job = self.object.add("* * * * *", self.report, 1)
+        # make the job due now
+        job._timer.cancel()
+        job.next_run = time.time()
+        self.object._arm(job)
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.runs, [1])
+        self.assertEqual(job.runs, 1)
+        assert job.next_run > time.time()
+        self.assertEqual(len(self.timers), 1)
+        self.object.remove("report")
+        self.assertEqual(len(self.timers), 0)
+
+
+class Reminder(object):
+    def __init__(self):
+        self.reminders = []
+
+    def remind(self, text):
+        self.reminders.append((text, current_timer.get().late))
+
+
+class TestDurableTimers(unittest.TestCase):
+    def setUp(self):
+        self.blob = None
+        self.plugin = Reminder()
+        self.timers = TimerService()
+        self.object = self.new_durable_timers(self.timers)
+
+    def new_durable_timers(self, timers):
+        durable_timers = DurableTimers(
+            timers,
+            load=lambda: self.blob,
+            save=self.save,
+            resolve=self.resolve,
+        )
+        durable_timers.log = mock.Mock()
+        return durable_timers
+
+    def save(self, data):
+        self.blob = data
+
+    def resolve(self, plugin_name, method):
+        if plugin_name == "Reminder":
+            return getattr(self.plugin, method, None)
+
+    def saved(self):
+        header, *timers = zlib.decompress(self.blob).decode("utf-8").split("\n")
+        self.assertEqual(json.loads(header), {"version": 2})
+        return [json.loads(timer) for timer in timers]
+
+    @async_test
+    async def test_timers_are_saved(self):
+        self.timers.start()
+        self.object.add(60, "Reminder", self.plugin.remind, ("later",), {})
+        await self.object.start()
+        handle = self.object.add(60, "Reminder", self.plugin.remind, ("never",), {})
+        self.object.add(0, "Reminder", self.plugin.remind, ("now",), {})
+        await asyncio.sleep(0.01)
+        handle.cancel()
+        self.assertEqual(self.plugin.reminders, [("now", False)])
+        await self.object.flush()
+        saved = self.saved()
+        self.assertEqual(
+            [record[:2] + record[3:] for record in saved],
+            [["Reminder", "remind", ["later"], {}]],
+        )
+        assert saved[0][2] > time.time() + 59
+        self.object.stop()
+
+    @async_test
+    async def test_timers_are_restored(self):
+        now = time.time()
+        self.blob = zlib.compress(
+            json.dumps(
+                {
+                    "version": 1,
+                    "timers": [
+                        ["Reminder", "remind", now + 60, ["later"], {}],
+                        ["Reminder", "remind", now - 60, ["missed"], {}],
+                        ["Removed", "remind", now - 60, ["dropped"], {}],
+                    ],
+                }
+            ).encode()
+        )
+        self.timers.start()
+        await self.object.start()
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.plugin.reminders, [("missed", True)])
+        self.assertEqual(len(self.object), 1)
+        self.object.log.warning.assert_called_with(
+            "Dropping timers for unknown Removed.remind"
+        )
+        await self.object.flush()
+        self.assertEqual([record[3] for record in self.saved()], [["later"]])
+
+    @async_test
+    async def test_restore_in_chunks(self):
+        now = time.time()
+        due = [now + 60 * (i % 7) + i for i in range(20)]
+        self.blob = zlib.compress(
+            json.dumps(
+                {
+                    "version": 1,
+                    "timers": [
+                        ["Reminder", "remind", d, [str(i)], {}]
+                        for i, d in enumerate(due)
+                    ],
+                }
+            ).encode()
+        )
+        self.object.restore_chunk = 3
+        self.timers.call_later(3600, self.plugin.remind, "existing")
+        await self.object.start()
+        self.assertEqual(len(self.object), 20)
+        heap = self.timers._heap
+        self.assertEqual(len(heap), 21)
+        self.assertEqual(
+            [entry[0] for entry in sorted(heap)],
+            [heapq.heappop(heap)[0] for _ in range(21)],
+        )
+        self.object.stop()
+
+    @async_test
+    async def test_saved_timers_round_trip(self):
+        await self.object.start()
+        self.object.add(60, "Reminder", self.plugin.remind, ("later",), {})
+        await self.object.flush()
+        self.object.stop()
+        restored = self.new_durable_timers(TimerService())
+        await restored.start()
+        self.assertTrue(gc.isenabled())
+        self.assertEqual(
+            [record[3] for record in restored._records.values()], [["later"]]
+        )
+        restored.stop()
+
+    @async_test
+    async def test_late_timers_fire_in_batches(self):
+        now = time.time()
+        self.blob = zlib.compress(
+            json.dumps(
+                {
+                    "version": 1,
+                    "timers": [
+                        ["Reminder", "remind", now - i, [str(i)], {}] for i in range(25)
+                    ],
+                }
+            ).encode()
+        )
+        self.timers.fire_batch = 10
+        passes = []
+        fire = self.timers._fire
+
+        def counting_fire():
+            fired = len(self.plugin.reminders)
+            fire()
+            passes.append(len(self.plugin.reminders) - fired)
+
+        self.timers._fire = counting_fire
+        self.timers.start()
+        await self.object.start()
+        while len(self.plugin.reminders) < 25:
+            await asyncio.sleep(0.001)
+        self.assertEqual(passes, [10, 10, 5])
+        self.assertTrue(all(late for _, late in self.plugin.reminders))
+        self.object.stop()
+
+    @async_test
+    async def test_nothing_saved_before_start(self):
+        self.blob = b"saved"
+        self.object.add(60, "Reminder", self.plugin.remind, ("later",), {})
+        await self.object.flush()
+        self.assertEqual(self.blob, b"saved")
+
+    def test_arguments_must_be_serializable(self):
+        with self.assertRaises(TypeError):
+            self.object.add(60, "Reminder", self.plugin.remind, (object(),), {})
+        self.assertEqual(len(self.timers), 0)
+
+
+class TestAsyncTaskManager(unittest.TestCase):
+    def setUp(self):
+        self.bot = mock.Mock()
+        self.bot.plugin_manager.load_blob.return_value = None
+        self.object = AsyncTaskManager(self.bot)
+        self.object.log = mock.Mock()
+        self.object.add_signal_handlers = mock.Mock()
+
+    @async_test
+    async def test_finished_tasks_are_reaped(self):
+        async def work(i):
+            await asyncio.sleep(0)
+            return i
+
+        tasks = [self.object.create_and_schedule_task(work, i) for i in range(10000)]
+        self.assertEqual(len(self.object.tasks), 10000)
+        await asyncio.gather(*tasks)
+        await asyncio.sleep(0)
+        self.assertEqual(self.object.tasks, set())
+        self.assertEqual(self.object.metrics["completed"], 10000)
+
+    @async_test
+    async def test_cron_state_saved_in_worker_thread(self):
+        self.object.event_loop = asyncio.get_event_loop()
+        release = threading.Event()
+        saved = []
+
+        def save_blob(name, data):
+            release.wait(1)
+            saved.append(json.loads(data))
+
+        self.bot.plugin_manager.save_blob.side_effect = save_blob
+        for i in range(3):
+            self.object._save_cron_state({"job": i})
+        self.assertEqual(saved, [])
+        release.set()
+        await asyncio.wait_for(self.object._flush_cron_state(), 1)
+        # the first write was in progress, the second was superseded
+        self.assertEqual(saved, [{"job": 0}, {"job": 2}])
+
+    @async_test
+    async def test_failed_task_is_logged(self):
+        async def fail():
+            raise ValueError("nope")
+
+        self.object.create_and_schedule_task(fail)
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        self.assertEqual(self.object.tasks, set())
+        self.assertEqual(self.object.metrics["failed"], 1)
+        self.object.log.error.assert_called()
+
+    @async_test
+    async def test_rtm_client_restarted_when_it_exits(self):
+        loop = asyncio.get_event_loop()
+        futures = []
+
+        def start():
+            futures.append(loop.create_future())
+            return futures[-1]
+
+        rtm_client = mock.Mock()
+        rtm_client.start.side_effect = start
+        self.object.start_rtm_client(rtm_client)
+        futures[0].set_exception(RuntimeError("disconnected"))
+        await asyncio.sleep(0.001)
+        self.assertEqual(rtm_client.start.call_count, 2)
+        self.assertIs(self.object.rtm_client_task, futures[1])
+
+    @async_test
+    async def test_rtm_client_restarts_back_off(self):
+        loop = asyncio.get_event_loop()
+        self.object.rtm_restart_delay = 0.01
+        self.object.rtm_max_restart_delay = 0.04
+        started = []
+
+        def start():
+            started.append(loop.time())
+            future = loop.create_future()
+            if len(started) < 6:
+                future.set_exception(RuntimeError("disconnected"))
+            return future
+
+        rtm_client = mock.Mock()
+        rtm_client.start.side_effect = start
+        self.object.start_rtm_client(rtm_client)
+        while len(started) < 6:
+            await asyncio.sleep(0.005)
+        gaps = [b - a for a, b in zip(started, started[1:])]
+        self.assertLess(gaps[0], 0.01)
+        for gap, delay in zip(gaps[1:], [0.01, 0.02, 0.04, 0.04]):
+            self.assertGreaterEqual(gap, delay * 0.9)
+        self.assertEqual(self.object.metrics["rtm_restarts"], 5)
+
+        # a connection that stayed up resets the backoff
+        self.object._rtm_started_at -= self.object.rtm_stable_after
+        self.object.rtm_client_task.set_exception(RuntimeError("disconnected"))
+        await asyncio.sleep(0.005)
+        self.assertEqual(len(started), 7)
+        await self.object.shutdown()
+
+    @async_test
+    async def test_start_returns_on_shutdown(self):
+        rtm_client = mock.Mock()
+        rtm_client.start.return_value = asyncio.get_event_loop().create_future()
+        self.object.start_rtm_client(rtm_client)
+        calls = []
+
+        async def periodic():
+            calls.append(True)
+
+        self.object.start_periodic_task(60, periodic)
+        started = asyncio.ensure_future(self.object.start())
+        await asyncio.sleep(0.01)
+        self.assertEqual(calls, [True])
+        self.object.graceful_shutdown()
+        await asyncio.wait_for(started, 1)
+        rtm_client.stop.assert_called()
+        self.assertTrue(self.object.rtm_client_task.cancelled())
+        self.assertEqual(rtm_client.start.call_count, 1)
+        self.assertFalse(self.bot.runnable)
+
+    @async_test
+    async def test_stop_timer(self):
+        fired = []
+
+        async def remind(value):
+            fired.append(value)
+
+        self.object.timers.start()
+        self.object.start_timer(0.01, remind, 1)
+        self.object.start_timer(0.01, remind, 2)
+        self.object.stop_timer("remind")
+        self.object.stop_timer("remind")
+        self.object.log.warning.assert_called_with(
+            "stop_timer called with unknown func remind"
+        )
+        handle = self.object.start_timer(0, remind, 3)
+        await asyncio.sleep(0.02)
+        self.assertEqual(fired, [3])
+        self.assertTrue(handle.done)
+
+    def test_spread_periodic_tasks(self):
+        async def work():
+            pass
+
+        delays = [
+            self.object.start_periodic_task(60, work, spread=True).delay
+            for _ in range(5)
+        ]
+        self.assertEqual(delays[0], 0)
+        assert all(0 <= delay < 60 for delay in delays)
+        gaps = sorted(delays) + [60]
+        assert min(b - a for a, b in zip(gaps, gaps[1:])) > 5
+        self.assertEqual(self.object.start_periodic_task(30, work).delay, 0)
+
+    def test_persistent_timer_must_be_plugin_method(self):
+        def remind(text):
+            pass
+
+        with self.assertRaises(ValueError):
+            self.object.start_timer(60, remind, "hi", persist=True)
+        plugin = Reminder()
+        self.bot.plugin_manager.plugins = [plugin]
+        handle = self.object.start_timer(60, plugin.remind, "hi", persist=True)
+        self.assertEqual(len(self.object.durable_timers), 1)
+        self.assertEqual(
+            self.object._resolve_plugin_method("Reminder", "remind"), plugin.remind
+        )
+        handle.cancel()
+        self.assertEqual(len(self.object.durable_timers), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
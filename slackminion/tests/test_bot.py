@@ -6,6 +6,7 @@ from slackminion.bot import Bot
 from slackminion.exceptions import NotSetupError
 from slackminion.plugins.core import version
 from slackminion.tests.fixtures import *
+from slackminion.utils.cache import ChannelCache, LRUCache
 
 
 class PluginWithEvents(BasePlugin):
@@ -56,7 +57,7 @@ class TestBot(unittest.TestCase):
     @mock.patch("slackminion.bot.MyRTMClient")
     def test_add_callbacks(self, mock_rtm):
         self.object._add_event_handlers()
-        self.assertEqual(mock_rtm.on.call_count, 3)
+        self.assertEqual(mock_rtm.on.call_count, 11)
 
     @async_test
     async def test_event_message_no_user_manager(self):
@@ -84,7 +85,9 @@ class TestBot(unittest.TestCase):
         await self.object._event_message(**test_payload)
         self.object._parse_event.assert_called_with(test_payload)
         self.object._load_user_rights.assert_not_called()
-        self.object.dispatcher.push.assert_called_with(self.test_event, False)
+        self.object.dispatcher.push.assert_called_with(
+            self.test_event, False, on_stream=mock.ANY
+        )
         self.object.log.debug.assert_called_with(
             f"Output from dispatcher: {test_output}"
         )
@@ -114,7 +117,9 @@ class TestBot(unittest.TestCase):
         await self.object._event_message(**test_payload)
         self.object._parse_event.assert_called_with(test_payload)
         self.object._load_user_rights.assert_not_called()
-        self.object.dispatcher.push.assert_called_with(self.test_event, False)
+        self.object.dispatcher.push.assert_called_with(
+            self.test_event, False, on_stream=mock.ANY
+        )
         self.object.log.debug.assert_called_with(
             f"Output from dispatcher: {test_output}"
         )
@@ -146,7 +151,9 @@ class TestBot(unittest.TestCase):
         await self.object._event_message(**test_payload)
 
         self.object._parse_event.assert_called_with(test_payload)
-        self.object.dispatcher.push.assert_called_with(self.test_event, False)
+        self.object.dispatcher.push.assert_called_with(
+            self.test_event, False, on_stream=mock.ANY
+        )
         self.object.log.debug.assert_called_with(
             f"Output from dispatcher: {test_output}"
         )
@@ -175,7 +182,9 @@ class TestBot(unittest.TestCase):
 
         self.object._parse_event.assert_called_with(test_payload)
         self.object._load_user_rights.assert_not_called()
-        self.object.dispatcher.push.assert_called_with(self.test_event, False)
+        self.object.dispatcher.push.assert_called_with(
+            self.test_event, False, on_stream=mock.ANY
+        )
         self.object.log.debug.assert_called_with(
             f"Output from dispatcher: {test_output}"
         )
@@ -183,6 +192,20 @@ class TestBot(unittest.TestCase):
             test_command, self.test_event, None, test_output
         )
 
+    @async_test
+    async def test_event_message_with_scheduler(self):
+        self.object._handle_message = AsyncMock()
+        self.object.scheduler = mock.Mock()
+        self.object.scheduler.is_started = True
+        self.object.scheduler.submit = AsyncMock()
+        await self.object._event_message(**test_payload)
+        self.object.scheduler.submit.assert_called_with(
+            (test_channel_id, test_thread_ts),
+            self.object._handle_message,
+            test_payload,
+        )
+        self.object._handle_message.assert_not_called()
+
     @async_test
     async def test_parse_event_uncached_user(self):
         self.object.log = mock.Mock()
@@ -194,9 +217,65 @@ class TestBot(unittest.TestCase):
         self.object.get_channel = AsyncMock()
         self.object.api_client.users_info = AsyncMock()
         self.object.api_client.users_info.coro.return_value = test_user_response
-        await self.object._parse_event(test_payload)
+        self.test_payload["data"]["text"] = f"!{test_command}"
+        event = await self.object._parse_event(self.test_payload)
+        # nothing is looked up until the event is resolved
+        self.object.user_manager.get.assert_not_called()
+        self.object.get_channel.assert_not_called()
+        await event.resolve()
         self.object.user_manager.get.assert_called_with(test_user_id)
         self.object.user_manager.set.assert_called()
+        self.object.get_channel.assert_called_with(test_channel_id)
+        self.assertEqual(event.user, test_user)
+
+    @async_test
+    async def test_parse_event_unknown_command_not_resolved(self):
+        self.object.user_manager = mock.Mock()
+        self.object.get_channel = AsyncMock()
+        self.test_payload["data"]["text"] = "!notacommand"
+        event = await self.object._parse_event(self.test_payload)
+        self.assertEqual(await self.object.dispatcher.push(event), (None, None, None))
+        self.object.user_manager.get.assert_not_called()
+        self.object.get_channel.assert_not_called()
+
+    @async_test
+    async def test_parse_event_skips_non_commands(self):
+        self.object.user_manager = mock.Mock()
+        self.object.get_channel = AsyncMock()
+        assert await self.object._parse_event(self.test_payload) is None
+        self.object.user_manager.get.assert_not_called()
+        self.object.get_channel.assert_not_called()
+
+    @async_test
+    async def test_get_user_coalesces_concurrent_loads(self):
+        self.object.user_manager = mock.Mock()
+        self.object.user_manager.get.return_value = None
+        self.object.user_manager.set.side_effect = lambda user: user
+        release = asyncio.Event()
+
+        async def users_info(user):
+            await release.wait()
+            return test_user_response
+
+        self.object.api_client.users_info = mock.Mock(side_effect=users_info)
+        lookups = [
+            asyncio.ensure_future(self.object._get_user(test_user_id)) for _ in range(5)
+        ]
+        await asyncio.sleep(0)
+        release.set()
+        users = await asyncio.gather(*lookups)
+        self.object.api_client.users_info.assert_called_once_with(user=test_user_id)
+        self.object.user_manager.set.assert_called_once()
+        assert all(u is users[0] for u in users)
+        assert self.object._user_loads == {}
+
+    @async_test
+    async def test_get_user_cached(self):
+        self.object.user_manager = mock.Mock()
+        self.object.user_manager.get.return_value = test_user
+        self.object.api_client.users_info = AsyncMock()
+        assert await self.object._get_user(test_user_id) is test_user
+        self.object.api_client.users_info.assert_not_called()
 
     # test _prepare_and_send_output without any command options set (reply in thread, etc.)
     @async_test
@@ -214,6 +293,7 @@ class TestBot(unittest.TestCase):
             thread=test_thread_ts,
             reply_broadcast=None,
             parse=None,
+            coalesce=True,
         )
 
     # test _prepare_and_send_output with various options
@@ -233,6 +313,7 @@ class TestBot(unittest.TestCase):
             thread=test_thread_ts,
             reply_broadcast=None,
             parse=None,
+            coalesce=True,
         )
 
         cmd_options = {
@@ -249,6 +330,7 @@ class TestBot(unittest.TestCase):
             thread=test_thread_ts,
             reply_broadcast=True,
             parse=None,
+            coalesce=True,
         )
 
         cmd_options = {"parse": "full"}
@@ -262,6 +344,7 @@ class TestBot(unittest.TestCase):
             thread=test_thread_ts,
             reply_broadcast=None,
             parse="full",
+            coalesce=True,
         )
 
         cmd_options = {}
@@ -275,6 +358,63 @@ class TestBot(unittest.TestCase):
             thread=test_thread_ts,
             reply_broadcast=None,
             parse=None,
+            coalesce=True,
+        )
+
+    @async_test
+    async def test_prepare_and_send_output_splits_long_output(self):
+        self.object.send_message = AsyncMock()
+        output = "\n".join(["x" * 1000] * 6)
+        await self.object._prepare_and_send_output(
+            test_command, self.test_event, {}, output
+        )
+        self.assertEqual(self.object.send_message.call_count, 2)
+        first, second = self.object.send_message.call_args_list
+        self.assertEqual(first[0][1], "\n".join(["x" * 1000] * 3))
+        self.assertEqual(second[0][1], "\n".join(["x" * 1000] * 3))
+
+    @async_test
+    async def test_send_stream_replies(self):
+        del self.test_payload["data"]["thread_ts"]
+        event = SlackEvent(event_type="tests", **self.test_payload)
+        self.object.send_message = AsyncMock()
+        self.object.send_message.coro.return_value = {
+            "channel": test_channel_id,
+            "ts": "1.1",
+        }
+
+        async def output():
+            for line in ["one", "", "two"]:
+                yield line
+
+        await self.object._send_stream(event, test_command, {}, output())
+        calls = self.object.send_message.call_args_list
+        self.assertEqual([c[0][1] for c in calls], ["one", "two"])
+        self.assertEqual([c[1]["thread"] for c in calls], [None, "1.1"])
+
+    @async_test
+    async def test_send_stream_updates(self):
+        self.object.stream_update_interval = 0
+        self.object.send_message = AsyncMock()
+        self.object.send_message.coro.return_value = {
+            "channel": test_channel_id,
+            "ts": "1.1",
+        }
+        self.object.api_client.chat_update = AsyncMock()
+
+        async def output():
+            for line in ["one", "two", "x" * 4000]:
+                yield line
+
+        await self.object._send_stream(
+            self.test_event, test_command, {"stream": "update"}, output()
+        )
+        self.assertEqual(
+            [c[0][1] for c in self.object.send_message.call_args_list],
+            ["one", "x" * 4000],
+        )
+        self.object.api_client.chat_update.assert_called_once_with(
+            channel=test_channel_id, ts="1.1", text="one\ntwo"
         )
 
     @async_test
@@ -286,10 +426,121 @@ class TestBot(unittest.TestCase):
 
     def test_get_channel_by_name(self):
         self.object.is_setup = True
-        self.object._channels = {test_channel_name: test_conversation}
+        self.object._channels.update({test_channel_id: test_conversation})
         self.assertEqual(
             self.object.get_channel_by_name(test_channel_name), test_conversation
         )
+        self.assertEqual(
+            self.object.get_channel_by_name(f"{test_channel_name}-old"),
+            test_conversation,
+        )
+
+    @async_test
+    async def test_event_channel_rename(self):
+        self.object.is_setup = True
+        channel = SlackConversation(dict(test_channel), api_client=None)
+        self.object._channels.update({test_channel_id: channel})
+        payload = {
+            "data": {
+                "type": "channel_rename",
+                "channel": {"id": test_channel_id, "name": "renamed"},
+            }
+        }
+        await self.object._event_channel_rename(**payload)
+        self.assertEqual(self.object.get_channel_by_name("renamed"), channel)
+        self.assertEqual(self.object.get_channel_by_name(test_channel_name), channel)
+        self.assertEqual(
+            channel.previous_names, [test_channel_name, f"{test_channel_name}-old"]
+        )
+
+    @async_test
+    async def test_event_channel_left(self):
+        self.object.is_setup = True
+        channel = SlackConversation(dict(test_channel), api_client=None)
+        self.object._channels.update({test_channel_id: channel})
+        payload = {"data": {"type": "channel_left", "channel": test_channel_id}}
+        await self.object._event_channel_left(**payload)
+        assert test_channel_id not in self.object._channels
+        assert self.object._channels.get_by_name(test_channel_name) == []
+
+    @async_test
+    async def test_event_member_joined_channel(self):
+        self.object._info = {"user_id": test_user_id}
+        self.object.get_channel = AsyncMock()
+        payload = {
+            "data": {
+                "type": "member_joined_channel",
+                "user": "UOTHER",
+                "channel": test_channel_id,
+            }
+        }
+        await self.object._event_member_joined_channel(**payload)
+        self.object.get_channel.assert_not_called()
+        payload["data"]["user"] = test_user_id
+        await self.object._event_member_joined_channel(**payload)
+        self.object.get_channel.assert_called_with(test_channel_id)
+
+    @async_test
+    async def test_update_channels_reconciles_cache(self):
+        self.object.is_setup = True
+        channel = SlackConversation(dict(test_channel), api_client=None)
+        left = SlackConversation(
+            dict(test_channel, id="CLEFT", name="left", name_normalized="left"),
+            api_client=None,
+        )
+        im = SlackConversation(dict(test_dm, id="DTESTIM"), api_client=None)
+        for conversation in [channel, left, im]:
+            self.object._channels[conversation.id] = conversation
+        self.object.api_client.users_conversations = AsyncMock()
+        self.object.api_client.users_conversations.coro.side_effect = [
+            {
+                "channels": [dict(test_channel, name="renamed")],
+                "response_metadata": {"next_cursor": "abc"},
+            },
+            {
+                "channels": [
+                    dict(test_channel, id=test_group_id, name=test_group_name)
+                ],
+                "response_metadata": {"next_cursor": ""},
+            },
+        ]
+        await self.object.update_channels()
+        # existing channels are updated in place
+        assert self.object._channels[test_channel_id] is channel
+        assert self.object.get_channel_by_name("renamed") == channel
+        assert self.object._channels[test_group_id].name == test_group_name
+        assert "CLEFT" not in self.object._channels
+        assert im.id in self.object._channels
+
+    @async_test
+    async def test_snapshot_round_trip(self):
+        blobs = {}
+        self.object.plugin_manager.state_handler = mock.Mock()
+        self.object.plugin_manager.state_handler.save_blob.side_effect = (
+            blobs.__setitem__
+        )
+        self.object.plugin_manager.state_handler.load_blob.side_effect = blobs.get
+        self.object.user_manager = mock.Mock()
+        self.object.user_manager.users = LRUCache()
+        self.object.user_manager.users[test_user_id] = test_user
+        self.object._channels[test_channel_id] = test_conversation
+        await self.object.save_snapshot()
+
+        with open("config.yaml.example", "r") as f:
+            bot = Bot(config=yaml.safe_load(f), test_mode=True)
+        bot.is_setup = True
+        bot.plugin_manager = self.object.plugin_manager
+        bot.user_manager = mock.Mock()
+        bot.load_snapshot()
+        assert bot.get_channel_by_name(test_channel_name).id == test_channel_id
+        bot.user_manager.load_snapshot.assert_called_with([test_user_response["user"]])
+        assert bot.metrics["snapshot_load_time"] > 0
+
+    def test_load_snapshot_missing(self):
+        self.object.plugin_manager.state_handler = mock.Mock()
+        self.object.plugin_manager.state_handler.load_blob.return_value = None
+        self.object.load_snapshot()
+        assert len(self.object._channels) == 0
 
     def test_get_channel_by_name_bot_not_setup(self):
         self.object.is_setup = False
@@ -302,12 +553,58 @@ class TestBot(unittest.TestCase):
 
     def test_get_channel_by_name_bot_no_channels(self):
         self.object.is_setup = True
-        self.object._channels = {}
+        self.object._channels = None
         with self.assertRaises(RuntimeError):
             self.object.get_channel_by_name(test_channel_name)
         self.object.log.warning.assert_called_with(
-            "Bot.channels was called but self._bot_channels was empty!"
+            "Bot.channels was called but self._channels wasn't set up!"
+        )
+
+    def test_channels_does_not_count_cache(self):
+        self.object.is_setup = True
+        self.object._channels = ChannelCache()
+        with mock.patch.object(ChannelCache, "__len__") as mock_len:
+            self.assertIs(self.object.channels, self.object._channels)
+            with self.assertRaises(RuntimeError):
+                self.object.get_channel_by_name(test_channel_name)
+        mock_len.assert_not_called()
+
+    @async_test
+    async def test_get_channel_reloads_evicted_channel(self):
+        self.object.is_setup = True
+        self.object._channels = LRUCache(max_size=1)
+        self.object._channels.update({test_channel_id: test_conversation})
+        self.object._channels.update({"COTHER": test_conversation})
+        self.object.api_client.conversations_info = AsyncMock()
+        self.object.api_client.conversations_info.coro.return_value = {
+            "channel": test_channel
+        }
+        channel = await self.object.get_channel(test_channel_id)
+        self.object.api_client.conversations_info.assert_called_with(
+            channel=test_channel_id
         )
+        assert channel.name == test_channel_name
+        assert self.object._channels.metrics["evictions"] == 2
+
+    @async_test
+    async def test_send_message_uses_outbound_queue(self):
+        self.object.outbound.start()
+        self.object.api_client.chat_postMessage = AsyncMock()
+        self.object.api_client.chat_postMessage.coro.return_value = {"ok": True}
+        response = await self.object.send_message(test_conversation, "hi")
+        await self.object.outbound.stop()
+        assert response == {"ok": True}
+        self.object.api_client.chat_postMessage.assert_called_with(
+            channel=test_channel_id,
+            as_user=True,
+            text="hi",
+            thread_ts=None,
+            reply_broadcast=None,
+            attachments=None,
+            parse=None,
+            link_names=1,
+        )
+        assert self.object.get_metrics()["outbound_queue"]["sent"] == 1
 
     @async_test
     async def test_at_user(self):
@@ -331,7 +628,7 @@ class TestBot(unittest.TestCase):
         self.object.plugin_manager.broadcast_event = AsyncMock()
         self.object.plugin_manager.plugins = [plugin]
         self.object._add_event_handlers()
-        self.assertEqual(mock_rtm.on.call_count, 4)
+        self.assertEqual(mock_rtm.on.call_count, 12)
         mock_rtm.on.assert_called_with(
             event=test_event_type, callback=self.object._event_plugin
         )
@@ -340,6 +637,36 @@ class TestBot(unittest.TestCase):
             test_event_type, test_payload["data"]
         )
 
+    @mock.patch("slackminion.bot.MyRTMClient")
+    @async_test
+    async def test_plugin_events_registered_once(self, mock_rtm):
+        calls = []
+
+        class CountingPlugin(BasePlugin):
+            notify_event_types = [test_event_type, "error"]
+
+            def handle_event(self, event_type, data):
+                calls.append(event_type)
+
+        self.object.plugin_manager.plugins = [
+            CountingPlugin(self.object) for _ in range(3)
+        ]
+        self.object._add_event_handlers()
+        callbacks = [call[1]["callback"] for call in mock_rtm.on.call_args_list]
+        self.assertEqual(callbacks.count(self.object._event_plugin), 1)
+        mock_rtm.on.assert_any_call(
+            event=test_event_type, callback=self.object._event_plugin
+        )
+        # deliver the event to every registered callback, as the rtm client would
+        for call in mock_rtm.on.call_args_list:
+            if call[1]["event"] == test_event_type:
+                await call[1]["callback"](**test_payload)
+        self.assertEqual(calls, [test_event_type] * 3)
+        calls.clear()
+        self.object.log = mock.Mock()
+        await self.object._event_error(**dict(test_payload, data={"type": "error"}))
+        self.assertEqual(calls, ["error"] * 3)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,118 @@
+import threading
+
+from slackminion.tests.fixtures import *
+from slackminion.utils.cache import ChannelCache, LRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_get_set(self):
+        cache = LRUCache()
+        assert not cache
+        cache["a"] = 1
+        assert cache
+        assert cache["a"] == 1
+        assert cache.get("b") is None
+        assert "a" in cache
+        assert "b" not in cache
+        assert cache.metrics["hits"] == 1
+        assert cache.metrics["misses"] == 1
+
+    def test_evicts_least_recently_used(self):
+        evicted = []
+        cache = LRUCache(max_size=2, on_evict=lambda k, v: evicted.append(k))
+        cache["a"] = 1
+        cache["b"] = 2
+        cache.get("a")
+        cache["c"] = 3
+        assert list(cache) == ["a", "c"]
+        assert evicted == ["b"]
+        assert cache.metrics["evictions"] == 1
+
+    def test_membership_does_not_count_as_use(self):
+        cache = LRUCache(max_size=2)
+        cache["a"] = 1
+        cache["b"] = 2
+        assert "a" in cache
+        cache["c"] = 3
+        assert "a" not in cache
+        assert cache.metrics["hits"] == 0
+
+    @mock.patch("slackminion.utils.cache.time")
+    def test_ttl(self, mock_time):
+        evicted = []
+        cache = LRUCache(ttl=10, on_evict=lambda k, v: evicted.append(k))
+        mock_time.monotonic.return_value = 100
+        cache["a"] = 1
+        mock_time.monotonic.return_value = 111
+        assert "a" not in cache
+        assert cache.values() == []
+        assert len(cache) == 0
+        assert cache.metrics["size"] == 0
+        assert cache.peek("a") == 1
+        assert cache.get("a") is None
+        assert evicted == ["a"]
+        assert cache.peek("a") is None
+        assert cache.metrics["expirations"] == 1
+
+    def test_delete(self):
+        evicted = []
+        cache = LRUCache(on_evict=lambda k, v: evicted.append(k))
+        cache.update({"a": 1, "b": 2})
+        del cache["a"]
+        assert cache.items() == [("b", 2)]
+        assert len(cache) == 1
+        assert evicted == []
+
+    def test_threads(self):
+        cache = LRUCache(max_size=10)
+
+        def worker(n):
+            for i in range(1000):
+                cache[(n, i)] = i
+                cache.get((n, i - 1))
+                len(cache)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(cache) == 10
+        assert cache.metrics["evictions"] == 4 * 1000 - 10
+
+
+class TestChannelCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = ChannelCache(max_size=2)
+        self.channel = SlackConversation(dict(test_channel), api_client=None)
+        self.cache[test_channel_id] = self.channel
+
+    def test_get_by_name(self):
+        assert self.cache.get_by_name(test_channel_name) == [self.channel]
+        assert self.cache.get_by_name(f"{test_channel_name}-old") == [self.channel]
+        assert self.cache.get_by_name("nope") == []
+
+    def test_duplicate_names(self):
+        other = SlackConversation({"id": "C2", "name": test_channel_name}, None)
+        self.cache["C2"] = other
+        assert self.cache.get_by_name(test_channel_name) == [self.channel, other]
+
+    def test_rename(self):
+        self.channel.conversation["name"] = "renamed"
+        self.channel.conversation["name_normalized"] = "renamed"
+        self.cache[test_channel_id] = self.channel
+        assert self.cache.get_by_name("renamed") == [self.channel]
+        assert self.cache.get_by_name(test_channel_name) == []
+
+    def test_delete_and_evict(self):
+        del self.cache[test_channel_id]
+        assert self.cache.get_by_name(test_channel_name) == []
+        self.cache[test_channel_id] = self.channel
+        self.cache["C2"] = SlackConversation({"id": "C2", "name": "two"}, None)
+        self.cache["C3"] = SlackConversation({"id": "C3", "name": "three"}, None)
+        assert self.cache.get_by_name(test_channel_name) == []
+        assert self.cache._by_name.keys() == {"two", "three"}
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -80,6 +80,7 @@ class TestCorePlugin(BasicPluginTest, unittest.TestCase):
 
     def test_help(self):
         self.object._bot.dispatcher.commands = {}
+        self.object._bot.dispatcher.help_cache = {}
         self.object._should_filter_help_commands = mock.Mock(return_value=False)
         assert self.object.help(self.test_event, []) == ""
 
@@ -91,6 +92,28 @@ class TestCorePlugin(BasicPluginTest, unittest.TestCase):
             "Displays help for each command"
         )
 
+    def test_help_cached_until_commands_change(self):
+        dispatcher = self.object._bot.dispatcher = MessageDispatcher()
+        self.object._bot.webserver = Webserver(test_host, test_port)
+        self.object._should_filter_help_commands = mock.Mock(return_value=True)
+        dispatcher.register_plugin(self.object)
+        listing = self.object.help(self.test_event, [])
+        assert "*!help*" in listing and "*!save*" not in listing
+        assert dispatcher.help_cache == {True: listing}
+
+        class ExtraPlugin(BasePlugin):
+            @cmd()
+            def abc(self, msg, args):
+                """Does abc."""
+
+        dummy = ExtraPlugin(self.object._bot)
+        dispatcher.register_plugin(dummy)
+        assert dispatcher.help_cache == {}
+        assert "*!abc*" in self.object.help(self.test_event, [])
+        dispatcher.unregister_plugin(dummy)
+        assert "*!abc*" not in self.object.help(self.test_event, [])
+        assert dispatcher._find_longest_prefix_command(["!abc"]) == (None, None)
+
     @async_test
     async def test_save(self):
         self.object.send_message = AsyncMock()
@@ -139,10 +162,8 @@ class TestCorePlugin(BasicPluginTest, unittest.TestCase):
         await self.object.wake(self.test_event, [])
         self.object._bot.dispatcher.unignore.assert_called_with(TestChannel)
 
-    @mock.patch("slackminion.plugin.base.SlackConversation")
     @async_test
-    async def test_wake_channel(self, mock_slackchannel):
-        mock_slackchannel.return_value = test_conversation
+    async def test_wake_channel(self):
         self.object.send_message = AsyncMock()
         await self.object.wake(test_conversation, [test_channel_name])
         self.object.send_message.assert_called()
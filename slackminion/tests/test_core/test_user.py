@@ -0,0 +1,138 @@
+from slackminion.plugins.core.user import UserManager
+from slackminion.tests.fixtures import *
+
+
+class TestUserManager(unittest.TestCase):
+    def setUp(self):
+        bot = mock.Mock()
+        bot.config = {"bot_admins": [], "user_cache": {"ttl": 60}}
+        self.object = UserManager(bot)
+        self.object.on_load()
+        self.user = SlackUser(user_info=test_user_response["user"])
+
+    def test_set_and_get(self):
+        self.object.set(self.user)
+        assert self.object.get(test_user_id) is self.user
+        assert self.object.get_by_username(test_user_name) is self.user
+        assert self.object.get(non_existent_user_id) is None
+
+    @mock.patch("slackminion.utils.cache.time")
+    def test_get_expired(self, mock_time):
+        mock_time.monotonic.return_value = 1000
+        self.object.set(self.user)
+        mock_time.monotonic.return_value = 1059
+        assert self.object.get(test_user_id) is self.user
+        mock_time.monotonic.return_value = 1061
+        assert self.object.get(test_user_id) is None
+
+    @mock.patch("slackminion.utils.cache.time")
+    def test_get_by_username_expired(self, mock_time):
+        mock_time.monotonic.return_value = 1000
+        self.object.set(self.user)
+        mock_time.monotonic.return_value = 1061
+        assert self.object.get_by_username(test_user_name) is None
+        assert test_user_id not in self.object.users
+        assert test_user_name not in self.object._users_by_name
+
+    @mock.patch("slackminion.utils.cache.time")
+    def test_set_refreshes_user(self, mock_time):
+        mock_time.monotonic.return_value = 1000
+        self.object.set(self.user)
+        mock_time.monotonic.return_value = 2000
+        refreshed = SlackUser(user_info=test_user_response["user"])
+        self.object.set(refreshed)
+        assert self.object.get(test_user_id) is refreshed
+
+    @async_test
+    async def test_prefetch_users(self):
+        pages = [
+            {
+                "members": [{"id": "U1", "name": "one"}, {"id": "U2", "name": "two"}],
+                "response_metadata": {"next_cursor": "abc"},
+            },
+            {
+                "members": [{"id": test_user_id, "name": "stale"}],
+                "response_metadata": {"next_cursor": ""},
+            },
+        ]
+        self.object._bot.api_client.users_list = AsyncMock(side_effect=pages)
+        self.object.set(self.user)
+        await self.object.prefetch_users()
+        self.object._bot.api_client.users_list.assert_called_with(
+            limit=1000, cursor="abc"
+        )
+        assert self.object.get("U1").username == "one"
+        assert self.object.get("U1").username == "one"
+        assert self.object.get(test_user_id).username == test_user_name
+        assert self.object.metrics["size"] == 3
+        assert self.object.metrics["prefetch_misses_avoided"] == 1
+
+    def test_get_by_username_after_rename(self):
+        self.object.set(self.user)
+        renamed = SlackUser(user_info={"id": test_user_id, "name": "newname"})
+        self.object.set(renamed)
+        assert self.object.get_by_username("newname") is renamed
+        assert self.object.get_by_username(test_user_name) is None
+
+    def test_get_by_username_name_reused(self):
+        self.object.set(self.user)
+        # another user takes over the old name before the first rename is seen
+        other = SlackUser(user_info={"id": "U2", "name": test_user_name})
+        self.object.set(other)
+        renamed = SlackUser(user_info={"id": test_user_id, "name": "newname"})
+        self.object.set(renamed)
+        assert self.object.get_by_username(test_user_name) is other
+        assert self.object.get_by_username("newname") is renamed
+
+    def test_handle_user_change(self):
+        self.object.set(self.user)
+        self.object.handle_event(
+            "user_change", {"user": {"id": test_user_id, "name": "newname"}}
+        )
+        assert self.object.get(test_user_id).username == "newname"
+        assert self.object.get_by_username("newname").id == test_user_id
+        # users we haven't seen aren't added
+        self.object.handle_event("user_change", {"user": {"id": "U2", "name": "x"}})
+        assert self.object.get("U2") is None
+
+    @mock.patch("slackminion.utils.cache.time")
+    def test_no_ttl(self, mock_time):
+        self.object._bot.config = {}
+        self.object.on_load()
+        mock_time.monotonic.return_value = 0
+        self.object.set(self.user)
+        mock_time.monotonic.return_value = 100000
+        assert self.object.get(test_user_id) is self.user
+
+    def test_evicted_user_removed_from_index(self):
+        self.object._bot.config = {"user_cache": {"max_size": 1}}
+        self.object.on_load()
+        self.object.set(self.user)
+        other = SlackUser(user_info={"id": "U2", "name": "other"})
+        self.object.set(other)
+        assert self.object.get(test_user_id) is None
+        assert self.object.get_by_username(test_user_name) is None
+        assert self.object.get_by_username("other") is other
+        assert self.object.metrics["evictions"] == 1
+
+    @async_test
+    async def test_load_snapshot_revalidates_on_first_use(self):
+        self.object.load_snapshot([{"id": test_user_id, "name": "old"}])
+        task_manager = self.object._bot.task_manager
+        assert self.object.get(test_user_id).username == "old"
+        task_manager.create_and_schedule_task.assert_called_once_with(
+            self.object._revalidate_user, test_user_id
+        )
+        self.object.get(test_user_id)
+        task_manager.create_and_schedule_task.assert_called_once()
+
+        self.object._bot.api_client.users_info = AsyncMock(
+            return_value=test_user_response
+        )
+        await self.object._revalidate_user(test_user_id)
+        assert self.object.get(test_user_id).username == test_user_name
+        assert self.object.get_by_username("old") is None
+
+
+if __name__ == "__main__":
+    unittest.main()
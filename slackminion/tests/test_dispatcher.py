@@ -1,12 +1,80 @@
+import threading
+import time
 from copy import deepcopy
 
-from slackminion.dispatcher import MessageDispatcher
+from slackminion.dispatcher import CommandTrie, MessageDispatcher, could_be_command
 from slackminion.exceptions import DuplicateCommandError
 from slackminion.tests.fixtures import *
 
 test_data_mapping = []
 
 
+class SlowPlugin(BasePlugin):
+    command_executor = "thread"
+
+    @cmd()
+    async def hang(self, msg, args):
+        await asyncio.sleep(10)
+
+    @cmd(timeout=0.01)
+    async def quick(self, msg, args):
+        await asyncio.sleep(10)
+
+    @cmd(timeout=0)
+    async def forever(self, msg, args):
+        await asyncio.sleep(0.05)
+        return "done"
+
+    @cmd(timeout=0.01)
+    def block(self, msg, args):
+        time.sleep(0.1)
+        return "blocked"
+
+    @cmd(timeout=1)
+    async def upstream(self, msg, args):
+        await asyncio.wait_for(asyncio.sleep(10), 0.01)
+
+    @cmd(timeout=1)
+    def stall(self, msg, args):
+        raise asyncio.TimeoutError("upstream")
+
+
+class ChattyPlugin(BasePlugin):
+    @cmd()
+    async def chatty(self, msg, args):
+        await self.send_message(msg.channel, "working...")
+        return "done"
+
+    @cmd(coalesce=False)
+    async def quiet(self, msg, args):
+        await self.send_message(msg.channel, "working...")
+        return "done"
+
+
+class StreamingPlugin(BasePlugin):
+    command_executor = "thread"
+
+    @cmd()
+    def lines(self, msg, args):
+        yield threading.current_thread().name
+        yield "done"
+
+    @cmd()
+    async def broken(self, msg, args):
+        yield "one"
+        raise ValueError("broken")
+
+    @cmd(timeout=0.05)
+    async def stuck(self, msg, args):
+        yield "one"
+        await asyncio.sleep(10)
+        yield "two"
+
+    @cmd()
+    def listing(self, msg, args):
+        return ["one", "two"]
+
+
 class TestDispatcher(unittest.TestCase):
     @mock.patch("slackminion.slack.SlackUser")
     def setUp(self, mock_user):
@@ -39,6 +107,51 @@ class TestDispatcher(unittest.TestCase):
         with self.assertRaises(KeyError):
             self.dispatcher._get_command("!def", None)
 
+    def test_find_longest_prefix_command(self):
+        self.dispatcher.register_plugin(self.p)
+        cmd, args = self.dispatcher._find_longest_prefix_command(["!abc", "x", "y"])
+        assert cmd == "!abc"
+        assert args == ["x", "y"]
+
+    def test_find_longest_prefix_command_no_match(self):
+        self.dispatcher.register_plugin(self.p)
+        assert self.dispatcher._find_longest_prefix_command(["!nope", "abc"]) == (
+            None,
+            None,
+        )
+
+    def test_command_trie_longest_prefix(self):
+        trie = CommandTrie()
+        trie.add("!acl")
+        trie.add("!acl show")
+        trie.add("!acl show all users")
+        assert trie.find_longest_prefix(["!acl", "show", "x"]) == ("!acl show", 2)
+        assert trie.find_longest_prefix(["!acl", "show", "all"]) == ("!acl show", 2)
+        assert trie.find_longest_prefix(["!acl", "show", "all", "users"]) == (
+            "!acl show all users",
+            4,
+        )
+        assert trie.find_longest_prefix(["!acl", "new"]) == ("!acl", 1)
+        assert trie.find_longest_prefix(["acl", "show"]) == (None, 0)
+        assert trie.find_longest_prefix([]) == (None, 0)
+
+    def test_command_trie_remove(self):
+        trie = CommandTrie()
+        for command in ["!a", "!a b", "!a b c"]:
+            trie.add(command)
+        trie.remove("!a b")
+        self.assertEqual(trie.find_longest_prefix(["!a", "b", "c"]), ("!a b c", 3))
+        self.assertEqual(trie.find_longest_prefix(["!a", "b"]), ("!a", 1))
+        trie.remove("!a b c")
+        self.assertEqual(trie.root.children["!a"].children, {})
+        trie.remove("!missing")
+
+    def test_could_be_command(self):
+        for text in ["!abc", "  !abc def", "\uff01abc", "\u203c"]:
+            assert could_be_command(text) is True, text
+        for text in ["abc !def", "", "   ", None, "\u00e9!", "x" * 10000]:
+            assert could_be_command(text) is False, text
+
     def test_parse_message(self):
         e = SlackEvent(event_type="message", **{"data": {"text": "Hello world"}})
         assert self.dispatcher._parse_message(e) == ["Hello", "world"]
@@ -114,6 +227,134 @@ class TestDispatcher(unittest.TestCase):
         assert cmd_opts.get("reply_broadcast") is False
         assert cmd_opts.get("reply_in_thread") is False
 
+    @async_test
+    async def test_push_thread_executor(self):
+        self.dispatcher = MessageDispatcher({"command_executor": {"mode": "thread"}})
+        self.dispatcher.register_plugin(self.p)
+        self.test_payload["data"].update({"text": "!abc"})
+        e = SlackEvent(event_type="message", **self.test_payload)
+        e.user = mock.Mock()
+        e.channel = test_conversation
+        cmd, output, cmd_opts = await self.dispatcher.push(e)
+        self.dispatcher.shutdown()
+        assert cmd == "!abc"
+        assert output == "abcba"
+
+    async def _push_slow_command(self, text, command_timeout=None):
+        self.dispatcher = MessageDispatcher({"command_timeout": command_timeout})
+        self.dispatcher.register_plugin(SlowPlugin(None))
+        self.test_payload["data"].update({"text": text})
+        e = SlackEvent(event_type="message", **self.test_payload)
+        e.user = mock.Mock()
+        e.channel = test_conversation
+        try:
+            return await self.dispatcher.push(e)
+        finally:
+            self.dispatcher.shutdown()
+
+    @async_test
+    async def test_push_command_timeout(self):
+        cmd, output, cmd_opts = await self._push_slow_command("!hang", 0.01)
+        assert cmd == "!hang"
+        assert output == "Sorry, !hang timed out after 0.01 seconds."
+        assert self.dispatcher.timeouts == {"!hang": 1}
+
+    @async_test
+    async def test_push_cmd_timeout_overrides_default(self):
+        cmd, output, cmd_opts = await self._push_slow_command("!quick")
+        assert output == "Sorry, !quick timed out after 0.01 seconds."
+        cmd, output, cmd_opts = await self._push_slow_command("!forever", 0.01)
+        assert output == "done"
+
+    @async_test
+    async def test_push_worker_pool_timeout(self):
+        cmd, output, cmd_opts = await self._push_slow_command("!block")
+        assert output == "Sorry, !block timed out after 0.01 seconds."
+        assert self.dispatcher.timeouts["!block"] == 1
+
+    @async_test
+    async def test_push_plugin_timeout_is_an_exception(self):
+        cmd, output, cmd_opts = await self._push_slow_command("!upstream")
+        assert output.startswith("Command failed due to an exception")
+        cmd, output, cmd_opts = await self._push_slow_command("!stall")
+        assert output == "Command failed due to an exception: upstream"
+        assert self.dispatcher.timeouts == {}
+
+    async def _push_streaming_command(self, text):
+        self.dispatcher.register_plugin(StreamingPlugin(None))
+        self.test_payload["data"].update({"text": text})
+        e = SlackEvent(event_type="message", **self.test_payload)
+        e.user = mock.Mock()
+        e.channel = test_conversation
+        sent = []
+
+        async def on_stream(cmd, cmd_options, chunks):
+            async for chunk in chunks:
+                sent.append(chunk)
+
+        try:
+            cmd, output, cmd_options = await self.dispatcher.push(
+                e, on_stream=on_stream
+            )
+        finally:
+            self.dispatcher.shutdown()
+        return output, sent
+
+    @async_test
+    async def test_push_stream_from_thread_pool(self):
+        output, sent = await self._push_streaming_command("!lines")
+        assert output is None
+        assert sent[1] == "done"
+        assert sent[0] != threading.current_thread().name
+
+    @async_test
+    async def test_push_stream_exception(self):
+        output, sent = await self._push_streaming_command("!broken")
+        assert output == "Command failed due to an exception: broken"
+        assert sent == ["one"]
+
+    @async_test
+    async def test_push_stream_timeout(self):
+        output, sent = await self._push_streaming_command("!stuck")
+        assert output == "Sorry, !stuck timed out after 0.05 seconds."
+        assert sent == ["one"]
+        assert self.dispatcher.timeouts == {"!stuck": 1}
+
+    @async_test
+    async def test_push_list_is_not_a_stream(self):
+        output, sent = await self._push_streaming_command("!listing")
+        assert output == ["one", "two"]
+        assert sent == []
+
+    async def _push_chatty_command(self, text, coalesce_messages=True):
+        bot = mock.Mock()
+        bot.send_message = AsyncMock()
+        plugin = ChattyPlugin(bot)
+        plugin.coalesce_messages = coalesce_messages
+        self.dispatcher.register_plugin(plugin)
+        self.test_payload["data"].update({"text": text})
+        e = SlackEvent(event_type="message", **self.test_payload)
+        e.user = mock.Mock()
+        e.channel = test_conversation
+        cmd, output, cmd_opts = await self.dispatcher.push(e)
+        assert output == "done"
+        return bot.send_message.call_args[1]["coalesce"], self.dispatcher.commands[cmd]
+
+    @async_test
+    async def test_push_coalesce_options(self):
+        coalesce, command = await self._push_chatty_command("!chatty")
+        assert coalesce is True and command.coalesce is True
+
+    @async_test
+    async def test_push_cmd_coalesce_disabled(self):
+        coalesce, command = await self._push_chatty_command("!quiet")
+        assert coalesce is False and command.coalesce is False
+
+    @async_test
+    async def test_push_plugin_coalesce_disabled(self):
+        coalesce, command = await self._push_chatty_command("!chatty", False)
+        assert coalesce is False and command.coalesce is False
+
     @async_test
     async def test_push_alias(self):
         self.dispatcher.register_plugin(self.p)
@@ -0,0 +1,151 @@
+import threading
+import time
+
+from slackminion.dispatcher import PluginCommand
+from slackminion.exceptions import CommandTimeoutError
+from slackminion.tests.fixtures import *
+from slackminion.utils.executor import CommandExecutor, WorkerPool
+
+
+class ThreadedPlugin(DummyPlugin):
+    command_executor = "thread"
+    command_executor_workers = 1
+
+
+class StuckPlugin(DummyPlugin):
+    command_executor = "thread"
+    release = threading.Event()
+
+    @cmd()
+    def stuck(self, msg, args):
+        self.release.wait()
+
+
+class ProcessPlugin(DummyPlugin):
+    command_executor = "process"
+
+
+def current_thread_name(*args):
+    return threading.current_thread().name
+
+
+class TestWorkerPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = WorkerPool("test", max_workers=1)
+
+    def tearDown(self):
+        self.pool.shutdown(wait=True)
+
+    @async_test
+    async def test_run(self):
+        output = await self.pool.run(current_thread_name)
+        self.assertNotEqual(output, threading.current_thread().name)
+        metrics = self.pool.metrics
+        self.assertEqual(metrics["completed"], 1)
+        self.assertEqual(metrics["in_flight"], 0)
+
+    @async_test
+    async def test_run_raises(self):
+        def fail():
+            raise ValueError("nope")
+
+        with self.assertRaises(ValueError):
+            await self.pool.run(fail)
+
+    def test_queue_depth(self):
+        release = threading.Event()
+        futures = [self.pool.submit(release.wait) for _ in range(3)]
+        self.assertEqual(self.pool.metrics["queue_depth"], 2)
+        time.sleep(0.05)
+        release.set()
+        for f in futures:
+            f.result()
+        metrics = self.pool.metrics
+        self.assertEqual(metrics["queue_depth"], 0)
+        self.assertEqual(metrics["completed"], 3)
+        self.assertGreater(metrics["max_wait_time"], 0)
+
+    def test_shutdown_cancels_pending(self):
+        release = threading.Event()
+        running = self.pool.submit(release.wait)
+        pending = self.pool.submit(release.wait)
+        threading.Timer(0.05, release.set).start()
+        self.pool.shutdown(wait=True)
+        self.assertTrue(running.done())
+        self.assertTrue(pending.cancelled())
+        self.assertEqual(self.pool.metrics["in_flight"], 0)
+
+    def test_shutdown_does_not_wait_for_stuck_thread(self):
+        release = threading.Event()
+        stuck = self.pool.submit(release.wait)
+        started = time.monotonic()
+        self.pool.shutdown()
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertFalse(stuck.done())
+        release.set()
+        stuck.result(1)
+
+    def test_invalid_mode(self):
+        with self.assertRaises(ValueError):
+            WorkerPool("test", mode="fork")
+
+
+class TestCommandExecutor(unittest.TestCase):
+    def setUp(self):
+        self.executor = CommandExecutor()
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_invalid_mode(self):
+        with self.assertRaises(ValueError):
+            CommandExecutor({"mode": "process"})
+
+    @async_test
+    async def test_run_inline(self):
+        command = PluginCommand(DummyPlugin(None).abc)
+        assert await self.executor.run(command, None, []) == "abcba"
+        assert self.executor.pools == {}
+
+    @async_test
+    async def test_run_in_plugin_thread_pool(self):
+        command = PluginCommand(ThreadedPlugin(None).abc)
+        assert await self.executor.run(command, None, []) == "abcba"
+        pool = self.executor.pools["ThreadedPlugin"]
+        assert pool.mode == "thread"
+        assert pool.max_workers == 1
+        assert self.executor.metrics["ThreadedPlugin"]["completed"] == 1
+
+    @async_test
+    async def test_run_default_thread_pool(self):
+        self.executor = CommandExecutor({"mode": "thread", "max_workers": 2})
+        command = PluginCommand(DummyPlugin(None).abc)
+        assert await self.executor.run(command, None, []) == "abcba"
+        assert self.executor.pools["DummyPlugin"].max_workers == 2
+
+    @async_test
+    async def test_shutdown_with_stuck_command(self):
+        command = PluginCommand(StuckPlugin(None).stuck)
+        with self.assertRaises(CommandTimeoutError):
+            await self.executor.run(command, None, [], timeout=0.01)
+        started = time.monotonic()
+        self.executor.shutdown()
+        self.assertLess(time.monotonic() - started, 0.5)
+        StuckPlugin.release.set()
+
+    @async_test
+    async def test_run_in_process_pool(self):
+        command = PluginCommand(ProcessPlugin(mock.Mock()).abc)
+        e = SlackEvent(event_type="message", **test_payload)
+        e.user = test_user
+        e.channel = test_conversation
+        assert await self.executor.run(command, e, []) == "abcba"
+        pool = self.executor.pools["ProcessPlugin"]
+        assert pool.mode == "process"
+        self.executor.shutdown()
+        assert self.executor.pools == {}
+        assert not pool.executor._processes
+
+
+if __name__ == "__main__":
+    unittest.main()
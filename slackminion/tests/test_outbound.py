@@ -0,0 +1,147 @@
+import time
+
+from slack_sdk.errors import SlackApiError
+
+from slackminion.tests.fixtures import *
+from slackminion.utils.outbound import OutboundQueue
+
+
+def rate_limited_error(retry_after="0"):
+    response = mock.Mock(status_code=429, headers={"Retry-After": retry_after})
+    return SlackApiError("ratelimited", response)
+
+
+class TestOutboundQueue(unittest.TestCase):
+    def setUp(self):
+        self.sent = []
+        self.errors = []
+
+    async def send(self, channel, text):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append((channel, text, time.monotonic()))
+        return {"ok": True, "channel": channel, "text": text}
+
+    @async_test
+    async def test_channel_messages_are_paced(self):
+        queue = OutboundQueue(self.send, channel_interval=0.05, workspace_rate=100)
+        queue.start()
+        results = await asyncio.gather(
+            queue.send_message("C1", text="one"),
+            queue.send_message("C1", text="two"),
+            queue.send_message("C2", text="three"),
+        )
+        await queue.stop()
+        self.assertEqual(results[1], {"ok": True, "channel": "C1", "text": "two"})
+        sent = {text: sent_at for _, text, sent_at in self.sent}
+        self.assertEqual([text for _, text, _ in self.sent], ["one", "three", "two"])
+        assert sent["two"] - sent["one"] >= 0.05
+        assert sent["three"] - sent["one"] < 0.05
+        self.assertEqual(queue.metrics["sent"], 3)
+
+    @async_test
+    async def test_interactive_sent_before_bulk(self):
+        queue = OutboundQueue(self.send, channel_interval=0, workspace_rate=20)
+        queue.start()
+        queue._tokens = 1
+        queue._paused_until = time.monotonic() + 0.05
+        pending = asyncio.gather(
+            queue.send_message("C1", priority="bulk", text="bulk"),
+            queue.send_message("C2", text="interactive"),
+        )
+        await asyncio.sleep(0)
+        self.assertEqual(queue.metrics["queued"], {"interactive": 1, "bulk": 1})
+        await pending
+        await queue.stop()
+        self.assertEqual([text for _, text, _ in self.sent], ["interactive", "bulk"])
+
+    @async_test
+    async def test_rate_limited_message_is_retried(self):
+        self.errors = [rate_limited_error()]
+        queue = OutboundQueue(self.send, channel_interval=0)
+        queue.start()
+        await queue.send_message("C1", text="hi")
+        await queue.stop()
+        self.assertEqual([text for _, text, _ in self.sent], ["hi"])
+        self.assertEqual(queue.metrics["rate_limited"], 1)
+
+    @async_test
+    async def test_send_errors_are_raised(self):
+        self.errors = [RuntimeError("failed")]
+        queue = OutboundQueue(self.send, channel_interval=0)
+        queue.start()
+        with self.assertRaises(RuntimeError):
+            await queue.send_message("C1", text="hi")
+        await queue.stop()
+        self.assertEqual(queue.metrics["failed"], 1)
+
+    @async_test
+    async def test_messages_are_coalesced(self):
+        queue = OutboundQueue(self.send, channel_interval=0, coalesce_window=0.02)
+        queue.start()
+        assert (
+            await queue.send_message(
+                "C1", coalesce=True, text="Saving current state..."
+            )
+            is None
+        )
+        await queue.send_message("C1", coalesce=True, text="Done.")
+        await queue.send_message("C2", coalesce=True, text="other channel")
+        response = await queue.send_message("C1", coalesce=False, text="separate")
+        await queue.stop()
+        self.assertEqual(
+            [(channel, text) for channel, text, _ in self.sent],
+            [
+                ("C1", "Saving current state...\nDone."),
+                ("C2", "other channel"),
+                ("C1", "separate"),
+            ],
+        )
+        self.assertEqual(response["text"], "separate")
+        self.assertEqual(queue.metrics["sent"], 3)
+        self.assertEqual(queue.metrics["coalesced"], 1)
+
+    @async_test
+    async def test_coalesce_respects_max_length(self):
+        queue = OutboundQueue(
+            self.send, channel_interval=0, coalesce_window=0.02, max_text_length=10
+        )
+        queue.start()
+        await queue.send_message("C1", coalesce=True, text="12345")
+        await queue.send_message("C1", coalesce=True, text="6789")
+        await queue.send_message("C1", coalesce=True, text="abc")
+        await queue.stop()
+        self.assertEqual([text for _, text, _ in self.sent], ["12345\n6789", "abc"])
+
+    @async_test
+    async def test_coalesce_disabled_without_window(self):
+        queue = OutboundQueue(self.send, channel_interval=0)
+        queue.start()
+        await asyncio.gather(
+            queue.send_message("C1", coalesce=True, text="one"),
+            queue.send_message("C1", coalesce=True, text="two"),
+        )
+        await queue.stop()
+        self.assertEqual([text for _, text, _ in self.sent], ["one", "two"])
+
+    @async_test
+    async def test_coalesced_failures_are_logged(self):
+        self.errors = [RuntimeError("failed")]
+        queue = OutboundQueue(self.send, channel_interval=0, coalesce_window=0.01)
+        queue.log = mock.Mock()
+        queue.start()
+        await queue.send_message("C1", coalesce=True, text="hi")
+        await queue.stop()
+        queue.log.error.assert_called_with("Failed to send message: failed")
+
+    @async_test
+    async def test_unknown_priority(self):
+        queue = OutboundQueue(self.send)
+        queue.start()
+        with self.assertRaises(ValueError):
+            await queue.send_message("C1", priority="urgent", text="hi")
+        await queue.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,7 @@
 import slackminion.plugin.base
 from slackminion.plugin import BasePlugin
 from slackminion.tests.fixtures import *
+from slackminion.utils.async_task import TimerService
 
 
 def dummy_func(self):
@@ -43,11 +44,40 @@ class TestBasePlugin(unittest.TestCase):
         self.plugin.start_timer(30, dummy_func)
         self.plugin._bot.task_manager.start_timer.assert_called_with(30, dummy_func)
 
+    def test_start_persistent_timer(self):
+        self.plugin._bot.task_manager = mock.Mock()
+        self.plugin.start_timer(30, self.plugin.on_load, "arg", persist=True)
+        self.plugin._bot.task_manager.start_timer.assert_called_with(
+            30, self.plugin.on_load, "arg", persist=True
+        )
+
     def test_stop_timer(self):
         self.plugin._bot.task_manager = mock.Mock()
         self.plugin.stop_timer(dummy_func)
         self.plugin._bot.task_manager.stop_timer.assert_called_with(dummy_func.__name__)
 
+    def test_stop_timer_handle(self):
+        self.plugin._bot.task_manager = mock.Mock()
+        handle = TimerService().call_later(30, dummy_func)
+        self.plugin.stop_timer(handle)
+        assert handle.cancelled is True
+        self.plugin._bot.task_manager.stop_timer.assert_not_called()
+
+    def test_start_cron_task(self):
+        self.plugin._bot.task_manager = mock.Mock()
+        self.plugin.start_cron_task("0 9 * * mon-fri", dummy_func, tz=3600)
+        self.plugin._bot.task_manager.start_cron_task.assert_called_with(
+            "0 9 * * mon-fri",
+            dummy_func,
+            tz=3600,
+            name="BasePlugin.dummy_func",
+            catch_up=True,
+        )
+        self.plugin.stop_cron_task(dummy_func)
+        self.plugin._bot.task_manager.stop_cron_task.assert_called_with(
+            "BasePlugin.dummy_func"
+        )
+
     @async_test
     async def test_get_channel(self):
         await self.plugin.get_channel(test_channel_name)
@@ -1,4 +1,5 @@
 from slackminion.plugin import PluginManager
+from slackminion.plugins.state import BaseStateHandler
 from slackminion.tests.fixtures import *
 
 
@@ -12,6 +13,7 @@ class PluginWithEvents(BasePlugin):
 class TestPluginManager(unittest.TestCase):
     def setUp(self):
         self.bot = mock.Mock()
+        self.bot.config = {"event_handler_timeout": 0.05}
         self.object = PluginManager(self.bot)
 
     def test_on_unload(self):
@@ -27,3 +29,95 @@ class TestPluginManager(unittest.TestCase):
         self.object.plugins = [plugin]
         await self.object.broadcast_event(test_event_type, test_payload["data"])
         plugin.handle_event.assert_called_with(test_event_type, test_payload["data"])
+
+    def test_handler_without_blobs_warns_once(self):
+        handler = BaseStateHandler(mock.Mock())
+        handler.on_load()
+        handler.log = mock.Mock()
+        self.object.state_handler = handler
+        self.object.save_blob("test", b"data")
+        self.assertIsNone(self.object.load_blob("test"))
+        handler.log.warning.assert_called_once()
+
+    def test_event_handlers_index(self):
+        plugin = PluginWithEvents(mock.Mock())
+        self.object.plugins = [plugin, mock.Mock(notify_event_types=[])]
+        handlers = self.object.event_handlers
+        self.assertEqual(list(handlers), [test_event_type])
+        self.assertEqual(handlers[test_event_type][0].plugin, plugin)
+        self.assertEqual(handlers[test_event_type][0].timeout, 0.05)
+
+    @async_test
+    async def test_handler_timeout_error_is_an_exception(self):
+        class UpstreamPlugin(PluginWithEvents):
+            async def handle_event(self, event_type, data):
+                raise asyncio.TimeoutError("upstream")
+
+        self.object.log = mock.Mock()
+        self.object.plugins = [UpstreamPlugin(mock.Mock())]
+        await self.object.broadcast_event(test_event_type, test_payload["data"])
+        self.object.log.warning.assert_not_called()
+        self.object.log.exception.assert_called_with("Unhandled exception!")
+
+    @async_test
+    async def test_broadcast_event_concurrent(self):
+        calls = []
+
+        class SlowPlugin(PluginWithEvents):
+            async def handle_event(self, event_type, data):
+                await asyncio.sleep(1)
+
+        class FailingPlugin(PluginWithEvents):
+            async def handle_event(self, event_type, data):
+                raise RuntimeError("failed")
+
+        class FastPlugin(PluginWithEvents):
+            async def handle_event(self, event_type, data):
+                calls.append(event_type)
+
+        self.object.log = mock.Mock()
+        self.object.plugins = [
+            SlowPlugin(mock.Mock()),
+            FailingPlugin(mock.Mock()),
+            FastPlugin(mock.Mock()),
+        ]
+        await asyncio.wait_for(
+            self.object.broadcast_event(test_event_type, test_payload["data"]), 0.5
+        )
+        self.assertEqual(calls, [test_event_type])
+        self.object.log.warning.assert_called_with(
+            f"SlowPlugin timed out handling {test_event_type} after 0.05s"
+        )
+        self.object.log.exception.assert_called_with("Unhandled exception!")
+
+    @staticmethod
+    async def _wait_for_calls(calls, count):
+        while len(calls) < count:
+            await asyncio.sleep(0.01)
+
+    @async_test
+    async def test_broadcast_event_queue(self):
+        calls = []
+        release = asyncio.Event()
+
+        class QueuedPlugin(PluginWithEvents):
+            event_queue_size = 2
+            event_timeout = 0
+
+            async def handle_event(self, event_type, data):
+                await release.wait()
+                calls.append(data)
+
+        self.object.log = mock.Mock()
+        self.object.plugins = [QueuedPlugin(mock.Mock())]
+        for i in range(4):
+            await self.object.broadcast_event(test_event_type, i)
+            await asyncio.sleep(0)
+        release.set()
+        await asyncio.wait_for(self._wait_for_calls(calls, 3), 1)
+        # the first event was being handled, the second and third were
+        # queued and the fourth was dropped
+        self.assertEqual(calls, [0, 1, 2])
+        self.assertEqual(self.object.event_handlers[test_event_type][0].dropped, 1)
+        self.object.unload_all()
+        await asyncio.sleep(0)
@@ -70,3 +70,27 @@ class TestSlackEvent(unittest.TestCase):
         self.test_payload["data"].update({"message": {"text": test_text}})
         event = SlackEvent("channel", **self.test_payload)
         self.assertEqual(event.text, test_text)
+
+    @async_test
+    async def test_resolve(self):
+        user_loader = AsyncMock()
+        user_loader.coro.return_value = test_user
+        channel_loader = AsyncMock()
+        channel_loader.coro.return_value = test_conversation
+        event = SlackEvent("message", **self.test_payload)
+        event.defer(user=user_loader, channel=channel_loader)
+        self.assertIsNone(event.user)
+        await event.resolve()
+        await event.resolve()
+        self.assertEqual(event.user, test_user)
+        self.assertEqual(event.channel, test_conversation)
+        user_loader.assert_called_once()
+        channel_loader.assert_called_once()
+
+    @async_test
+    async def test_resolve_without_loaders(self):
+        event = SlackEvent("message", **self.test_payload)
+        event.user = test_user
+        await event.resolve()
+        self.assertEqual(event.user, test_user)
+        self.assertEqual(event.channel, test_channel_id)
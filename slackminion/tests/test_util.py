@@ -1,6 +1,17 @@
-import unittest
+from slack_sdk.errors import SlackApiError
 
-from slackminion.utils.util import strip_formatting
+from slackminion.tests.fixtures import *
+from slackminion.utils.util import (
+    call_with_rate_limit,
+    split_message,
+    strip_formatting,
+    strip_formatting_args,
+)
+
+
+def rate_limited_error(retry_after="0"):
+    response = mock.Mock(status_code=429, headers={"Retry-After": retry_after})
+    return SlackApiError("ratelimited", response)
 
 
 class TestCase(unittest.TestCase):
@@ -9,6 +20,53 @@ class TestCase(unittest.TestCase):
         expected_response = "@U123456 check #test-channel has www.pinterest.com"
         self.assertEqual(expected_response, strip_formatting(test_string))
 
+    def test_strip_formatting_markup(self):
+        cases = {
+            "<@U123456>": "@U123456",
+            "<#C123456>": "#C123456",
+            "<!here> <!subteam^S123|@oncall>": "!here @oncall",
+            "<https://example.com>": "https://example.com",
+            "<mailto:a@example.com|a@example.com>": "a@example.com",
+            "no markup < here": "no markup < here",
+        }
+        for test_string, expected_response in cases.items():
+            self.assertEqual(expected_response, strip_formatting(test_string))
+
+    def test_strip_formatting_args(self):
+        args = ["see", "<https://example.com|the", "docs>", "<@U123|bob>"]
+        self.assertEqual(strip_formatting_args(args), ["see", "the", "docs", "@bob"])
+        plain = ["no", "markup"]
+        self.assertIs(strip_formatting_args(plain), plain)
+
+    def test_split_message(self):
+        self.assertEqual(split_message("short"), ["short"])
+        self.assertEqual(split_message("ab\ncd\nef", 5), ["ab\ncd", "ef"])
+        self.assertEqual(
+            split_message("aaa\nbbbbbbbbbbbb\nc", 5), ["aaa", "bbbbb", "bbbbb", "bb\nc"]
+        )
+
+    @async_test
+    async def test_call_with_rate_limit(self):
+        method = AsyncMock(side_effect=[rate_limited_error(), {"ok": True}])
+        assert await call_with_rate_limit(method, user=test_user_id) == {"ok": True}
+        assert method.call_count == 2
+        method.assert_called_with(user=test_user_id)
+
+    @async_test
+    async def test_call_with_rate_limit_gives_up(self):
+        method = AsyncMock(side_effect=rate_limited_error())
+        with self.assertRaises(SlackApiError):
+            await call_with_rate_limit(method, max_retries=2)
+        assert method.call_count == 3
+
+    @async_test
+    async def test_call_with_rate_limit_other_error(self):
+        error = SlackApiError("failed", mock.Mock(status_code=500, headers={}))
+        method = AsyncMock(side_effect=error)
+        with self.assertRaises(SlackApiError):
+            await call_with_rate_limit(method)
+        assert method.call_count == 1
+
 
 if __name__ == "__main__":
     unittest.main()
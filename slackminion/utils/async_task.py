@@ -1,54 +1,446 @@
 import asyncio
-import functools
+import bisect
+import datetime
+import gc
+import heapq
 import inspect
+import itertools
+import json
 import logging
+import math
+import random
 import signal
 import time
+import zlib
+from collections import Counter, deque
 from contextlib import suppress
+from contextvars import ContextVar
+from functools import partial
 
+# The TimerHandle of the timer whose function is running
+current_timer = ContextVar("current_timer", default=None)
 
-class CallLater:
-    called = False
-    partial_func = None
-    timer_handle = None
 
-    def __init__(self, func, delay, loop=None, *args, **kwargs):
-        self.log = logging.getLogger(type(self).__name__)
+class TimerHandle(object):
+    """A timer scheduled with TimerService, which can be used to cancel it"""
+
+    __slots__ = [
+        "when",
+        "func",
+        "args",
+        "kwargs",
+        "name",
+        "cancelled",
+        "done",
+        "late",
+        "_service",
+        "_on_done",
+    ]
+
+    def __init__(self, when, func, args, kwargs, service):
+        self.when = when
         self.func = func
         self.args = args
-        self.delay = delay
-        if loop:
-            self.event_loop = loop
-        else:
-            self.event_loop = asyncio.get_event_loop()
         self.kwargs = kwargs
-        self.name = f"{self.func.__name__}_{int(time.time())}"
+        self.name = getattr(func, "__name__", None) or repr(func)
+        self.cancelled = False
+        self.done = False
+        # set for persistent timers that were due while the bot was stopped
+        self.late = False
+        self._service = service
+        self._on_done = None
 
-    def schedule(self):
-        self.log.debug(f"Scheduling func {self.name}")
-        self.partial_func = functools.partial(self.func, *self.args, **self.kwargs)
-        self.timer_handle = self.event_loop.call_later(
-            self.delay, self.run_and_update_status
-        )
+    def cancel(self):
+        if not (self.cancelled or self.done):
+            self.cancelled = True
+            self._service._cancelled(self)
+            if self._on_done is not None:
+                self._on_done(self)
 
-    def run_and_update_status(self):
-        self.partial_func()
-        self.called = True
+    def __repr__(self):
+        return f"TimerHandle {self.name} at {self.when}"
 
-    def cancel(self):
-        self.timer_handle.cancel()
+
+class TimerService(object):
+    """
+    Calls functions after a delay.
+
+    Pending timers are kept in a heap ordered by when they fire, and a single
+    event loop callback is armed for the earliest one, so scheduling is
+    O(log n) however many timers are pending.  Cancelled timers are dropped
+    when they reach the top of the heap, or all at once when they make up
+    most of it.
+
+    Functions may be coroutine functions; the coroutine is passed to spawn
+    to be run as a task.  Timers scheduled before start() is called are
+    armed when it is.  At most fire_batch timers run per pass of the event
+    loop, so a backlog of overdue timers is worked through in batches.
+    """
+
+    fire_batch = 1000
+
+    def __init__(self, spawn=None):
+        self.log = logging.getLogger(type(self).__name__)
+        self.spawn = spawn or asyncio.ensure_future
+        self.fired = 0
+        self.failed = 0
+        self._heap = []  # (when, sequence, handle)
+        self._sequence = itertools.count()
+        self._names = {}  # name -> set of pending handles
+        self._cancelled_count = 0
+        self._loop = None
+        self._wakeup = None
+        self._wakeup_at = None
+
+    def __len__(self):
+        return len(self._heap) - self._cancelled_count
+
+    @property
+    def is_started(self):
+        return self._loop is not None
+
+    def start(self):
+        self._loop = asyncio.get_event_loop()
+        self._arm()
+
+    def stop(self):
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+        self._loop = self._wakeup = self._wakeup_at = None
+
+    def call_later(self, delay, func, *args, **kwargs):
+        """Calls func(*args, **kwargs) in delay seconds, returns a TimerHandle"""
+        return self.call_at(time.monotonic() + delay, func, *args, **kwargs)
+
+    def call_at(self, when, func, *args, **kwargs):
+        """Calls func(*args, **kwargs) at when, a time.monotonic() value"""
+        handle = TimerHandle(when, func, args, kwargs, self)
+        heapq.heappush(self._heap, (when, next(self._sequence), handle))
+        self._index(handle)
+        if self._wakeup_at is None or when < self._wakeup_at:
+            self._arm()
+        return handle
+
+    def _call_at_many(self, timers):
+        """Schedules (when, func, args, kwargs) tuples in one go, returns the handles"""
+        entries = self._entries(timers)
+        self._push_many(entries)
+        return [handle for _, _, handle in entries]
+
+    def _entries(self, timers):
+        """
+        Makes heap entries for (when, func, args, kwargs) tuples.  The timers
+        can be cancelled by name straight away, but aren't pending until the
+        entries are passed to _push_many.
+        """
+        entries = []
+        for when, func, args, kwargs in timers:
+            handle = TimerHandle(when, func, args, kwargs, self)
+            self._index(handle)
+            entries.append((when, next(self._sequence), handle))
+        return entries
+
+    def _push_many(self, entries):
+        """
+        Schedules heap entries made by _entries, heapifying once when there
+        are more of them than are already pending
+        """
+        heap = self._heap
+        if len(entries) > len(heap):
+            heap.extend(entries)
+            heapq.heapify(heap)
+        else:
+            for entry in entries:
+                heapq.heappush(heap, entry)
+        self._arm()
+
+    def _index(self, handle):
+        handles = self._names.get(handle.name)
+        if handles is None:
+            handles = self._names[handle.name] = set()
+        handles.add(handle)
+
+    def cancel(self, name):
+        """Cancels the pending timers for functions called name, returns how many"""
+        handles = list(self._names.get(name, ()))
+        for handle in handles:
+            handle.cancel()
+        return len(handles)
+
+    def _cancelled(self, handle):
+        self._forget(handle)
+        self._cancelled_count += 1
+        if self._cancelled_count > 64 and self._cancelled_count > len(self._heap) // 2:
+            self._heap = [entry for entry in self._heap if not entry[2].cancelled]
+            heapq.heapify(self._heap)
+            self._cancelled_count = 0
+
+    def _forget(self, handle):
+        handles = self._names.get(handle.name)
+        if handles is not None:
+            handles.discard(handle)
+            if not handles:
+                del self._names[handle.name]
+
+    def _arm(self):
+        """Sets the event loop callback for the earliest pending timer"""
+        if self._loop is None:
+            return
+        while self._heap and self._heap[0][2].cancelled:
+            heapq.heappop(self._heap)
+            self._cancelled_count -= 1
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+            self._wakeup = self._wakeup_at = None
+        if self._heap:
+            self._wakeup_at = self._heap[0][0]
+            self._wakeup = self._loop.call_later(
+                max(0, self._wakeup_at - time.monotonic()), self._fire
+            )
+
+    def _fire(self):
+        self._wakeup = self._wakeup_at = None
+        now = time.monotonic()
+        fired = 0
+        while self._heap and self._heap[0][0] <= now and fired < self.fire_batch:
+            handle = heapq.heappop(self._heap)[2]
+            if handle.cancelled:
+                self._cancelled_count -= 1
+                continue
+            fired += 1
+            handle.done = True
+            self._forget(handle)
+            if handle._on_done is not None:
+                handle._on_done(handle)
+            self._run(handle)
+        self._arm()
+
+    def _run(self, handle):
+        # set while the function runs, and copied into any task it starts
+        token = current_timer.set(handle)
+        try:
+            result = handle.func(*handle.args, **handle.kwargs)
+            if inspect.isawaitable(result):
+                self.spawn(result)
+            self.fired += 1
+        except Exception:  # noqa
+            self.failed += 1
+            self.log.exception(f"Timer {handle.name} raised an exception")
+        finally:
+            current_timer.reset(token)
+
+    @property
+    def metrics(self):
+        return {"pending": len(self), "fired": self.fired, "failed": self.failed}
+
+
+DURABLE_TIMERS_NAME = "timers.json.z"
+DURABLE_TIMERS_VERSION = 2
+
+
+class DurableTimers(object):
+    """
+    Timers that are saved through the state handler so they survive restarts.
+
+    Each timer calls a plugin method, which is recorded by plugin class and
+    method name along with its arguments, so they must be JSON serializable.
+    Pending timers are saved save_delay seconds after they change and when
+    the bot shuts down, as a single compressed blob with a line of JSON per
+    timer.
+
+    start() loads the blob (decoding it in a worker thread) and schedules all
+    of its timers in one go.  Timers that were due while the bot was stopped
+    fire straight away, a batch at a time, with the late flag set on their
+    handle; the function can check it through current_timer.
+    """
+
+    save_delay = 5
+    restore_chunk = 2000
+
+    def __init__(self, timers, load=None, save=None, resolve=None):
+        self.log = logging.getLogger(type(self).__name__)
+        self.timers = timers
+        self.load = load
+        self.save = save
+        self.resolve = resolve
+        self.is_started = False
+        # handle -> [plugin name, method name, due timestamp, args, kwargs]
+        self._records = {}
+        self._dirty = False
+        self._save_timer = None
+        self._lock = None
+
+    def __len__(self):
+        return len(self._records)
+
+    def add(self, delay, plugin_name, func, args, kwargs):
+        """Calls the plugin method func in delay seconds, returns a TimerHandle"""
+        # fail now rather than when the timers are saved
+        json.dumps([args, kwargs])
+        record = [plugin_name, func.__name__, time.time() + delay, list(args), kwargs]
+        handle = self.timers.call_later(delay, func, *args, **kwargs)
+        self._track(handle, record)
+        self._changed()
+        return handle
+
+    def _track(self, handle, record):
+        handle._on_done = self._done
+        self._records[handle] = record
+
+    def _done(self, handle):
+        if self._records.pop(handle, None) is not None:
+            self._changed()
+
+    def _changed(self):
+        self._dirty = True
+        if self.is_started and self._save_timer is None:
+            self._save_timer = self.timers.call_later(self.save_delay, self._save)
+
+    def _save(self):
+        self._save_timer = None
+        return self.flush()
+
+    async def start(self):
+        if self.is_started:
+            return
+        # Restoring allocates a lot of objects that live as long as their
+        # timers, and each time the cyclic garbage collector ran it would scan
+        # all of them again, blocking the event loop.  It's paused while they
+        # are created, and a large restore is then frozen out of its reach.
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            records = []
+            if self.load is not None:
+                loop = asyncio.get_event_loop()
+                records = await loop.run_in_executor(None, self._read)
+            funcs = {}
+            entries = []
+            for i in range(0, len(records), self.restore_chunk):
+                self._restore(records[i : i + self.restore_chunk], funcs, entries)
+                # let the bot get on with starting up between chunks
+                await asyncio.sleep(0)
+            # timers from every chunk go into the heap together, so that it's
+            # heapified once rather than each chunk being pushed onto the last
+            self.timers._push_many(entries)
+            if gc_enabled and len(entries) > self.restore_chunk:
+                gc.freeze()
+        finally:
+            if gc_enabled:
+                gc.enable()
+        self.log.info(f"Restored {len(entries)} of {len(records)} saved timers")
+        self.is_started = True
+        if self._dirty or len(entries) < len(records):
+            self._changed()
+
+    def _restore(self, records, funcs, entries):
+        """Makes heap entries for the timers in records, appending them to entries"""
+        now, monotonic_now = time.time(), time.monotonic()
+        restored = []
+        timers = []
+        for record in records:
+            plugin_name, method, due, args, kwargs = record
+            key = (plugin_name, method)
+            if key not in funcs:
+                funcs[key] = self.resolve(plugin_name, method) if self.resolve else None
+                if funcs[key] is None:
+                    self.log.warning(
+                        f"Dropping timers for unknown {plugin_name}.{method}"
+                    )
+            if funcs[key] is not None:
+                restored.append(record)
+                timers.append((monotonic_now + due - now, funcs[key], args, kwargs))
+        chunk = self.timers._entries(timers)
+        for (_, _, handle), record in zip(chunk, restored):
+            handle.late = record[2] < now
+            self._track(handle, record)
+        entries.extend(chunk)
+
+    def _read(self):
+        data = self.load()
+        if not data:
+            return []
+        try:
+            header, _, body = zlib.decompress(data).decode("utf-8").partition("\n")
+            saved = json.loads(header)
+            if saved.get("version") == 1:
+                return saved["timers"]
+            if saved.get("version") != DURABLE_TIMERS_VERSION:
+                self.log.warning("Ignoring saved timers from an incompatible version")
+                return []
+            # decoded a timer at a time, so this thread doesn't hold the GIL,
+            # and block the event loop, for the whole of a large blob
+            return [json.loads(line) for line in body.splitlines()]
+        except (zlib.error, ValueError):
+            self.log.exception("Unable to load saved timers")
+            return []
+
+    async def flush(self):
+        """Saves the pending timers if they have changed since they were last saved"""
+        if not self.is_started or self.save is None:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            records = list(self._records.values())
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, self._write, records)
+
+    def _write(self, records):
+        # a header line then a timer per line, see _read
+        lines = [json.dumps({"version": DURABLE_TIMERS_VERSION})]
+        lines.extend(json.dumps(record) for record in records)
+        self.save(zlib.compress("\n".join(lines).encode("utf-8")))
+
+    def stop(self):
+        self.is_started = False
+        if self._save_timer is not None:
+            self._save_timer.cancel()
+            self._save_timer = None
+
+
+FIXED_RATE = "fixed_rate"
+FIXED_DELAY = "fixed_delay"
 
 
 class AsyncTimer(object):
-    def __init__(self, period, func, *args, **kwargs):
+    """
+    Calls a function every period seconds.
+
+    In fixed_rate mode runs start period seconds apart however long each one
+    takes, and a run that is due while the previous one is still going is
+    skipped.  In fixed_delay mode each run starts period seconds after the
+    previous one finished.  Every wait is lengthened by a random amount of up
+    to jitter seconds, and the first run is delay seconds after start().
+    """
+
+    def __init__(
+        self, period, func, *args, mode=FIXED_RATE, jitter=0, delay=0, **kwargs
+    ):
+        if mode not in (FIXED_RATE, FIXED_DELAY):
+            raise ValueError(f"Unknown periodic task mode {mode}")
         self.log = logging.getLogger(type(self).__name__)
         self.log.debug(f"Scheduling {func.__name__} to run every {period} seconds.")
+        self.name = func.__name__
         self.func = func
         self.period = period
         self.func_args = args
         self.func_kwargs = kwargs
+        self.mode = mode
+        self.jitter = jitter
+        self.delay = delay
         self.is_started = False
+        self.runs = 0
+        self.skipped = 0
+        self.failed = 0
+        self.last_duration = None
+        self.max_duration = 0.0
+        self.total_duration = 0.0
         self._task = None
+        self._running = None
 
     async def start(self):
         if not self.is_started:
@@ -58,36 +450,496 @@ class AsyncTimer(object):
     async def stop(self):
         if self.is_started:
             self.is_started = False
-            self._task.cancel()
-            with suppress(asyncio.CancelledError):
-                await self._task
+            for task in (self._task, self._running):
+                if task is not None:
+                    task.cancel()
+                    with suppress(asyncio.CancelledError):
+                        await task
 
     async def _run(self):
+        next_run = time.monotonic() + self.delay
+        while True:
+            wait = next_run - time.monotonic()
+            if self.jitter:
+                wait += random.uniform(0, self.jitter)
+            await asyncio.sleep(max(0, wait))
+            if self.mode == FIXED_DELAY:
+                await self._call()
+                next_run = time.monotonic() + self.period
+                continue
+            if self._running is not None and not self._running.done():
+                self.skipped += 1
+                self.log.warning(f"{self.name} is still running, skipping a run")
+            else:
+                self._running = asyncio.create_task(self._call())
+            next_run += self.period
+            behind = time.monotonic() - next_run
+            if behind > 0:
+                # don't make up for runs missed while the loop was busy
+                missed = math.ceil(behind / self.period)
+                self.skipped += missed
+                next_run += missed * self.period
+
+    async def _call(self):
+        started = time.monotonic()
+        try:
+            result = self.func(*self.func_args, **self.func_kwargs)
+            if inspect.isawaitable(result):
+                await result
+        except Exception:  # noqa
+            self.failed += 1
+            self.log.exception(f"Periodic task {self.name} raised an exception")
+        duration = time.monotonic() - started
+        self.runs += 1
+        self.last_duration = duration
+        self.total_duration += duration
+        self.max_duration = max(self.max_duration, duration)
+
+    @property
+    def metrics(self):
+        return {
+            "name": self.name,
+            "period": self.period,
+            "mode": self.mode,
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "last_duration": self.last_duration,
+            "avg_duration": self.total_duration / self.runs if self.runs else 0.0,
+            "max_duration": self.max_duration,
+        }
+
+
+CRON_STATE_NAME = "cron_schedule.json"
+CRON_MACROS = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+CRON_MONTHS = "jan feb mar apr may jun jul aug sep oct nov dec".split()
+CRON_WEEKDAYS = "sun mon tue wed thu fri sat".split()
+# the most days each month can have
+CRON_MONTH_DAYS = [31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+
+
+class CronSchedule(object):
+    """
+    A cron expression: minute, hour, day of month, month and day of week.
+
+    Fields may be *, numbers, ranges (1-5), lists (1,15) and steps (*/15,
+    9-17/2).  Months and days of the week may be given by name (jan, mon-fri)
+    and Sunday is 0 or 7.  As in cron, when both the day of month and day of
+    week are restricted a day matching either one matches.  The @hourly,
+    @daily, @weekly, @monthly and @yearly shortcuts are also accepted.
+    """
+
+    def __init__(self, expression):
+        self.expression = expression
+        fields = CRON_MACROS.get(expression.strip().lower(), expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression}")
+        self.minutes = self._parse(fields[0], 0, 59)
+        self.hours = self._parse(fields[1], 0, 23)
+        self.days = self._parse(fields[2], 1, 31)
+        self.months = self._parse(fields[3], 1, 12, CRON_MONTHS, 1)
+        weekdays = self._parse(fields[4], 0, 7, CRON_WEEKDAYS)
+        self.weekdays = sorted({day % 7 for day in weekdays})
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+        if self._any_weekday and not any(
+            day <= CRON_MONTH_DAYS[month - 1]
+            for month in self.months
+            for day in self.days
+        ):
+            raise ValueError(f"Cron expression never matches: {expression}")
+
+    def _parse(self, field, low, high, names=None, first=0):
+        values = set()
+        for part in field.lower().split(","):
+            part, _, step = part.partition("/")
+            if part == "*":
+                start, end = low, high
+            else:
+                start, _, end = part.partition("-")
+                start = self._value(start, names, first)
+                end = (
+                    self._value(end, names, first) if end else (high if step else start)
+                )
+            step = int(step) if step else 1
+            if not low <= start <= end <= high or step < 1:
+                raise ValueError(f"Invalid cron field {field}: {self.expression}")
+            values.update(range(start, end + 1, step))
+        return sorted(values)
+
+    def _value(self, value, names, first):
+        if names and value in names:
+            return names.index(value) + first
+        try:
+            return int(value)
+        except ValueError:
+            raise ValueError(f"Invalid cron value {value}: {self.expression}")
+
+    def _day_matches(self, day):
+        in_days = day.day in self.days
+        # datetime weekdays start on monday, cron's start on sunday
+        in_weekdays = (day.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return in_days and in_weekdays
+        return in_days or in_weekdays
+
+    def next_after(self, after):
+        """
+        Returns the first datetime after the naive datetime after that matches,
+        skipping ahead a month, day, hour or minute at a time as needed.
+        """
+        t = after.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        while True:
+            # every possible date comes round within 8 years, even Feb 29th
+            # across a century that isn't a leap year
+            if t.year > after.year + 8:
+                raise ValueError(f"Cron expression never matches: {self.expression}")
+            if t.month not in self.months:
+                i = bisect.bisect(self.months, t.month)
+                year = t.year if i < len(self.months) else t.year + 1
+                month = self.months[i % len(self.months)]
+                t = datetime.datetime(year, month, 1)
+            elif not self._day_matches(t):
+                t = datetime.datetime(t.year, t.month, t.day) + datetime.timedelta(
+                    days=1
+                )
+            elif t.hour not in self.hours:
+                i = bisect.bisect(self.hours, t.hour)
+                if i == len(self.hours):
+                    t = datetime.datetime(t.year, t.month, t.day) + datetime.timedelta(
+                        days=1
+                    )
+                else:
+                    t = t.replace(hour=self.hours[i], minute=0)
+            elif t.minute not in self.minutes:
+                i = bisect.bisect(self.minutes, t.minute)
+                if i == len(self.minutes):
+                    t = t.replace(minute=0) + datetime.timedelta(hours=1)
+                else:
+                    t = t.replace(minute=self.minutes[i])
+            else:
+                return t
+
+    def __repr__(self):
+        return f"CronSchedule {self.expression}"
+
+
+class CronJob(object):
+    def __init__(self, name, schedule, func, args, kwargs, tz=None, catch_up=True):
+        self.name = name
+        self.schedule = schedule
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.tz = tz
+        self.catch_up = catch_up
+        self.next_run = None  # timestamp
+        self.runs = 0
+        self._timer = None
+
+    def next_after(self, timestamp):
+        """Returns the timestamp of the first run after timestamp"""
+        local = datetime.datetime.fromtimestamp(timestamp, self.tz)
+        next_run = self.schedule.next_after(local.replace(tzinfo=None))
+        if self.tz is not None:
+            next_run = next_run.replace(tzinfo=self.tz)
+        return next_run.timestamp()
+
+
+class CronScheduler(object):
+    """
+    Runs functions on cron schedules.
+
+    Each job's next run time is worked out from its cron expression and set
+    as a timer, so nothing polls.  When a job runs the time is recorded in a
+    dict that is passed to save; load returns that dict when the scheduler
+    starts, so that a job that should have run while the bot was down can
+    be run straight away, once, if it was added with catch_up set.
+    """
+
+    # timers are re-armed at least this often in case the clock is changed
+    # or the host is suspended
+    max_sleep = 3600
+
+    def __init__(self, timers, load=None, save=None):
+        self.log = logging.getLogger(type(self).__name__)
+        self.timers = timers
+        self.load = load
+        self.save = save
+        self.jobs = {}
+        self.is_started = False
+        self._last_runs = {}  # job name -> timestamp it was last run or added
+
+    def add(self, expression, func, *args, name=None, tz=None, catch_up=True, **kwargs):
+        """
+        Runs func(*args, **kwargs) on the cron schedule expression, in the
+        timezone tz (a tzinfo, a UTC offset in seconds such as a slack user's
+        tz_offset, or an IANA timezone name on python 3.9+) or local time.
+        name identifies the job's saved state and defaults to the function's
+        name; adding a job with the same name replaces it.  Raises ValueError
+        if expression is invalid or never matches.
+        """
+        name = name or func.__name__
+        job = CronJob(
+            name, CronSchedule(expression), func, args, kwargs, _timezone(tz), catch_up
+        )
+        job.next_after(time.time())
+        self.remove(name)
+        self.jobs[name] = job
+        if self.is_started:
+            self._schedule(job, time.time())
+            self._save()
+        return job
+
+    def remove(self, name):
+        job = self.jobs.pop(name, None)
+        if job is not None and job._timer is not None:
+            job._timer.cancel()
+        return job is not None
+
+    def start(self):
+        if self.is_started:
+            return
+        self.is_started = True
+        if self.load is not None:
+            self._last_runs.update(self.load() or {})
+        now = time.time()
+        for job in self.jobs.values():
+            self._schedule(job, now)
+        self._save()
+
+    def stop(self):
+        self.is_started = False
+        for job in self.jobs.values():
+            if job._timer is not None:
+                job._timer.cancel()
+                job._timer = None
+
+    def _schedule(self, job, now):
+        last_run = self._last_runs.get(job.name)
+        if last_run is None:
+            self._last_runs[job.name] = now
+        elif job.catch_up and job.next_after(last_run) <= now:
+            self.log.info(f"Running {job.name}, which was missed while stopped")
+            self._run(job, now)
+        job.next_run = job.next_after(now)
+        self._arm(job)
+
+    def _arm(self, job):
+        delay = min(max(0, job.next_run - time.time()), self.max_sleep)
+        job._timer = self.timers.call_later(delay, self._fire, job)
+
+    def _fire(self, job):
+        job._timer = None
+        if self.jobs.get(job.name) is not job:
+            return
+        now = time.time()
+        if now < job.next_run:
+            # woke up early to check the clock
+            self._arm(job)
+            return
+        self._run(job, now)
+        job.next_run = job.next_after(now)
+        self._arm(job)
+        self._save()
+
+    def _run(self, job, now):
+        job.runs += 1
+        self._last_runs[job.name] = now
+        try:
+            result = job.func(*job.args, **job.kwargs)
+            if inspect.isawaitable(result):
+                self.timers.spawn(result)
+        except Exception:  # noqa
+            self.log.exception(f"Cron job {job.name} raised an exception")
+
+    def _save(self):
+        if self.save is not None:
+            # forget jobs that are no longer scheduled
+            self.save({name: self._last_runs[name] for name in self.jobs})
+
+    @property
+    def metrics(self):
+        return {
+            name: {"next_run": job.next_run, "runs": job.runs}
+            for name, job in self.jobs.items()
+        }
+
+
+def _timezone(tz):
+    if tz is None or isinstance(tz, datetime.tzinfo):
+        return tz
+    if isinstance(tz, (int, float)):
+        return datetime.timezone(datetime.timedelta(seconds=tz))
+    from zoneinfo import ZoneInfo
+
+    return ZoneInfo(tz)
+
+
+class DispatchScheduler(object):
+    """
+    Runs coroutines on a bounded pool of workers.
+
+    Work submitted with the same key runs one at a time in the order it was
+    submitted, while work for different keys runs concurrently.  At most
+    max_queue items may be waiting or running; submit() waits for a free slot
+    once the limit is reached.
+    """
+
+    def __init__(self, workers=8, max_queue=1000):
+        self.log = logging.getLogger(type(self).__name__)
+        self.workers = workers
+        self.max_queue = max_queue
+        self.queued = 0
+        self.completed = 0
+        self._queues = {}  # key -> deque of pending work, present while key is busy
+        self._ready = None  # keys with pending work and no worker running them
+        self._slots = None
+        self._worker_tasks = []
+
+    @property
+    def is_started(self):
+        return len(self._worker_tasks) > 0
+
+    def start(self):
+        if self.is_started:
+            return
+        self.log.debug(f"Starting {self.workers} dispatch workers")
+        self._ready = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_queue)
+        self._worker_tasks = [
+            asyncio.create_task(self._worker()) for _ in range(self.workers)
+        ]
+
+    async def stop(self):
+        if not self.is_started:
+            return
+        if self.queued:
+            self.log.warning(f"Discarding {self.queued} queued dispatch items")
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        self._queues = {}
+        self.queued = 0
+
+    async def submit(self, key, func, *args, **kwargs):
+        """Queues func(*args, **kwargs) to run after earlier work for key"""
+        await self._slots.acquire()
+        self.queued += 1
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = deque()
+            self._ready.put_nowait(key)
+        queue.append((func, args, kwargs))
+
+    async def _worker(self):
         while True:
-            await self.func(*self.func_args, **self.func_kwargs)
-            await asyncio.sleep(self.period)
+            key = await self._ready.get()
+            queue = self._queues[key]
+            func, args, kwargs = queue.popleft()
+            try:
+                await func(*args, **kwargs)
+            except Exception:  # noqa
+                self.log.exception(f"Unhandled exception dispatching {key}")
+            finally:
+                self.queued -= 1
+                self.completed += 1
+                self._slots.release()
+                # go to the back of the line so one busy channel can't starve others
+                if queue:
+                    self._ready.put_nowait(key)
+                else:
+                    del self._queues[key]
+
+    @property
+    def metrics(self):
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "queued": self.queued,
+            "active_keys": len(self._queues),
+            "completed": self.completed,
+        }
 
 
 class AsyncTaskManager(object):
-    runnable = True
-    tasks = []
-    periodic_tasks = []
-    delayed_tasks = []
-    awaited_tasks = []
-    shutting_down = False
-    rtm_client = None
-    rtm_client_task = None
+    """
+    Supervises the bot's background work: the RTM client, periodic tasks,
+    timers and tasks started with run_async.
+
+    Finished tasks are reaped by done callbacks rather than by polling.  The
+    RTM client is restarted as soon as it exits, unless it exited within
+    rtm_stable_after seconds of starting: then restarts back off from
+    rtm_restart_delay seconds, doubling up to rtm_max_restart_delay.
+    """
+
+    rtm_restart_delay = 1
+    rtm_max_restart_delay = 300
+    rtm_stable_after = 60
 
     def __init__(self, bot):
         self._bot = bot
         self.log = logging.getLogger(type(self).__name__)
         self.event_loop = asyncio.get_event_loop()
+        self.tasks = set()
+        self.periodic_tasks = []
+        self._phases = Counter()
+        self._cron_state = None  # encoded cron state waiting to be written
+        self._cron_save = None
+        self.timers = TimerService(spawn=self._spawn)
+        self.cron = CronScheduler(
+            self.timers, load=self._load_cron_state, save=self._save_cron_state
+        )
+        self.durable_timers = DurableTimers(
+            self.timers,
+            load=partial(self._bot.plugin_manager.load_blob, DURABLE_TIMERS_NAME),
+            save=partial(self._bot.plugin_manager.save_blob, DURABLE_TIMERS_NAME),
+            resolve=self._resolve_plugin_method,
+        )
+        self.shutting_down = False
+        self.rtm_client = None
+        self.rtm_client_task = None
+        self.rtm_restarts = 0
+        self._rtm_started_at = None
+        self._rtm_backoff = 0
+        self._rtm_restart = None
+        self.completed = 0
+        self.failed = 0
+        self._runnable = True
+        self._stopped = None
+
+    @property
+    def runnable(self):
+        return self._runnable
+
+    @runnable.setter
+    def runnable(self, runnable):
+        self._runnable = runnable
+        if not runnable and self._stopped is not None:
+            self._stopped.set()
+
+    @property
+    def is_started(self):
+        return self._stopped is not None
 
     def start_rtm_client(self, rtm_client=None):
+        self._rtm_restart = None
         if self.runnable:
             if rtm_client:
                 self.rtm_client = rtm_client
+            self.event_loop = asyncio.get_event_loop()
+            self._rtm_started_at = self.event_loop.time()
             self.rtm_client_task = self.rtm_client.start()
+            self.rtm_client_task.add_done_callback(self._rtm_client_done)
             self.add_signal_handlers()
 
     def add_signal_handlers(self):
@@ -95,89 +947,75 @@ class AsyncTaskManager(object):
         # these need to be added every time RTMClient starts/restarts, as
         # slack_sdk adds its own signal handler which overrides these
         for sig in signals:
-            if (
-                self.event_loop._signal_handlers[sig]._callback
-                != self.graceful_shutdown
-            ):
+            handler = self.event_loop._signal_handlers.get(sig)
+            if handler is None or handler._callback != self.graceful_shutdown:
                 self.log.debug(f"Adding signal handler for {sig}")
                 self.event_loop.add_signal_handler(sig, self.graceful_shutdown)
 
-    async def check_rtm_client(self):
-        self.log.debug("Enter check_rtm_client")
-        if self.rtm_client_task.done():
-            try:
-                result = self.rtm_client_task.result()
-                self.log.info(f"RTM client task ended with result {result}")
-            except asyncio.CancelledError:
-                self.log.info("RTM client task was cancelled.")
-            except asyncio.TimeoutError:
-                self.log.info("RTM client task timed out.")
-            except Exception as e:
-                self.log.exception(f"Caught unexpected exception: {e}")
-            finally:
-                if self.runnable:
-                    self.log.info("Restarting RTM client")
-                    self.start_rtm_client()
-                else:
-                    self.log.info("Stopping RTM client")
-                    self.rtm_client.stop()
-                    try:
-                        self.rtm_client_task.cancel()
-                        await self.rtm_client_task
-                    except asyncio.CancelledError:
-                        self.log.info("RTM client task cancelled")
+    def _rtm_client_done(self, task):
+        if task is not self.rtm_client_task:
+            return
+        try:
+            result = task.result()
+            self.log.info(f"RTM client task ended with result {result}")
+        except asyncio.CancelledError:
+            self.log.info("RTM client task was cancelled.")
+        except asyncio.TimeoutError:
+            self.log.info("RTM client task timed out.")
+        except Exception as e:  # noqa
+            self.log.exception(f"Caught unexpected exception: {e}")
+        if self.runnable:
+            uptime = self.event_loop.time() - self._rtm_started_at
+            if uptime >= self.rtm_stable_after:
+                self._rtm_backoff = 0
+            delay = self._rtm_backoff
+            self._rtm_backoff = min(
+                max(delay * 2, self.rtm_restart_delay), self.rtm_max_restart_delay
+            )
+            self.rtm_restarts += 1
+            self.log.info(f"Restarting RTM client in {delay}s")
+            self._rtm_restart = self.event_loop.call_later(delay, self.start_rtm_client)
 
     def schedule_task(self, task):
-        self.tasks.append(task)
+        self.tasks.add(task)
+        task.add_done_callback(self._task_done)
 
-    async def await_tasks(self):
-        self.add_signal_handlers()
-        if self.runnable:
-            await asyncio.sleep(1)
-            await self.check_rtm_client()
-            pending_tasks = [
-                task for task in self.tasks if task not in self.awaited_tasks
-            ]
-            self.log.debug(f"tick: Gathering {len(pending_tasks)} tasks...")
-            try:
-                await asyncio.gather(*pending_tasks)
-                for task in pending_tasks:
-                    try:
-                        if task.done():
-                            try:
-                                self.log.debug(
-                                    f"task {task} ended with result {task.result()}"
-                                )
-                            except asyncio.CancelledError:
-                                self.log.debug(f"task {task} was cancelled")
-                            finally:
-                                self.log.debug(f"removing task: {task}")
-                                self.tasks.remove(task)
-                                self.awaited_tasks.remove(task)
-                    except Exception:  # noqa
-                        self.log.exception(
-                            f"Unexpected exception caught awaiting {task}!"
-                        )
-                    finally:
-                        self.awaited_tasks.append(task)
-            except Exception:  # noqa
-                self.log.exception(
-                    "Unexpected exception caught during asyncio.gather()"
-                )
+    def _spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self.schedule_task(task)
+        return task
+
+    def _task_done(self, task):
+        self.tasks.discard(task)
+        if task.cancelled():
+            self.log.debug(f"task {task} was cancelled")
+        elif task.exception() is not None:
+            self.failed += 1
+            self.log.error(
+                f"Unexpected exception caught awaiting {task}!",
+                exc_info=task.exception(),
+            )
+        else:
+            self.completed += 1
+            self.log.debug(f"task {task} ended with result {task.result()}")
 
     async def start(self):
-        self.log.debug("Starting task waiter")
-        while self.runnable:
-            try:
-                await self.await_tasks()
-                for periodic in self.periodic_tasks:
-                    if not periodic.is_started:
-                        await periodic.start()
-                for delayed in self.delayed_tasks:
-                    if delayed.called:
-                        self.delayed_tasks.remove(delayed)
-            except Exception as e:
-                self.log.exception("Unexpected exception caught in task loop!")
+        """Starts the periodic tasks, then waits until the bot shuts down"""
+        self.log.debug("Starting task manager")
+        self.event_loop = asyncio.get_event_loop()
+        self._stopped = asyncio.Event()
+        if not self.runnable:
+            self._stopped.set()
+        self.timers.start()
+        self.cron.start()
+        try:
+            await self.durable_timers.start()
+        except Exception:  # noqa
+            self.log.exception("Unable to restore saved timers")
+        for periodic in self.periodic_tasks:
+            if not periodic.is_started:
+                await periodic.start()
+        await self._stopped.wait()
         await self.shutdown()
 
     def create_and_schedule_task(self, func, *args, **kwargs):
@@ -201,33 +1039,136 @@ class AsyncTaskManager(object):
             self._bot.runnable = False
 
     async def shutdown(self):
-        self.rtm_client.stop()
-        for task in self.tasks:
+        self.runnable = False
+        if self._rtm_restart is not None:
+            self._rtm_restart.cancel()
+            self._rtm_restart = None
+        if self.rtm_client is not None:
+            self.rtm_client.stop()
+        if self.rtm_client_task is not None and not self.rtm_client_task.done():
+            self.rtm_client_task.cancel()
+        for task in list(self.tasks):
             task.cancel()
         for periodic in self.periodic_tasks:
             await periodic.stop()
-        for timer in self.delayed_tasks:
-            timer.cancel()
+        self.cron.stop()
+        await self._flush_cron_state()
+        try:
+            await self.durable_timers.flush()
+        except Exception:  # noqa
+            self.log.exception("Unable to save timers")
+        self.durable_timers.stop()
+        self.timers.stop()
+
+    @property
+    def metrics(self):
+        return {
+            "running": len(self.tasks),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rtm_restarts": self.rtm_restarts,
+            "timers": self.timers.metrics,
+            "cron_jobs": self.cron.metrics,
+            "persistent_timers": len(self.durable_timers),
+            "periodic_tasks": [periodic.metrics for periodic in self.periodic_tasks],
+        }
 
-    def start_periodic_task(self, period, func, *args, **kwargs):
-        task = AsyncTimer(period, func, *args, **kwargs)
+    def start_periodic_task(
+        self,
+        period,
+        func,
+        *args,
+        mode=FIXED_RATE,
+        jitter=0,
+        spread=False,
+        **kwargs,
+    ):
+        """
+        Calls func every period seconds, see AsyncTimer for mode and jitter.
+        The first run is straight away, unless spread is set: then tasks with
+        the same period have their first runs spread out over the period, so
+        they don't all run at once.
+        """
+        delay = 0
+        if spread:
+            # successive multiples of the golden ratio spread out evenly
+            index = self._phases[period]
+            self._phases[period] += 1
+            delay = period * ((index * 0.6180339887498949) % 1)
+        task = AsyncTimer(
+            period, func, *args, mode=mode, jitter=jitter, delay=delay, **kwargs
+        )
         self.periodic_tasks.append(task)
+        if self.is_started:
+            self.create_and_schedule_task(task.start)
+        return task
 
-    def start_timer(self, delay, func, *args, **kwargs):
-        if inspect.iscoroutinefunction(func):
-            raise RuntimeError("Timer can only be run on non-async functions.")
-        task = CallLater(func, delay, self.event_loop, *args, **kwargs)
-        if task.name not in self.delayed_tasks:
-            self.delayed_tasks.append(task)
-            task.schedule()
-        else:
-            self.log.debug(
-                f"start_timer called for {task.name} but it was already scheduled."
+    def start_timer(self, delay, func, *args, persist=False, **kwargs):
+        """
+        Calls func in delay seconds, returns a TimerHandle to cancel it with.
+        With persist set, func must be a plugin method, and the timer is saved
+        so that it still fires if the bot is restarted.
+        """
+        if persist:
+            plugin = getattr(func, "__self__", None)
+            if plugin is None:
+                raise ValueError("Persistent timers must call a plugin method")
+            return self.durable_timers.add(
+                delay, type(plugin).__name__, func, args, kwargs
             )
+        return self.timers.call_later(delay, func, *args, **kwargs)
+
+    def _resolve_plugin_method(self, plugin_name, method):
+        for plugin in self._bot.plugin_manager.plugins:
+            if type(plugin).__name__ == plugin_name:
+                return getattr(plugin, method, None)
+        return None
 
     def stop_timer(self, func_name):
+        """Cancels the pending timers for functions called func_name"""
+        if not self.timers.cancel(func_name):
+            self.log.warning(f"stop_timer called with unknown func {func_name}")
+
+    def start_cron_task(self, expression, func, *args, **kwargs):
+        """Runs func on a cron schedule, see CronScheduler.add"""
+        return self.cron.add(expression, func, *args, **kwargs)
+
+    def stop_cron_task(self, name):
+        if not self.cron.remove(name):
+            self.log.warning(f"stop_cron_task called with unknown job {name}")
+
+    def _load_cron_state(self):
+        data = self._bot.plugin_manager.load_blob(CRON_STATE_NAME)
+        if not data:
+            return {}
         try:
-            timer = self.delayed_tasks.pop(func_name)
-            timer.cancel()
-        except KeyError:
-            self.log.exception(f"stop_timer called with unknown func {func_name}")
+            return json.loads(data)
+        except ValueError:
+            self.log.exception("Unable to load cron schedule")
+            return {}
+
+    def _save_cron_state(self, state):
+        # written in a worker thread, like the cache snapshot, one write at a
+        # time so that the latest state is the one left saved
+        self._cron_state = json.dumps(state).encode("utf-8")
+        self._write_cron_state()
+
+    def _write_cron_state(self):
+        if self._cron_save is not None or self._cron_state is None:
+            return
+        data, self._cron_state = self._cron_state, None
+        self._cron_save = self.event_loop.run_in_executor(
+            None, self._bot.plugin_manager.save_blob, CRON_STATE_NAME, data
+        )
+        self._cron_save.add_done_callback(self._cron_state_saved)
+
+    def _cron_state_saved(self, future):
+        self._cron_save = None
+        self._write_cron_state()
+
+    async def _flush_cron_state(self):
+        while self._cron_save is not None:
+            await asyncio.shield(self._cron_save)
+            # awaiting a finished write doesn't yield, so give its done
+            # callback a chance to clear it (or start the next write)
+            await asyncio.sleep(0)
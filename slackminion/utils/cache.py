@@ -0,0 +1,168 @@
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+
+class LRUCache(MutableMapping):
+    """
+    A dict that holds at most max_size items, evicting the least recently used
+    item once it is full.  Items stored more than ttl seconds ago are treated as
+    missing and dropped when next looked up.  Either limit may be None.
+
+    on_evict(key, value) is called for every item dropped because of max_size
+    or ttl, but not for items deleted explicitly.
+
+    The cache is safe to use from several threads (commands running in worker
+    pools, the webserver's /metrics endpoint); on_evict is called with the
+    cache's lock held.
+    """
+
+    def __init__(self, max_size=None, ttl=None, on_evict=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._data = OrderedDict()  # key -> (value, time stored)
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _is_expired(self, stored_at):
+        return self.ttl is not None and time.monotonic() - stored_at > self.ttl
+
+    def _expire(self, key):
+        value, _ = self._data.pop(key)
+        self.expirations += 1
+        self._evicted(key, value)
+
+    def _evicted(self, key, value):
+        if self.on_evict:
+            self.on_evict(key, value)
+
+    def __getitem__(self, key):
+        with self._lock:
+            try:
+                value, stored_at = self._data[key]
+            except KeyError:
+                self.misses += 1
+                raise
+            if self._is_expired(stored_at):
+                self._expire(key)
+                self.misses += 1
+                raise KeyError(key)
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while self.max_size is not None and len(self._data) > self.max_size:
+                evicted_key, (evicted, _) = self._data.popitem(last=False)
+                self.evictions += 1
+                self._evicted(evicted_key, evicted)
+
+    def __delitem__(self, key):
+        with self._lock:
+            del self._data[key]
+
+    def __contains__(self, key):
+        # membership checks don't count as a use of the item
+        with self._lock:
+            item = self._data.get(key)
+        return item is not None and not self._is_expired(item[1])
+
+    def __iter__(self):
+        return iter([k for k, _ in self.items()])
+
+    def __bool__(self):
+        # O(1), unlike len(): true while any item, even an expired one, is held
+        return bool(self._data)
+
+    def __len__(self):
+        # expired items are left for their next lookup to drop, but not counted
+        with self._lock:
+            return sum(
+                1
+                for _, stored_at in self._data.values()
+                if not self._is_expired(stored_at)
+            )
+
+    def values(self):
+        return [v for _, v in self.items()]
+
+    def items(self):
+        with self._lock:
+            return [
+                (k, v)
+                for k, (v, stored_at) in self._data.items()
+                if not self._is_expired(stored_at)
+            ]
+
+    def peek(self, key, default=None):
+        """Returns the item for key, even if it has expired, without marking it used"""
+        with self._lock:
+            item = self._data.get(key)
+        return default if item is None else item[0]
+
+    @property
+    def metrics(self):
+        return {
+            "size": len(self),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class ChannelCache(LRUCache):
+    """
+    An LRUCache of SlackConversations by channel id, which also indexes each
+    channel by every name it is known by (name, name_normalized and
+    previous_names).  Channels that are renamed in place must be stored again
+    to update the index.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(ChannelCache, self).__init__(*args, **kwargs)
+        self._names = {}  # channel id -> names it is indexed under
+        self._by_name = {}  # name -> {channel id: channel}
+
+    def __setitem__(self, key, channel):
+        with self._lock:
+            self._unindex(key)
+            names = set(channel.all_names)
+            for name in names:
+                self._by_name.setdefault(name, {})[key] = channel
+            self._names[key] = names
+            super(ChannelCache, self).__setitem__(key, channel)
+
+    def __delitem__(self, key):
+        with self._lock:
+            super(ChannelCache, self).__delitem__(key)
+            self._unindex(key)
+
+    def _evicted(self, key, value):
+        self._unindex(key)
+        super(ChannelCache, self)._evicted(key, value)
+
+    def _unindex(self, key):
+        for name in self._names.pop(key, ()):
+            channels = self._by_name[name]
+            del channels[key]
+            if not channels:
+                del self._by_name[name]
+
+    def get_by_name(self, name):
+        """Returns a list of the cached channels known by name"""
+        with self._lock:
+            return [
+                channel
+                for key, channel in self._by_name.get(name, {}).items()
+                if key in self
+            ]
@@ -0,0 +1,231 @@
+import asyncio
+import inspect
+import logging
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import suppress
+
+from slackminion.exceptions import CommandTimeoutError
+
+EXECUTOR_MODES = ["inline", "thread", "process"]
+
+_DONE = object()
+
+
+async def run_with_timeout(aw, timeout):
+    """
+    Awaits aw, raising CommandTimeoutError if it hasn't finished after timeout
+    seconds.  Unlike asyncio.wait_for, a TimeoutError raised by aw itself is
+    passed through unchanged, so it can't be mistaken for the command timing out.
+    """
+    if timeout is None:
+        return await aw
+    task = asyncio.ensure_future(aw)
+    try:
+        done, pending = await asyncio.wait({task}, timeout=timeout)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    if pending:
+        task.cancel()
+        raise CommandTimeoutError(timeout)
+    return task.result()
+
+
+def _timed_call(submitted_at, func, *args, **kwargs):
+    # Runs inside the worker; exceptions are returned rather than raised so the
+    # time spent waiting for a worker is always reported back
+    wait_time = time.time() - submitted_at
+    try:
+        return wait_time, func(*args, **kwargs), None
+    except Exception as e:  # noqa
+        return wait_time, None, e
+
+
+class WorkerPool(object):
+    """A thread or process pool used to run one plugin's synchronous commands"""
+
+    def __init__(self, name, mode="thread", max_workers=4):
+        if mode not in ["thread", "process"]:
+            raise ValueError(f"Unknown worker pool mode {mode}")
+        self.log = logging.getLogger(type(self).__name__)
+        self.name = name
+        self.mode = mode
+        self.max_workers = max_workers
+        if mode == "process":
+            self.executor = ProcessPoolExecutor(max_workers=max_workers)
+        else:
+            self.executor = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix=name
+            )
+        self._lock = threading.Lock()
+        self._pending = set()
+        self.in_flight = 0
+        self.completed = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    @property
+    def queue_depth(self):
+        """Number of submitted calls still waiting for a free worker"""
+        return max(0, self.in_flight - self.max_workers)
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Submits func to the pool and returns a concurrent.futures.Future
+        resolving to a (wait_time, result, exception) tuple.
+        """
+        future = self.executor.submit(_timed_call, time.time(), func, *args, **kwargs)
+        with self._lock:
+            self.in_flight += 1
+            self._pending.add(future)
+        future.add_done_callback(self._call_done)
+        return future
+
+    async def run(self, func, *args, **kwargs):
+        """Runs func in the pool without blocking the event loop"""
+        future = self.submit(func, *args, **kwargs)
+        wait_time, result, exception = await asyncio.wrap_future(future)
+        if exception is not None:
+            raise exception
+        return result
+
+    def _call_done(self, future):
+        with self._lock:
+            self.in_flight -= 1
+            self._pending.discard(future)
+            if future.cancelled() or future.exception() is not None:
+                return
+            wait_time = future.result()[0]
+            self.completed += 1
+            self.total_wait_time += wait_time
+            self.max_wait_time = max(self.max_wait_time, wait_time)
+
+    def shutdown(self, wait=None):
+        """
+        Cancels calls still waiting for a worker, then shuts the pool down.
+
+        By default only process pools are joined, as leaving their management
+        thread running keeps the interpreter from exiting.  Thread pools
+        aren't, so a command that is stuck in a worker can't block the caller.
+        """
+        with self._lock:
+            pending = list(self._pending)
+        for future in pending:
+            future.cancel()
+        if wait is None:
+            wait = self.mode == "process"
+        self.executor.shutdown(wait=wait)
+
+    @property
+    def metrics(self):
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "max_workers": self.max_workers,
+                "in_flight": self.in_flight,
+                "queue_depth": self.queue_depth,
+                "completed": self.completed,
+                "avg_wait_time": self.total_wait_time / self.completed
+                if self.completed
+                else 0.0,
+                "max_wait_time": self.max_wait_time,
+            }
+
+
+class CommandExecutor(object):
+    """
+    Runs synchronous plugin commands.
+
+    By default commands run inline on the event loop.  In "thread" mode each
+    plugin gets its own thread pool, so a command that blocks (a database query,
+    an http call) doesn't stop the bot from handling other messages.  Plugins
+    can override the mode and their pool size with the command_executor and
+    command_executor_workers class attributes; "process" mode is only
+    available as a per-plugin opt in, as the plugin and its arguments have to
+    be sent to the worker process.
+    """
+
+    def __init__(self, config=None):
+        self.log = logging.getLogger(type(self).__name__)
+        config = config or {}
+        self.mode = config.get("mode", "inline")
+        self.max_workers = config.get("max_workers", 4)
+        if self.mode not in ["inline", "thread"]:
+            raise ValueError(
+                f"command_executor mode must be inline or thread, got {self.mode}"
+            )
+        self.pools = {}
+
+    def get_pool(self, plugin):
+        """Returns the worker pool for plugin, or None if it runs commands inline"""
+        mode = getattr(plugin, "command_executor", None) or self.mode
+        if mode not in EXECUTOR_MODES:
+            self.log.warning(
+                f"Unknown command_executor {mode} for {type(plugin).__name__}, running inline"
+            )
+            return None
+        if mode == "inline":
+            return None
+        name = type(plugin).__name__
+        if name not in self.pools:
+            max_workers = (
+                getattr(plugin, "command_executor_workers", None) or self.max_workers
+            )
+            self.log.info(f"Starting {mode} pool for {name} ({max_workers} workers)")
+            self.pools[name] = WorkerPool(name, mode, max_workers)
+        return self.pools[name]
+
+    async def run(self, command, *args, timeout=None):
+        """
+        Runs a synchronous PluginCommand and returns its output.
+
+        Commands running in a worker pool raise CommandTimeoutError if they
+        haven't finished after timeout seconds.  The pool call is abandoned:
+        it is cancelled if it hasn't started yet, otherwise its result is
+        discarded.  Inline commands block the event loop and can't time out.
+        """
+        pool = self.get_pool(getattr(command.method, "__self__", None))
+        if pool is None:
+            return command.execute(*args)
+        return await run_with_timeout(pool.run(command.method, *args), timeout)
+
+    async def iterate(self, command, output):
+        """
+        Yields the chunks streamed by a command returning a generator or async
+        generator.  Generators from commands run in a thread pool are stepped
+        in that pool, so producing a chunk doesn't block the event loop.
+        """
+        if inspect.isasyncgen(output):
+            try:
+                async for chunk in output:
+                    yield chunk
+            finally:
+                await output.aclose()
+            return
+        pool = self.get_pool(getattr(command.method, "__self__", None))
+        if pool is not None and pool.mode != "thread":
+            pool = None  # generators can't be sent to a worker process
+        try:
+            while True:
+                if pool is None:
+                    chunk = next(output, _DONE)
+                else:
+                    chunk = await pool.run(next, output, _DONE)
+                if chunk is _DONE:
+                    return
+                yield chunk
+        finally:
+            # a generator still running in a worker can't be closed
+            with suppress(ValueError):
+                output.close()
+
+    def shutdown(self):
+        for pool in self.pools.values():
+            pool.shutdown()
+        self.pools = {}
+
+    @property
+    def metrics(self):
+        return {name: pool.metrics for name, pool in self.pools.items()}
@@ -0,0 +1,268 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from contextlib import suppress
+
+from slack_sdk.errors import SlackApiError
+
+from slackminion.utils.util import retry_after
+
+PRIORITIES = ["interactive", "bulk"]
+
+
+class _OutboundMessage(object):
+    __slots__ = ["channel", "kwargs", "future", "coalesce", "queued_at", "attempts"]
+
+    def __init__(self, channel, kwargs, future, coalesce=False):
+        self.channel = channel
+        self.kwargs = kwargs
+        self.future = future
+        self.coalesce = coalesce
+        self.queued_at = time.monotonic()
+        self.attempts = 0
+
+    def can_merge(self, other):
+        """Whether other can be appended to this message's text"""
+        if not (self.coalesce and other.coalesce) or self.kwargs.get("attachments"):
+            return False
+        return {k: v for k, v in self.kwargs.items() if k != "text"} == {
+            k: v for k, v in other.kwargs.items() if k != "text"
+        }
+
+
+class OutboundQueue(object):
+    """
+    Sends messages through a slack api method (such as chat_postMessage)
+    without exceeding slack's rate limits.
+
+    Messages to a channel are sent one at a time, in order, and at most one
+    every channel_interval seconds.  No more than workspace_rate messages a
+    second are sent across all channels.  Interactive messages (replies to
+    commands) are sent before bulk ones.  If slack responds with a rate limit
+    error anyway, sending pauses for the Retry-After period and the message is
+    retried, up to max_retries times.
+    https://api.slack.com/docs/rate-limits
+
+    With a coalesce_window, messages sent with coalesce=True are held for that
+    many seconds so that consecutive messages to the same channel and thread
+    can be sent as a single message, up to max_text_length characters.
+    """
+
+    def __init__(
+        self,
+        send,
+        channel_interval=1.0,
+        workspace_rate=10,
+        max_retries=5,
+        coalesce_window=0,
+        max_text_length=4000,
+    ):
+        self.log = logging.getLogger(type(self).__name__)
+        self.send = send
+        self.channel_interval = channel_interval
+        self.workspace_rate = workspace_rate
+        self.max_retries = max_retries
+        self.coalesce_window = coalesce_window
+        self.max_text_length = max_text_length
+        # priority -> channel -> deque of messages, in the order channels get a turn
+        self._lanes = {priority: OrderedDict() for priority in PRIORITIES}
+        self._next_send = {}  # channel -> time it can next be sent to
+        self._sending = {}  # channel -> task sending its current message
+        self._tokens = workspace_rate
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0
+        self._wakeup = None
+        self._task = None
+        self.sent = 0
+        self.failed = 0
+        self.rate_limited = 0
+        self.coalesced = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    @property
+    def is_started(self):
+        return self._task is not None
+
+    @property
+    def queued(self):
+        return sum(
+            len(queue) for lane in self._lanes.values() for queue in lane.values()
+        )
+
+    def start(self):
+        if self.is_started:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout=5):
+        """Waits up to timeout seconds for queued messages to be sent, then stops"""
+        if not self.is_started:
+            return
+        deadline = time.monotonic() + timeout
+        while (self.queued or self._sending) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if self.queued:
+            self.log.warning(f"Discarding {self.queued} unsent messages")
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+        for lane in self._lanes.values():
+            for queue in lane.values():
+                for message in queue:
+                    message.future.cancel()
+            lane.clear()
+
+    async def send_message(
+        self, channel, priority="interactive", coalesce=False, **kwargs
+    ):
+        """
+        Queues a message for channel and waits for it to be sent.  kwargs are
+        passed to the send method; returns its response.  If coalesce is set
+        (and there is a coalesce_window), returns None without waiting, as the
+        message may be merged with ones sent after it.
+        """
+        if priority not in self._lanes:
+            raise ValueError(f"Unknown message priority {priority}")
+        message = _OutboundMessage(
+            channel,
+            kwargs,
+            asyncio.get_event_loop().create_future(),
+            coalesce=coalesce and self.coalesce_window > 0,
+        )
+        self._lanes[priority].setdefault(channel, deque()).append(message)
+        self._wakeup.set()
+        if message.coalesce:
+            # return straight away so the caller's next message can be merged
+            # with this one; failures are logged instead of raised
+            message.future.add_done_callback(self._log_failure)
+            return None
+        return await message.future
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            delay = self._send_ready()
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+
+    def _send_ready(self):
+        """
+        Starts sending every message that can be sent now.  Returns the number
+        of seconds until another one could be, or None to wait for a wakeup.
+        """
+        now = time.monotonic()
+        if self._paused_until > now:
+            return self._paused_until - now
+        self._tokens = min(
+            self.workspace_rate,
+            self._tokens + (now - self._refilled_at) * self.workspace_rate,
+        )
+        self._refilled_at = now
+        wait = None
+        for priority, lane in self._lanes.items():
+            for channel, queue in list(lane.items()):
+                if channel in self._sending:
+                    continue
+                ready_at = self._next_send.get(channel, 0)
+                if queue[0].coalesce:
+                    # give the messages that follow a chance to arrive
+                    ready_at = max(ready_at, queue[0].queued_at + self.coalesce_window)
+                if ready_at > now:
+                    wait = ready_at - now if wait is None else min(wait, ready_at - now)
+                    continue
+                if self._tokens < 1:
+                    return (1 - self._tokens) / self.workspace_rate
+                self._tokens -= 1
+                messages = [queue.popleft()]
+                length = len(messages[0].kwargs.get("text") or "")
+                while queue and messages[0].can_merge(queue[0]):
+                    length += len(queue[0].kwargs.get("text") or "") + 1
+                    if length > self.max_text_length:
+                        break
+                    messages.append(queue.popleft())
+                if queue:
+                    # let other channels go before this one sends again
+                    lane.move_to_end(channel)
+                else:
+                    del lane[channel]
+                self._sending[channel] = asyncio.create_task(
+                    self._deliver(priority, messages)
+                )
+        return wait
+
+    async def _deliver(self, priority, messages):
+        channel = messages[0].channel
+        kwargs = messages[0].kwargs
+        if len(messages) > 1:
+            kwargs = dict(
+                kwargs, text="\n".join(message.kwargs["text"] for message in messages)
+            )
+        try:
+            response = await self.send(channel=channel, **kwargs)
+        except SlackApiError as e:
+            if (
+                e.response.status_code == 429
+                and messages[0].attempts < self.max_retries
+            ):
+                self.rate_limited += 1
+                delay = retry_after(e.response)
+                self.log.warning(f"Rate limited sending to {channel}, pausing {delay}s")
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                # retry ahead of anything queued after them
+                queue = self._lanes[priority].setdefault(channel, deque())
+                for message in reversed(messages):
+                    message.attempts += 1
+                    queue.appendleft(message)
+            else:
+                self._fail(messages, e)
+        except Exception as e:  # noqa
+            self._fail(messages, e)
+        else:
+            now = time.monotonic()
+            self.sent += 1
+            self.coalesced += len(messages) - 1
+            for message in messages:
+                latency = now - message.queued_at
+                self.total_latency += latency
+                self.max_latency = max(self.max_latency, latency)
+                if not message.future.done():
+                    message.future.set_result(response)
+        finally:
+            del self._sending[channel]
+            now = time.monotonic()
+            if len(self._next_send) > 1000:
+                self._next_send = {k: v for k, v in self._next_send.items() if v > now}
+            self._next_send[channel] = now + self.channel_interval
+            self._wakeup.set()
+
+    def _log_failure(self, future):
+        if not future.cancelled() and future.exception() is not None:
+            self.log.error(f"Failed to send message: {future.exception()}")
+
+    def _fail(self, messages, exception):
+        self.failed += len(messages)
+        for message in messages:
+            if not message.future.done():
+                message.future.set_exception(exception)
+
+    @property
+    def metrics(self):
+        return {
+            "queued": {
+                priority: sum(len(queue) for queue in lane.values())
+                for priority, lane in self._lanes.items()
+            },
+            "sending": len(self._sending),
+            "sent": self.sent,
+            "failed": self.failed,
+            "rate_limited": self.rate_limited,
+            "coalesced": self.coalesced,
+            "avg_latency": self.total_latency / (self.sent + self.coalesced)
+            if self.sent
+            else 0.0,
+            "max_latency": self.max_latency,
+        }
@@ -4,6 +4,8 @@ import os
 import re
 import textwrap
 
+from slack_sdk.errors import SlackApiError
+
 from slackminion.slack import SlackConversation, SlackUser
 
 
@@ -25,6 +27,73 @@ def format_docstring(docstring):
     return formatted_text
 
 
+async def call_with_rate_limit(method, *args, max_retries=5, **kwargs):
+    """
+    Calls an async slack api method, retrying when slack responds with a rate
+    limit error after waiting for the number of seconds in its Retry-After
+    header.
+    https://api.slack.com/docs/rate-limits
+    :param method: AsyncWebClient method
+    :param max_retries: int
+    :return: AsyncSlackResponse
+    """
+    attempt = 0
+    while True:
+        try:
+            return await method(*args, **kwargs)
+        except SlackApiError as e:
+            if e.response.status_code != 429 or attempt >= max_retries:
+                raise
+            attempt += 1
+            await asyncio.sleep(retry_after(e.response))
+
+
+def retry_after(response, default=1):
+    """Returns the Retry-After delay in seconds from a slack api response"""
+    headers = response.headers or {}
+    value = headers.get("Retry-After", headers.get("retry-after"))
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+# Slack recommends keeping messages under 4000 characters, longer ones may be
+# truncated
+MAX_MESSAGE_LENGTH = 4000
+
+
+def split_message(text, max_length=MAX_MESSAGE_LENGTH):
+    """
+    Splits text into chunks of at most max_length characters, breaking between
+    lines where possible.
+    :param text: str
+    :param max_length: int
+    :return: list of str
+    """
+    if len(text) <= max_length:
+        return [text]
+    chunks = []
+    current = []
+    current_length = 0
+    for line in text.split("\n"):
+        # lines that won't fit in a message on their own are hard wrapped
+        while len(line) > max_length:
+            if current:
+                chunks.append("\n".join(current))
+                current, current_length = [], 0
+            chunks.append(line[:max_length])
+            line = line[max_length:]
+        if current and current_length + 1 + len(line) > max_length:
+            chunks.append("\n".join(current))
+            current, current_length = [], 0
+        current_length += len(line) + (1 if current else 0)
+        current.append(line)
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
 def output_to_dev_console(text):
     try:
         console_width = min(int(os.popen("stty size", "r").read().split()[1]), 120) - 20
@@ -95,6 +164,35 @@ async def dev_console(bot):
         await asyncio.sleep(0.5)
 
 
+# Slack markup is either <[@#!]id|label> for users, channels and special
+# commands, or <link|label> for links; the label is optional in both
+# https://api.slack.com/reference/surfaces/formatting#retrieving-messages
+FORMATTING_PATTERN = re.compile(
+    r"""
+    <                      # opening angle bracket
+    (?:
+        ([\@\#\!])          # link type for channel, username or command
+        (\w+)              # id
+        (?:\|([^>]+))?      # |label (optional)
+      |
+        ([^>\|]+)          # link
+        (?:\|([^>]+))?      # |label (optional)
+    )
+    >                      # closing angle bracket
+    """,
+    re.VERBOSE,
+)
+
+
+def _formatting_substitute(match):
+    link_type, link_id, special_label, link, link_label = match.groups()
+    if link_type:
+        # If we find the label, remove the id
+        return link_type + (special_label or link_id)
+    # If we find the label, use it. If not, use the original link
+    return link_label or link
+
+
 def strip_formatting(input_string):
     """Remove any slack specific formatting from messages.
     See https://api.slack.com/reference/surfaces/formatting#retrieving-messages
@@ -104,41 +202,19 @@ def strip_formatting(input_string):
     :param input_string: str
     :return: str
     """
-    special_pattern = re.compile(
-        r"""
-        <              # opening angle bracket
-        ([\@\#\!])     # link type for channel, username or command
-        (\w+)          # id
-        (?:\|([^>]+))? # |label (optional)
-        >              # closing angle bracket
-        """,
-        re.VERBOSE,
-    )
+    if "<" not in input_string:
+        return input_string
+    return FORMATTING_PATTERN.sub(_formatting_substitute, input_string)
 
-    link_pattern = re.compile(
-        r"""
-        <              # opening angle bracket
-        ([^>\|]+)      # link
-        (?:\|([^>]+))? # label
-        >              # closing angle bracket
-        """,
-        re.VERBOSE,
-    )
 
-    def _special_match_substitute(match):
-        """If we find the label, remove the id"""
-        if match.group(3):
-            return "{}{}".format(match.group(1), match.group(3))
-        else:
-            return "{}{}".format(match.group(1), match.group(2))
-
-    def _link_match_substitute(match):
-        """If we find the label, use it. If not, use the original link"""
-        if match.group(2):
-            return match.group(2)
-        else:
-            return match.group(1)
-
-    input_string = re.sub(special_pattern, _special_match_substitute, input_string)
-    input_string = re.sub(link_pattern, _link_match_substitute, input_string)
-    return input_string
+def strip_formatting_args(args):
+    """Remove slack formatting from a list of space separated command arguments.
+    Formatting may span arguments (link labels can contain spaces), so the
+    cleaned arguments are split on spaces the same way.
+
+    :param args: list of str
+    :return: list of str
+    """
+    if not any("<" in arg for arg in args):
+        return args
+    return strip_formatting(" ".join(args)).split(" ")